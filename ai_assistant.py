@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI Assistant
+Shared pieces of the DeepSeek waste classification assistant: the model and
+system prompt, a local first-tier classifier, helpers for streamed replies,
+a request manager that coalesces and cancels in-flight questions, and a
+persistent answer cache.
+
+The local classifier answers from the product catalog and a curated
+keyword/material rule set in well under a millisecond; DeepSeek is only
+asked when its confidence is low. Answers are cached in SQLite by
+normalized question text and prompt version, so questions asked many
+times a day ("plastic bottle", "battery") are answered in milliseconds
+without an API call. Entries expire after a TTL and the least recently used
+ones are evicted when the cache is full.
+
+Usage:
+    python ai_assistant.py classify "plastic bottle" [--db products.db]
+    python ai_assistant.py stats
+    python ai_assistant.py prune     # drop expired answers
+    python ai_assistant.py clear
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+import http_client
+
+
+# DeepSeek credentials (override with environment variables)
+DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', 'sk-c33383af3d7c47488b9b55000b659d50')
+DEEPSEEK_BASE_URL = os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com').rstrip('/')
+DEEPSEEK_MODEL = "deepseek-chat"
+DEEPSEEK_TIMEOUT = 30.0
+
+WASTE_SYSTEM_PROMPT = """You are a professional waste classification assistant. Please determine which waste category the product provided by the user should belong to.
+
+Waste Classification Standards:
+1. Recyclable Waste: Paper, plastic, metal, glass, textiles and other reusable materials
+2. Wet Waste (Organic Waste): Food scraps, fruit peels, vegetable leaves and other easily decomposable organic waste
+3. Hazardous Waste: Batteries, medicines, paint, fluorescent tubes and other environmentally harmful waste
+4. Other Waste (Dry Waste): Other waste except the above three categories
+
+Please answer concisely and clearly in the following format:
+Product Name: [Product Name]
+Waste Classification: [Waste Category]
+Explanation: [Brief explanation of the reason]
+
+If the product name is not clear enough, please ask for more details.
+
+IMPORTANT: Please respond in English only."""
+
+# Changes whenever the model or the prompt changes, so old answers are not reused
+PROMPT_VERSION = hashlib.sha256(f"{DEEPSEEK_MODEL}\n{WASTE_SYSTEM_PROMPT}".encode('utf-8')).hexdigest()[:12]
+
+# Local answers below this confidence go to DeepSeek
+LOCAL_CONFIDENCE_THRESHOLD = 0.85
+
+# Waste categories used by the scanner display, and the stored catalog values
+WASTE_TYPE_NAMES = {
+    'recyclable': 'Recyclable Waste',
+    'hazardous': 'Hazardous Waste',
+    'wet': 'Wet Waste',
+    'other': 'Other Waste'
+}
+CATALOG_WASTE_TYPES = {
+    'recyclable': 'recyclable',
+    'hazardous': 'hazardous',
+    'wet waste': 'wet',
+    'other waste': 'other'
+}
+
+# Curated rules: (keywords, category, confidence, explanation). Specific items
+# come first; bare material words only give a medium confidence because dirty
+# or composite packaging is often not recyclable.
+WASTE_RULES = (
+    (('battery', 'batteries', '电池', '充电宝', 'power bank'), 'hazardous', 0.95,
+     "Batteries contain heavy metals and electrolytes that pollute soil and water."),
+    (('medicine', 'expired drug', 'pill', '药品', '药片', '过期药', '胶囊'), 'hazardous', 0.9,
+     "Medicines are chemically active and must not enter the environment."),
+    (('paint', 'nail polish', 'pesticide', 'insecticide', '油漆', '指甲油', '农药', '杀虫剂'), 'hazardous', 0.9,
+     "Paints and pesticides contain toxic solvents or chemicals."),
+    (('fluorescent', 'light bulb', 'lamp tube', 'thermometer', 'mercury', '灯管', '节能灯', '温度计', '水银'), 'hazardous', 0.95,
+     "Lamps and thermometers can contain mercury."),
+    (('fruit peel', 'banana', 'apple core', 'vegetable', 'leftover', 'food scrap', 'tea leaves', 'coffee grounds',
+      'eggshell', '果皮', '香蕉', '菜叶', '剩饭', '剩菜', '茶叶渣', '咖啡渣', '蛋壳'), 'wet', 0.9,
+     "Food scraps and peels decompose easily and can be composted."),
+    (('tissue', 'napkin', 'toilet paper', 'wet wipe', 'cigarette', 'diaper', 'ceramic', 'chopsticks',
+      '纸巾', '餐巾纸', '卫生纸', '湿巾', '烟头', '尿不湿', '陶瓷', '一次性筷子'), 'other', 0.9,
+     "Soiled paper, cigarette butts and ceramics cannot be recycled."),
+    (('plastic bottle', 'pet bottle', 'water bottle', 'beverage bottle', 'aluminum can', 'aluminium can', 'tin can',
+      'soda can', 'glass bottle', 'glass jar', 'newspaper', 'cardboard', 'carton box', 'magazine',
+      '塑料瓶', '饮料瓶', '矿泉水瓶', '易拉罐', '玻璃瓶', '报纸', '纸箱', '纸板', '杂志'), 'recyclable', 0.9,
+     "Clean bottles, cans, glass and paper are reusable materials."),
+    (('plastic', 'metal', 'glass', 'paper', 'aluminum', 'aluminium', '塑料', '金属', '玻璃', '纸'), 'recyclable', 0.7,
+     "The material is usually recyclable when clean."),
+)
+
+# Words that make a question about the packaging rather than the contents
+PACKAGING_KEYWORDS = ('packaging', 'package', 'bottle', 'bag', 'box', 'cup', 'lid', 'wrapper', 'carton', 'jar',
+                      'tube', 'container', 'tin can', 'soda can',
+                      '包装', '瓶', '罐', '袋', '盒', '杯', '盖子', '瓶盖', '外壳', '纸箱')
+
+# Catalog materials that are recyclable when the packaging classification is missing
+RECYCLABLE_MATERIALS = ('paper', 'plastic', 'metal', 'glass')
+
+# Confidence of catalog answers: the question is exactly a product name, or
+# contains one. A product name inside a longer question ("可口可乐 ... 吸管")
+# may be about something else, so that stays below LOCAL_CONFIDENCE_THRESHOLD
+# unless the question is about the packaging, which the catalog records.
+CATALOG_EXACT_CONFIDENCE = 0.95
+CATALOG_PACKAGING_CONFIDENCE = 0.9
+CATALOG_CONTAINED_CONFIDENCE = 0.75
+
+# Longest question searched for catalog names inside it
+LOCAL_MAX_QUESTION_LENGTH = 60
+
+# Streamed text is appended to the chat at most this often (milliseconds)
+STREAM_FLUSH_MS = 50
+
+AI_CACHE_PATH = os.environ.get('AI_CACHE_PATH', 'ai_cache.db')
+AI_CACHE_TTL = 7 * 24 * 3600
+AI_CACHE_MAX_ENTRIES = 5000
+
+# At most this many DeepSeek requests run at once; more questions wait in line
+AI_MAX_CONCURRENT_REQUESTS = 2
+
+
+def normalize_question(text):
+    """Cache key of a question: width/case folded, whitespace collapsed, trailing punctuation dropped"""
+    text = unicodedata.normalize('NFKC', text or "").lower()
+    text = " ".join(text.split())
+    return re.sub(r'[\s?!.,;:。？！，；：]+$', '', text)
+
+
+def create_deepseek_client(timeout=DEEPSEEK_TIMEOUT, base_url=DEEPSEEK_BASE_URL):
+    """OpenAI-compatible DeepSeek client with a bounded timeout and retry count
+    
+    The client keeps its connections open, so create it once and reuse it.
+    """
+    from openai import OpenAI
+    
+    return OpenAI(
+        api_key=DEEPSEEK_API_KEY,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=http_client.MAX_RETRIES
+    )
+
+
+# ========== 本地分类 ==========
+
+class LocalClassifier:
+    """First-tier classifier answering from the catalog and WASTE_RULES
+    
+    Tiers, the more confident answer wins:
+      catalog  the question is (or contains) a product name in the catalog;
+               questions about the packaging ("可口可乐塑料瓶") are answered
+               from the product's packaging classification or material
+      rules    the question contains a curated keyword or material
+    classify() returns a dict with waste_type, confidence, source,
+    product_name and explanation, or None when nothing matches.
+    """
+    
+    def __init__(self):
+        # 规范化的产品名 -> {'product': {分类: 产品数}, 'packaging': {分类: 产品数}, 'material': {材料: 产品数}}
+        self.catalog = {}
+        self.longest_name = 0
+        self.stats = {'questions': 0, 'answered': 0}
+        self.rules = [(compile_rule_keywords(keywords), waste_type, confidence, explanation)
+                      for keywords, waste_type, confidence, explanation in WASTE_RULES]
+        self.packaging_pattern = compile_rule_keywords(PACKAGING_KEYWORDS)
+    
+    def load_catalog(self, conn):
+        """(Re)build the catalog tier from the products table"""
+        catalog = {}
+        rows = conn.execute(
+            "SELECT product_name, product_waste_type, packaging_waste_type, packaging_material, plastic_type "
+            "FROM products WHERE product_name IS NOT NULL"
+        )
+        for product_name, product_waste_type, packaging_waste_type, packaging_material, plastic_type in rows:
+            name = normalize_question(product_name)
+            if len(name) < 2:
+                continue
+            entry = {'product': {}, 'packaging': {}, 'material': {}}
+            values = (
+                ('product', CATALOG_WASTE_TYPES.get((product_waste_type or '').strip().lower())),
+                ('packaging', CATALOG_WASTE_TYPES.get((packaging_waste_type or '').strip().lower())),
+                ('material', " ".join(part.strip() for part in (packaging_material or '', plastic_type or '')
+                                      if part and part.strip()))
+            )
+            if not any(value for _, value in values):
+                continue
+            entry = catalog.setdefault(name, entry)
+            for key, value in values:
+                if value:
+                    entry[key][value] = entry[key].get(value, 0) + 1
+        self.catalog = catalog
+        self.longest_name = max((len(name) for name in catalog), default=0)
+        return len(catalog)
+    
+    def catalog_match(self, question):
+        """(name, entry) of the longest catalog name contained in the question"""
+        if question in self.catalog:
+            return question, self.catalog[question]
+        # 问题很短，枚举其中的子串查字典，比逐个产品名查找快
+        text = question[:LOCAL_MAX_QUESTION_LENGTH]
+        for length in range(min(len(text), self.longest_name), 1, -1):
+            for start in range(len(text) - length + 1):
+                votes = self.catalog.get(text[start:start + length])
+                if votes:
+                    return text[start:start + length], votes
+        return None, None
+    
+    def classify(self, question):
+        self.stats['questions'] += 1
+        question = normalize_question(question)
+        if not question:
+            return None
+        
+        name, entry = self.catalog_match(question)
+        result = self.catalog_result(question, name, entry) if entry else None
+        for pattern, waste_type, confidence, explanation in self.rules:
+            if pattern.search(question):
+                if not result or confidence > result['confidence']:
+                    result = {
+                        'waste_type': waste_type,
+                        'confidence': confidence,
+                        'source': 'rules',
+                        'product_name': question,
+                        'explanation': explanation
+                    }
+                break
+        
+        if result and result['confidence'] >= LOCAL_CONFIDENCE_THRESHOLD:
+            self.stats['answered'] += 1
+        return result
+    
+    def catalog_result(self, question, name, entry):
+        """Answer from a matched catalog entry, or None when it has no usable classification"""
+        material = max(entry['material'], key=entry['material'].get) if entry['material'] else ''
+        # 产品名本身可能带有"杯""盒"等字，只在名称以外的部分找包装关键词
+        if self.packaging_pattern.search(question.replace(name, ' ', 1)):
+            votes = entry['packaging']
+            if not votes and material and material.split()[0].lower() in RECYCLABLE_MATERIALS:
+                votes = {'recyclable': 1}
+            explanation = "The packaging of this product is classified this way in our catalog"
+            explanation += f" (material: {material})." if material else "."
+            confidence = CATALOG_PACKAGING_CONFIDENCE
+        else:
+            votes = entry['product']
+            explanation = "Classified the same way as this product in our catalog."
+            confidence = CATALOG_EXACT_CONFIDENCE if name == question else CATALOG_CONTAINED_CONFIDENCE
+        if not votes:
+            return None
+        
+        waste_type = max(votes, key=votes.get)
+        # 同名产品分类不一致时降低可信度
+        agreement = votes[waste_type] / sum(votes.values())
+        return {
+            'waste_type': waste_type,
+            'confidence': confidence * agreement,
+            'source': 'catalog',
+            'product_name': name,
+            'explanation': explanation
+        }
+
+
+def compile_rule_keywords(keywords):
+    """One pattern per rule; English keywords match whole words (plural allowed), Chinese ones anywhere"""
+    patterns = [re.escape(keyword) if not keyword.isascii() else rf"\b{re.escape(keyword)}(?:s|es)?\b"
+                for keyword in keywords]
+    return re.compile("|".join(patterns))
+
+
+def format_local_answer(result):
+    """A local result in the assistant's reply format, so the same parser applies"""
+    return (f"Product Name: {result['product_name']}\n"
+            f"Waste Classification: {WASTE_TYPE_NAMES[result['waste_type']]}\n"
+            f"Explanation: {result['explanation']}")
+
+
+# ========== 流式回复 ==========
+
+class ReplyLineSplitter:
+    """Splits a streamed reply into complete lines as the text arrives"""
+    
+    def __init__(self):
+        self.lines = []
+        self.partial = ""
+    
+    def feed(self, text):
+        """Add streamed text; returns the lines it completed"""
+        *complete, self.partial = (self.partial + text).split('\n')
+        self.lines.extend(complete)
+        return complete
+    
+    @property
+    def completed_text(self):
+        return '\n'.join(self.lines)
+
+
+def is_classification_line(line):
+    """True for the 'Waste Classification: ...' line of a reply (also in Markdown bold)"""
+    return re.match(r'^[\s*#>-]*waste classification\s*\**\s*[:：]', line, re.IGNORECASE) is not None
+
+
+# ========== 请求管理 ==========
+
+class AIRequest:
+    """A question submitted to an AIRequestManager"""
+    
+    def __init__(self, manager, key, question, generation):
+        self.manager = manager
+        self.key = key
+        self.question = question
+        self.generation = generation
+        self.cancelled = False
+        self.future = None
+    
+    def is_current(self):
+        """False once a newer question or scan has superseded this request"""
+        return self.manager.is_current(self)
+
+
+class AIRequestManager:
+    """Runs AI requests on a bounded worker pool
+    
+    Each new question or scan starts a new generation. Only a request of
+    the current generation may update the UI: superseded requests that have
+    not started are cancelled, and running ones stop at their next
+    is_current() check. Asking a question that is already in flight joins
+    that request instead of sending it again.
+    """
+    
+    def __init__(self, max_workers=AI_MAX_CONCURRENT_REQUESTS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-request')
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.in_flight = {}
+        self.stats = {'submitted': 0, 'coalesced': 0, 'superseded': 0}
+    
+    def submit(self, question, func):
+        """Run func(request) for a question; returns (request, coalesced)
+        
+        The request becomes the current one. coalesced is True when an
+        identical question was already in flight and was reused.
+        """
+        key = normalize_question(question)
+        with self.lock:
+            self.generation += 1
+            request = self.in_flight.get(key)
+            coalesced = request is not None and not request.cancelled
+            if coalesced:
+                request.generation = self.generation
+                self.stats['coalesced'] += 1
+            self.cancel_stale()
+            if coalesced:
+                return request, True
+            
+            request = AIRequest(self, key, question, self.generation)
+            self.in_flight[key] = request
+            self.stats['submitted'] += 1
+            request.future = self.executor.submit(self.run, request, func)
+            return request, False
+    
+    def supersede(self):
+        """Start a new generation without a request (a new scan or a local answer)"""
+        with self.lock:
+            self.generation += 1
+            self.cancel_stale()
+    
+    def cancel_stale(self):
+        """Drop superseded requests that have not started yet (lock held)"""
+        for key, request in list(self.in_flight.items()):
+            if request.generation != self.generation and request.future.cancel():
+                request.cancelled = True
+                self.stats['superseded'] += 1
+                del self.in_flight[key]
+    
+    def is_current(self, request):
+        with self.lock:
+            if not request.cancelled and request.generation != self.generation:
+                # 一旦过期就不再恢复，相同问题会重新请求
+                request.cancelled = True
+                self.stats['superseded'] += 1
+            return not request.cancelled
+    
+    def run(self, request, func):
+        try:
+            if request.is_current():
+                func(request)
+        finally:
+            with self.lock:
+                if self.in_flight.get(request.key) is request:
+                    del self.in_flight[request.key]
+    
+    def shutdown(self):
+        """Cancel queued requests; running ones stop at their next is_current() check"""
+        with self.lock:
+            self.generation += 1
+            self.cancel_stale()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ========== 回答缓存 ==========
+
+class AnswerCache:
+    """Persistent cache of assistant answers
+    
+    Safe to use from worker threads. Expired entries count as misses and
+    are removed; when more than max_entries are stored, the least recently
+    used ones are evicted.
+    """
+    
+    def __init__(self, db_path=AI_CACHE_PATH, ttl=AI_CACHE_TTL, max_entries=AI_CACHE_MAX_ENTRIES,
+                 prompt_version=PROMPT_VERSION):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prompt_version = prompt_version
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS ai_answers (
+                question TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (question, prompt_version)
+            ) WITHOUT ROWID;
+            
+            CREATE INDEX IF NOT EXISTS idx_ai_answers_last_used_at ON ai_answers(last_used_at);
+            
+            CREATE TABLE IF NOT EXISTS ai_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            
+            INSERT OR IGNORE INTO ai_cache_stats (name, value)
+            VALUES ('lookups', 0), ('hits', 0), ('tokens_saved', 0);
+        ''')
+        self.conn.commit()
+    
+    def lookup(self, question):
+        """Cached answer of a question, or None"""
+        key = normalize_question(question)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT answer, tokens, created_at FROM ai_answers WHERE question = ? AND prompt_version = ?",
+                (key, self.prompt_version)
+            ).fetchone()
+            if row and row[2] < now - self.ttl:
+                self.conn.execute("DELETE FROM ai_answers WHERE question = ? AND prompt_version = ?",
+                                  (key, self.prompt_version))
+                row = None
+            
+            self.conn.execute("UPDATE ai_cache_stats SET value = value + 1 WHERE name = 'lookups'")
+            if row:
+                self.conn.execute("UPDATE ai_cache_stats SET value = value + 1 WHERE name = 'hits'")
+                self.conn.execute("UPDATE ai_cache_stats SET value = value + ? WHERE name = 'tokens_saved'", (row[1],))
+                self.conn.execute('''
+                    UPDATE ai_answers SET hits = hits + 1, last_used_at = ?
+                    WHERE question = ? AND prompt_version = ?
+                ''', (now, key, self.prompt_version))
+            self.conn.commit()
+            return row[0] if row else None
+    
+    def store(self, question, answer, tokens=0):
+        """Remember an answer; tokens is what the API call cost (saved again on every hit)"""
+        key = normalize_question(question)
+        if not key or not answer or not answer.strip():
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO ai_answers (question, prompt_version, answer, tokens, hits, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, 0, ?, ?)
+            ''', (key, self.prompt_version, answer, tokens or 0, now, now))
+            excess = self.conn.execute("SELECT COUNT(*) FROM ai_answers").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.conn.execute('''
+                    DELETE FROM ai_answers WHERE (question, prompt_version) IN (
+                        SELECT question, prompt_version FROM ai_answers ORDER BY last_used_at LIMIT ?)
+                ''', (excess,))
+            self.conn.commit()
+    
+    def prune(self):
+        """Remove expired answers and answers of older prompt versions; returns the number removed"""
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM ai_answers WHERE created_at < ? OR prompt_version != ?",
+                                       (time.time() - self.ttl, self.prompt_version))
+            self.conn.commit()
+            return cursor.rowcount
+    
+    def stats(self):
+        """Entries, lookups, hits, hit rate and tokens saved"""
+        with self.lock:
+            counters = dict(self.conn.execute("SELECT name, value FROM ai_cache_stats"))
+            entries = self.conn.execute("SELECT COUNT(*) FROM ai_answers").fetchone()[0]
+        lookups = counters.get('lookups', 0)
+        hits = counters.get('hits', 0)
+        return {
+            'entries': entries,
+            'lookups': lookups,
+            'hits': hits,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'tokens_saved': counters.get('tokens_saved', 0)
+        }
+    
+    def clear(self):
+        """Drop all cached answers and reset the counters"""
+        with self.lock:
+            self.conn.execute("DELETE FROM ai_answers")
+            self.conn.execute("UPDATE ai_cache_stats SET value = 0")
+            self.conn.commit()
+    
+    def close(self):
+        """Close the cache database"""
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DeepSeek assistant answer cache')
+    parser.add_argument('command', choices=['classify', 'stats', 'prune', 'clear'])
+    parser.add_argument('question', nargs='?', help='Question to classify locally (classify command)')
+    parser.add_argument('--cache', default=AI_CACHE_PATH, help='Cache database (default: ai_cache.db)')
+    parser.add_argument('--db', default='products.db', help='Products database for the catalog tier (default: products.db)')
+    args = parser.parse_args()
+    
+    if args.command == 'classify':
+        if not args.question:
+            parser.error("classify 需要提供问题")
+        classifier = LocalClassifier()
+        if os.path.exists(args.db):
+            conn = sqlite3.connect(args.db)
+            try:
+                classifier.load_catalog(conn)
+            finally:
+                conn.close()
+        start_time = time.perf_counter()
+        result = classifier.classify(args.question)
+        elapsed_us = (time.perf_counter() - start_time) * 1000000
+        if not result:
+            print(f"❓ 本地无法分类，需要询问DeepSeek ({elapsed_us:.0f} µs)")
+            return
+        answered = "本地回答" if result['confidence'] >= LOCAL_CONFIDENCE_THRESHOLD else "可信度不足，需要询问DeepSeek"
+        print(format_local_answer(result))
+        print(f"📊 {result['source']} 可信度 {result['confidence']:.2f} → {answered} ({elapsed_us:.0f} µs)")
+        return
+    
+    cache = AnswerCache(args.cache)
+    try:
+        if args.command == 'stats':
+            stats = cache.stats()
+            print(f"📦 缓存回答: {stats['entries']} 条（提示词版本 {PROMPT_VERSION}）")
+            print(f"🔍 查询次数: {stats['lookups']}")
+            print(f"✅ 命中次数: {stats['hits']} ({stats['hit_rate'] * 100:.1f}%)")
+            print(f"💰 节省tokens: {stats['tokens_saved']:,}")
+        elif args.command == 'prune':
+            print(f"🗑️  已删除 {cache.prune()} 条过期回答")
+        else:
+            cache.clear()
+            print("🗑️  回答缓存已清空")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI Batch Classify
+Classifies catalog rows whose packaging or product classification is empty.
+Products are sent to DeepSeek in packed prompts of many items each, asking
+for JSON output, on a bounded number of workers with a request rate limit.
+Results are validated against the allowed values and staged in the
+classification_suggestions table; they are only copied into products when
+accepted, and then only into fields that are still empty.
+
+Usage:
+    python ai_batch_classify.py run [--db products.db] [--batch-size 50] [--workers 3] [--rate 1] [--limit 1000]
+                                    [--retry-rejected]
+    python ai_batch_classify.py status
+    python ai_batch_classify.py review
+    python ai_batch_classify.py accept 3 4 | --all [--min-confidence 0.8]
+    python ai_batch_classify.py reject 5
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from product_database import upgrade_database, DB_PATH
+from ai_assistant import create_deepseek_client, DEEPSEEK_MODEL, DEEPSEEK_BASE_URL
+import http_client
+
+
+WASTE_TYPES = ("Recyclable", "Hazardous", "Wet Waste", "Other Waste")
+MATERIALS = ("Paper", "Plastic", "Metal", "Glass")
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_WORKERS = 3
+DEFAULT_RATE = 1.0
+
+# Packed prompts produce long replies
+BATCH_TIMEOUT = 120.0
+BATCH_MAX_TOKENS = 8000
+
+BATCH_SYSTEM_PROMPT = f"""You are a professional waste classification assistant. You receive a JSON list of products (id, name, and the packaging material when known). Classify every product:
+
+- packaging_waste_type: waste category of the packaging, one of {", ".join(WASTE_TYPES)}
+- product_waste_type: waste category of the product itself (the contents), one of {", ".join(WASTE_TYPES)}
+- packaging_material: main packaging material, one of {", ".join(MATERIALS)}, or "" if unknown
+- confidence: your confidence from 0 to 1
+
+Waste Classification Standards:
+1. Recyclable: Paper, plastic, metal, glass, textiles and other reusable materials
+2. Wet Waste: Food scraps, fruit peels, vegetable leaves and other easily decomposable organic waste
+3. Hazardous: Batteries, medicines, paint, fluorescent tubes and other environmentally harmful waste
+4. Other Waste: Other waste except the above three categories
+
+Respond with a JSON object only, in this form:
+{{"items": [{{"id": 1, "packaging_waste_type": "Recyclable", "product_waste_type": "Wet Waste", "packaging_material": "Plastic", "confidence": 0.9}}]}}
+Include every id exactly once."""
+
+
+def ensure_classification_suggestions(conn):
+    """Create the staging table for AI classifications"""
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS classification_suggestions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            packaging_waste_type TEXT,
+            product_waste_type TEXT,
+            packaging_material TEXT,
+            confidence REAL,
+            model TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            reviewed_at DATETIME
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_classification_suggestions_status ON classification_suggestions(status);
+        CREATE INDEX IF NOT EXISTS idx_classification_suggestions_product_id ON classification_suggestions(product_id);
+    ''')
+    conn.commit()
+
+
+def find_unclassified(conn, limit=None, retry_rejected=False):
+    """Products with a name and an empty classification that have no pending suggestion
+    
+    Products whose suggestion was rejected are skipped too, so every run does
+    not ask again for the same answer; they are only included with
+    retry_rejected.
+    """
+    skip_statuses = "('pending')" if retry_rejected else "('pending', 'rejected')"
+    query = f'''
+        SELECT p.id, p.product_name, COALESCE(p.packaging_material, '') FROM products p
+        WHERE TRIM(COALESCE(p.product_name, '')) != ''
+          AND (TRIM(COALESCE(p.packaging_waste_type, '')) = '' OR TRIM(COALESCE(p.product_waste_type, '')) = '')
+          AND NOT EXISTS (SELECT 1 FROM classification_suggestions s
+                          WHERE s.product_id = p.id AND s.status IN {skip_statuses})
+        ORDER BY p.id
+    '''
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return conn.execute(query).fetchall()
+
+
+def canonical_value(value, allowed):
+    """The allowed spelling of a value (case and spacing folded), or None"""
+    key = " ".join(str(value or "").split()).lower()
+    for option in allowed:
+        if option.lower() == key:
+            return option
+    # 常见的变体写法
+    aliases = {'recyclable waste': 'Recyclable', 'hazardous waste': 'Hazardous', 'wet': 'Wet Waste',
+               'organic waste': 'Wet Waste', 'other': 'Other Waste', 'dry waste': 'Other Waste'}
+    return aliases.get(key) if aliases.get(key) in allowed else None
+
+
+def parse_batch_reply(content, batch_ids):
+    """Validate a batch reply; returns ({product_id: suggestion}, problems)"""
+    text = (content or "").strip()
+    # 去掉可能出现的Markdown代码块
+    text = re.sub(r'^```(?:json)?\s*|\s*```$', '', text)
+    data = json.loads(text)
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError("回复中没有items列表")
+    
+    results = {}
+    problems = 0
+    for item in items:
+        if not isinstance(item, dict):
+            problems += 1
+            continue
+        try:
+            product_id = int(item.get('id'))
+        except (TypeError, ValueError):
+            problems += 1
+            continue
+        packaging = canonical_value(item.get('packaging_waste_type'), WASTE_TYPES)
+        product = canonical_value(item.get('product_waste_type'), WASTE_TYPES)
+        material = canonical_value(item.get('packaging_material'), MATERIALS) or ""
+        try:
+            confidence = min(max(float(item.get('confidence', 0)), 0.0), 1.0)
+        except (TypeError, ValueError):
+            confidence = 0.0
+        if product_id not in batch_ids or product_id in results or not (packaging and product):
+            problems += 1
+            continue
+        results[product_id] = {
+            'packaging_waste_type': packaging,
+            'product_waste_type': product,
+            'packaging_material': material,
+            'confidence': confidence
+        }
+    return results, problems
+
+
+class BatchClassifier:
+    """Sends packed prompts on a worker pool and stages the validated results"""
+    
+    def __init__(self, conn, client, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+        self.conn = conn
+        self.client = client
+        self.workers = max(workers, 1)
+        self.rate_limiter = http_client.RateLimiter(rate)
+        self.breaker = http_client.circuit_breaker(DEEPSEEK_BASE_URL)
+        self.counts = {'requests': 0, 'classified': 0, 'invalid': 0, 'missing': 0, 'failed': 0, 'tokens': 0}
+    
+    def classify_batch(self, batch):
+        """Worker: classify one packed batch; returns ({product_id: suggestion}, problems, tokens)"""
+        from openai import APIConnectionError, InternalServerError
+        
+        items = [{'id': product_id, 'name': name, **({'packaging_material': material} if material else {})}
+                 for product_id, name, material in batch]
+        self.rate_limiter.acquire()
+        response = self.breaker.call(
+            self.client.chat.completions.create,
+            model=DEEPSEEK_MODEL,
+            messages=[
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps(items, ensure_ascii=False)},
+            ],
+            response_format={"type": "json_object"},
+            temperature=0,
+            max_tokens=BATCH_MAX_TOKENS,
+            failure_exceptions=(APIConnectionError, InternalServerError)
+        )
+        tokens = response.usage.total_tokens if response.usage else 0
+        try:
+            results, problems = parse_batch_reply(response.choices[0].message.content,
+                                                  {product_id for product_id, _, _ in batch})
+        except ValueError:
+            # 回复不是有效JSON（常见于被截断的长回复），拆成两半重试
+            if len(batch) == 1:
+                raise
+            middle = len(batch) // 2
+            results, problems, first_tokens = self.classify_batch(batch[:middle])
+            second_results, second_problems, second_tokens = self.classify_batch(batch[middle:])
+            results.update(second_results)
+            return results, problems + second_problems, tokens + first_tokens + second_tokens
+        return results, problems, tokens
+    
+    def stage(self, results):
+        self.conn.executemany('''
+            INSERT INTO classification_suggestions (product_id, packaging_waste_type, product_waste_type,
+                                                    packaging_material, confidence, model)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(product_id, suggestion['packaging_waste_type'], suggestion['product_waste_type'],
+               suggestion['packaging_material'], suggestion['confidence'], DEEPSEEK_MODEL)
+              for product_id, suggestion in results.items()])
+        self.conn.commit()
+    
+    def run(self, products, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+        """Classify all products; each finished batch is committed right away"""
+        batches = [products[i:i + batch_size] for i in range(0, len(products), batch_size)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.classify_batch, batch): batch for batch in batches}
+            try:
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    self.counts['requests'] += 1
+                    try:
+                        results, problems, tokens = future.result()
+                    except Exception as e:
+                        print(f"\n⚠️  批次失败（{len(batch)} 个产品）: {e}")
+                        self.counts['failed'] += len(batch)
+                        continue
+                    self.stage(results)
+                    self.counts['classified'] += len(results)
+                    self.counts['invalid'] += problems
+                    self.counts['missing'] += len(batch) - len(results)
+                    self.counts['tokens'] += tokens
+                    if progress:
+                        progress(self.counts)
+            except KeyboardInterrupt:
+                print("\n⏹️  正在停止，已完成的批次已保存...")
+                for future in futures:
+                    future.cancel()
+        return self.counts
+
+
+def accept_suggestions(conn, ids=None, min_confidence=0.0):
+    """Copy pending suggestions into empty product fields; returns the number of products updated"""
+    query = '''
+        SELECT id, product_id, packaging_waste_type, product_waste_type, packaging_material
+        FROM classification_suggestions WHERE status = 'pending' AND confidence >= ?
+    '''
+    params = [min_confidence]
+    if ids:
+        query += f" AND id IN ({', '.join('?' * len(ids))})"
+        params.extend(ids)
+    
+    updated = 0
+    with conn:
+        for suggestion_id, product_id, packaging, product, material in conn.execute(query, params).fetchall():
+            cursor = conn.execute('''
+                UPDATE products SET
+                    packaging_waste_type = CASE WHEN TRIM(COALESCE(packaging_waste_type, '')) = '' THEN ? ELSE packaging_waste_type END,
+                    product_waste_type = CASE WHEN TRIM(COALESCE(product_waste_type, '')) = '' THEN ? ELSE product_waste_type END,
+                    packaging_material = CASE WHEN TRIM(COALESCE(packaging_material, '')) = '' THEN ? ELSE packaging_material END,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND (TRIM(COALESCE(packaging_waste_type, '')) = '' OR TRIM(COALESCE(product_waste_type, '')) = '')
+            ''', (packaging, product, material, product_id))
+            conn.execute("UPDATE classification_suggestions SET status = 'accepted', reviewed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         (suggestion_id,))
+            updated += cursor.rowcount
+    return updated
+
+
+def print_review(conn):
+    rows = conn.execute('''
+        SELECT s.id, p.product_name, s.packaging_waste_type, s.product_waste_type, s.packaging_material, s.confidence
+        FROM classification_suggestions s JOIN products p ON p.id = s.product_id
+        WHERE s.status = 'pending' ORDER BY s.confidence, s.id
+    ''').fetchall()
+    if not rows:
+        print("📭 没有待审核的分类建议")
+        return
+    print(f"{'ID':>5}  {'产品名称':<24} {'包装分类':<12} {'产品分类':<12} {'包装材料':<8} 可信度")
+    print("-" * 80)
+    for suggestion_id, name, packaging, product, material, confidence in rows:
+        print(f"{suggestion_id:>5}  {name[:24]:<24} {packaging:<12} {product:<12} {material or '-':<8} {confidence:.2f}")
+    print(f"\n📝 共 {len(rows)} 条待审核（可信度低的在前）；accept/reject 加ID处理")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch AI classification of unclassified products')
+    parser.add_argument('command', choices=['run', 'status', 'review', 'accept', 'reject'])
+    parser.add_argument('ids', nargs='*', type=int, help='Suggestion IDs (accept/reject)')
+    parser.add_argument('--db', default=DB_PATH, help='Products database (default: products.db)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Products per request (default: 50)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent requests (default: 3)')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requests per second, 0 = unlimited (default: 1)')
+    parser.add_argument('--limit', type=int, help='Classify at most N products in this run')
+    parser.add_argument('--retry-rejected', action='store_true', help='Also classify products whose suggestion was rejected')
+    parser.add_argument('--all', action='store_true', help='Accept all pending suggestions')
+    parser.add_argument('--min-confidence', type=float, default=0.0, help='Only accept suggestions at least this confident')
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.db):
+        print(f"❌ 数据库文件不存在: {args.db}")
+        sys.exit(1)
+    conn = sqlite3.connect(args.db, timeout=30)
+    
+    try:
+        upgrade_database(conn)
+        ensure_classification_suggestions(conn)
+        
+        if args.command == 'status':
+            print(f"📦 待分类产品: {len(find_unclassified(conn))}")
+            for status, count, confidence in conn.execute('''
+                SELECT status, COUNT(*), AVG(confidence) FROM classification_suggestions GROUP BY status ORDER BY status
+            '''):
+                print(f"  {status:<10} {count:>6}  平均可信度 {confidence or 0:.2f}")
+        
+        elif args.command == 'review':
+            print_review(conn)
+        
+        elif args.command == 'accept':
+            if not args.ids and not args.all:
+                parser.error("accept 需要提供建议ID，或使用 --all")
+            updated = accept_suggestions(conn, None if args.all else args.ids, args.min_confidence)
+            print(f"✅ 已更新 {updated} 个产品的分类")
+        
+        elif args.command == 'reject':
+            if not args.ids:
+                parser.error("reject 需要提供建议ID")
+            with conn:
+                cursor = conn.execute(f'''
+                    UPDATE classification_suggestions SET status = 'rejected', reviewed_at = CURRENT_TIMESTAMP
+                    WHERE status = 'pending' AND id IN ({', '.join('?' * len(args.ids))})
+                ''', args.ids)
+            print(f"🗑️  已拒绝 {cursor.rowcount} 条建议")
+        
+        else:
+            products = find_unclassified(conn, args.limit, args.retry_rejected)
+            if not products:
+                print("✅ 没有待分类的产品")
+                return
+            
+            batch_count = (len(products) + args.batch_size - 1) // args.batch_size
+            print(f"🚀 开始分类 {len(products)} 个产品，共 {batch_count} 个请求（并发: {args.workers}, "
+                  f"限速: {args.rate or '不限'}/秒）")
+            start_time = time.perf_counter()
+            
+            def show_progress(counts):
+                print(f"\r  请求 {counts['requests']}/{batch_count}  已分类 {counts['classified']}  "
+                      f"无效 {counts['invalid']}  tokens {counts['tokens']:,}", end="", flush=True)
+            
+            client = create_deepseek_client(timeout=BATCH_TIMEOUT)
+            counts = BatchClassifier(conn, client, args.workers, args.rate).run(products, args.batch_size, show_progress)
+            print(f"\n✅ 完成，用时 {time.perf_counter() - start_time:.1f} 秒：已分类 {counts['classified']}，"
+                  f"未返回 {counts['missing']}，失败 {counts['failed']}；使用 review 查看建议")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API Latency Benchmark
+End-to-end latency of the apps' external API calls against the local
+stand-in server: Baidu OCR recognition, DeepSeek chat (streamed, with the
+time until the classification line arrives) and the Juhe barcode query.
+Requests go through the same code as the apps (the shared pooled HTTP
+client with its retries and circuit breakers, and the DeepSeek client), so
+the effect of injected latency, errors and rate limits on what a user waits
+for shows up in the numbers. The retry column counts retries of the shared
+HTTP client; the DeepSeek client retries on its own.
+
+By default every API gets its own stand-in server in this process on a free
+port, like the real services on separate hosts, and the fault options are
+passed to it. With --url all APIs are sent to one server started
+separately, so they also share one circuit breaker.
+
+Usage:
+    python api_latency_benchmark.py [--requests 50] [--concurrency 4] [--api deepseek --api baidu --api juhe]
+                                    [--latency-ms 200] [--jitter-ms 100] [--error-rate 0.1] [--rate-limit 5]
+    python api_latency_benchmark.py --url http://127.0.0.1:8765
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import http_client
+from local_api_server import LocalApiServer, DEFAULT_TOKEN_DELAY_MS
+from ocr_service import request_baidu_access_token, recognize_text_baidu
+from ai_assistant import (ReplyLineSplitter, create_deepseek_client, is_classification_line, WASTE_SYSTEM_PROMPT,
+                          DEEPSEEK_MODEL)
+from gs1_barcode_query import query_barcode
+from product_database import DB_PATH
+
+
+APIS = ('baidu', 'deepseek', 'juhe')
+
+QUESTIONS = ('plastic bottle', 'battery', 'banana peel', 'cardboard box', 'tissue', 'glass jar',
+             'expired medicine', 'coffee grounds')
+SAMPLE_BARCODES = ('6901234567892', '6920202888883', '4901234567894')
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def sample_image():
+    """A small label-like PNG for the OCR requests"""
+    image = np.full((120, 480, 3), 255, dtype=np.uint8)
+    cv2.putText(image, 'ORANGE JUICE 1L', (10, 75), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (0, 0, 0), 3)
+    success, encoded = cv2.imencode('.png', image)
+    if not success:
+        raise Exception("图像编码失败")
+    return encoded.tobytes()
+
+
+def load_barcodes(db_path, limit=200):
+    """Barcodes from the product database, or samples when there is none"""
+    if not os.path.exists(db_path):
+        return list(SAMPLE_BARCODES)
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT gs1_code FROM products WHERE gs1_code GLOB '[0-9]*' LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows] or list(SAMPLE_BARCODES)
+
+
+# ========== 各API的单次请求 ==========
+
+class BaiduScenario:
+    """One OCR recognition as the product manager sends it"""
+    
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.image_data = sample_image()
+        self.access_token = request_baidu_access_token(base_url=base_url)[0]
+    
+    def __call__(self, index):
+        recognize_text_baidu(self.image_data, self.access_token, self.base_url)
+        return None
+
+
+class DeepSeekScenario:
+    """One streamed question as the scanner sends it; returns the time to the classification line"""
+    
+    def __init__(self, base_url):
+        self.client = create_deepseek_client(base_url=base_url)
+        self.breaker = http_client.circuit_breaker(base_url)
+    
+    def __call__(self, index):
+        from openai import APIConnectionError, InternalServerError
+        
+        start_time = time.perf_counter()
+        stream = self.breaker.call(
+            self.client.chat.completions.create,
+            model=DEEPSEEK_MODEL,
+            messages=[
+                {"role": "system", "content": WASTE_SYSTEM_PROMPT},
+                {"role": "user", "content": QUESTIONS[index % len(QUESTIONS)]},
+            ],
+            stream=True,
+            stream_options={"include_usage": True},
+            failure_exceptions=(APIConnectionError, InternalServerError)
+        )
+        splitter = ReplyLineSplitter()
+        classified_time = None
+        for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            lines = splitter.feed(chunk.choices[0].delta.content)
+            if classified_time is None and any(is_classification_line(line) for line in lines):
+                classified_time = time.perf_counter() - start_time
+        return classified_time
+
+
+class JuheScenario:
+    """One barcode query as the GS1 query tool sends it"""
+    
+    def __init__(self, base_url, barcodes):
+        self.api_url = base_url + '/jhbar/bar'
+        self.barcodes = barcodes
+    
+    def __call__(self, index):
+        response = query_barcode(self.barcodes[index % len(self.barcodes)], 'local-benchmark', self.api_url)
+        response.raise_for_status()
+        result = response.json()
+        if result.get('error_code') != 0:
+            raise Exception(f"error_code {result.get('error_code')}: {result.get('reason')}")
+        return None
+
+
+# ========== 测量 ==========
+
+def run_scenario(scenario, requests_count, concurrency):
+    """Send requests_count requests, concurrency at a time; returns the measurements"""
+    results = {'latencies': [], 'first': [], 'errors': {}, 'elapsed': 0.0}
+    lock = threading.Lock()
+    
+    def one_request(index):
+        start_time = time.perf_counter()
+        try:
+            first = scenario(index)
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)[:60]}"
+            with lock:
+                results['errors'][error] = results['errors'].get(error, 0) + 1
+            return
+        latency = time.perf_counter() - start_time
+        with lock:
+            results['latencies'].append(latency)
+            if first is not None:
+                results['first'].append(first)
+    
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one_request, range(requests_count)))
+    results['elapsed'] = time.perf_counter() - start_time
+    return results
+
+
+def start_server(args):
+    """Start a stand-in server on a free port; returns (server, base_url)"""
+    server = LocalApiServer(('127.0.0.1', 0), 'auto', 'ORANGE JUICE 1L', args.latency_ms, args.jitter_ms,
+                            args.error_rate, args.rate_limit, args.db, args.token_delay_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:>7.0f}" if seconds is not None else f"{'-':>7}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end API latency against the local stand-in server')
+    parser.add_argument('--api', action='append', choices=APIS, help='API to measure (repeatable, default: all)')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per API (default: 50)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Requests in flight at once (default: 4)')
+    parser.add_argument('--url', help='Use an already running stand-in server instead of starting one')
+    parser.add_argument('--db', default=DB_PATH, help='Products database for barcodes and AI answers')
+    parser.add_argument('--latency-ms', type=int, default=0, help='Injected delay before every response')
+    parser.add_argument('--jitter-ms', type=int, default=0, help='Random extra delay of up to this much')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests failing with HTTP 503')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Requests per second per API before rate-limit replies')
+    parser.add_argument('--token-delay-ms', type=int, default=DEFAULT_TOKEN_DELAY_MS,
+                        help='Delay between streamed chat chunks (default: 20)')
+    parser.add_argument('--verbose', action='store_true', help='Show the request logs of the apps and the server')
+    args = parser.parse_args()
+    
+    apis = args.api or list(APIS)
+    barcodes = load_barcodes(args.db)
+    client = http_client.default_client()
+    
+    print(f"🚀 每个API {args.requests} 个请求，并发 {args.concurrency}"
+          + (f"，服务: {args.url}" if args.url else
+             f"，注入延迟 {args.latency_ms}+{args.jitter_ms} ms，错误率 {args.error_rate:.0%}，"
+             f"限流 {args.rate_limit or '不限'}/秒"))
+    header = (f"{'API':<10} {'成功':>5} {'失败':>5} {'p50ms':>7} {'p95ms':>7} {'p99ms':>7} {'最大ms':>7} "
+              f"{'分类p50':>7} {'分类p95':>7} {'请求/秒':>7} {'重试':>5}")
+    print(header)
+    print("-" * len(header))
+    reports = []
+    
+    for api in apis:
+        server = None
+        base_url = args.url.rstrip('/') if args.url else None
+        retries_before = client.stats['retries']
+        output = io.StringIO()
+        try:
+            # 应用代码和替身服务会逐条打印请求日志，测量时不显示
+            with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(output):
+                if base_url is None:
+                    server, base_url = start_server(args)
+                if api == 'baidu':
+                    scenario = BaiduScenario(base_url)
+                elif api == 'deepseek':
+                    scenario = DeepSeekScenario(base_url)
+                else:
+                    scenario = JuheScenario(base_url, barcodes)
+                results = run_scenario(scenario, args.requests, args.concurrency)
+        except Exception as e:
+            print(f"❌ {api} 测量失败: {e}")
+            continue
+        finally:
+            if server:
+                server.shutdown()
+                server.server_close()
+        
+        latencies = results['latencies']
+        failures = sum(results['errors'].values())
+        breaker = client.breaker(base_url)
+        reports.append((api, results, breaker.state))
+        print(f"{api:<10} {len(latencies):>5} {failures:>5} {format_ms(percentile(latencies, 50))} "
+              f"{format_ms(percentile(latencies, 95))} {format_ms(percentile(latencies, 99))} "
+              f"{format_ms(max(latencies) if latencies else None)} {format_ms(percentile(results['first'], 50))} "
+              f"{format_ms(percentile(results['first'], 95))} "
+              f"{(len(latencies) + failures) / results['elapsed']:>7.1f} {client.stats['retries'] - retries_before:>5}")
+    
+    for api, results, breaker_state in reports:
+        if results['errors'] or breaker_state != 'closed':
+            print(f"\n⚠️  {api} 失败原因（熔断器: {breaker_state}）:")
+            for error, count in sorted(results['errors'].items(), key=lambda item: -item[1]):
+                print(f"  {count:>5} × {error}")
+    if 'deepseek' in apis:
+        print("\n💡 分类p50/p95: DeepSeek回答中分类行到达的时间，即产品面板更新前的等待")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,14 +7,24 @@ from tkinter import ttk, scrolledtext, messagebox
 import threading
 import time
 import sqlite3
-from openai import OpenAI
+from openai import APIConnectionError, InternalServerError
 import speech_recognition as sr
 import pyaudio
 import socket
 import json
+import os
+import argparse
+from urllib.request import pathname2url
+from product_database import upgrade_database, load_product_with_parts, format_part_disposal, normalize_gtin, ChangeFeed, ScanEventWriter, GTIN_SYMBOLOGIES
+from catalog_snapshot import CatalogSnapshot, build_snapshot
+from photo_store import resolve_photo_path
+import http_client
+from ai_assistant import (AIRequestManager, AnswerCache, LocalClassifier, ReplyLineSplitter, create_deepseek_client,
+                          format_local_answer, is_classification_line, WASTE_SYSTEM_PROMPT, DEEPSEEK_BASE_URL,
+                          DEEPSEEK_MODEL, STREAM_FLUSH_MS, LOCAL_CONFIDENCE_THRESHOLD)
 
 class BarcodeScannerStable:
-    def __init__(self):
+    def __init__(self, snapshot_path=None):
         self.root = tk.Tk()
         self.root.title("Product Barcode Scanner (Stable Version)")
         self.root.geometry("1400x900")
@@ -28,6 +38,9 @@ class BarcodeScannerStable:
         # 已识别的条形码集合（用于去重）
         self.detected_barcodes = set()
         
+        # 条形码对应的码制（EAN13/UPCA/UPCE...），用于规范化为GTIN-14
+        self.barcode_types = {}
+        
         # 编码上传相关变量
         self.barcode_checkboxes = {}  # 存储每个编码的checkbox
         self.selected_barcodes = set()  # 存储选中的编码
@@ -36,18 +49,59 @@ class BarcodeScannerStable:
         self.last_gs1_code = None
         
         # 数据库相关变量
+        # 有目录快照时数据库只读打开，升级推迟到后台线程（见init_database）
         self.db_path = 'products.db'
+        self.snapshot_path = snapshot_path
+        self.db_upgrade_pending = False
         self.init_database()
         
+        # 只读目录快照（自助终端用），查询时优先使用，快照无法回答时再查数据库
+        # 快照过期时改查数据库；变更停止一段时间后在后台线程重新生成，再换上新文件
+        self.snapshot = None
+        self.snapshot_stale = False
+        self.snapshot_rebuilding = False
+        self.snapshot_rebuild_job = None
+        self.snapshot_rebuild_delay_ms = 2000
+        if snapshot_path:
+            self.load_snapshot()
+        
+        # 扫描记录：后台线程批量写入scan_events，扫描路径不等待磁盘
+        self.scanner_lane = os.environ.get('SCANNER_LANE') or socket.gethostname()
+        self.scan_log = ScanEventWriter(self.db_path) if self.conn else None
+        
+        # 最近一次数据库查询的耗时(毫秒)和结果，用于扫描记录
+        self.last_lookup_ms = None
+        self.last_lookup_result = None
+        
         # 错误计数
         self.error_count = 0
         self.max_errors = 5
         
         # DeepSeek OpenAI客户端配置
-        self.openai_client = OpenAI(
-            api_key="sk-c33383af3d7c47488b9b55000b659d50", 
-            base_url="https://api.deepseek.com"
-        )
+        # 客户端复用连接；限定超时和重试次数，服务故障时由熔断器快速失败
+        self.openai_client = create_deepseek_client()
+        self.deepseek_breaker = http_client.circuit_breaker(DEEPSEEK_BASE_URL)
+        
+        # AI请求：限制并发，相同问题合并，新问题或新扫描使旧请求失效
+        self.ai_requests = AIRequestManager()
+        
+        # 流式回复：工作线程按请求缓存收到的文字，主线程合并后定时追加到聊天框；
+        # 只追加聊天框中正在显示的回答（chat_stream_request）的文字，过期请求的文字直接丢弃
+        self.chat_stream_pending = []
+        self.chat_stream_flush_scheduled = False
+        self.chat_stream_lock = threading.Lock()
+        self.chat_stream_request = None
+        
+        # 本地分类器：根据产品目录和关键词规则直接回答常见问题，可信度低时才询问DeepSeek
+        # 产品目录在启动后由后台线程加载（finish_database_startup），加载完成前只用关键词规则
+        self.local_classifier = LocalClassifier()
+        
+        # 常见问题的回答缓存（按规范化问题和提示词版本），命中时不调用API
+        try:
+            self.ai_cache = AnswerCache()
+        except Exception as e:
+            print(f"打开AI回答缓存失败: {e}")
+            self.ai_cache = None
         
         # 语音识别配置
         self.recognizer = sr.Recognizer()
@@ -64,6 +118,14 @@ class BarcodeScannerStable:
         # 创建GUI界面
         self.create_widgets()
         
+        # 监听产品管理器等其他进程的数据库变更
+        self.change_feed = ChangeFeed(self.conn) if self.conn else None
+        self.root.after(1000, self.poll_product_changes)
+        
+        # 推迟的数据库升级和分类器加载不占用启动时间
+        if self.conn:
+            threading.Thread(target=self.finish_database_startup, daemon=True).start()
+        
         # 启动摄像头
         self.start_camera()
     
@@ -215,6 +277,12 @@ class BarcodeScannerStable:
         self.product_waste_info_label = tk.Label(self.product_waste_frame, text="Classification: Not Set", 
                                                 font=('Arial', 12, 'bold'), bg='#fff8f0', fg='#333333')
         self.product_waste_info_label.pack(pady=3)
+        
+        # 4. 部件分类区域（每个部件的投放说明）
+        self.parts_label = tk.Label(self.product_info_container, text="", 
+                                   font=('Arial', 11), bg='white', fg='#333333',
+                                   justify=tk.LEFT, anchor='w', wraplength=600)
+        self.parts_label.pack(fill=tk.X, pady=(10, 0))
     
     def update_product_info_display(self, product_data):
         """更新图形化产品信息显示"""
@@ -232,7 +300,7 @@ class BarcodeScannerStable:
                 try:
                     # 尝试加载并显示产品照片
                     from PIL import Image, ImageTk
-                    img = Image.open(product_image)
+                    img = Image.open(resolve_photo_path(product_image))
                     # 设置图片高度为4cm，宽度自动调整
                     # 假设屏幕DPI为96，1英寸=2.54cm，所以1cm≈37.8像素
                     cm_to_pixels = 37.8
@@ -244,6 +312,8 @@ class BarcodeScannerStable:
                     aspect_ratio = original_width / original_height
                     target_width_pixels = int(target_height_pixels * aspect_ratio)
                     
+                    # JPEG按目标尺寸缩小解码，避免解码整张大图
+                    img.draft('RGB', (target_width_pixels, target_height_pixels))
                     img = img.resize((target_width_pixels, target_height_pixels), Image.Resampling.LANCZOS)
                     
                     photo = ImageTk.PhotoImage(img)
@@ -367,12 +437,33 @@ class BarcodeScannerStable:
             self.product_waste_status_label.config(text="Not Set", fg='#6B7280')
             self.product_waste_icon_label.config(image="", text="❓")
             self.product_waste_info_label.config(text="Classification: Not Set")
+            
+            self.parts_label.config(text="")
         except Exception as e:
             print(f"清空产品信息显示错误: {e}")
     
+    def update_parts_display(self, parts):
+        """更新部件投放说明显示"""
+        try:
+            if parts:
+                lines = ["Parts:"] + [f"  • {format_part_disposal(part)}" for part in parts]
+                self.parts_label.config(text="\n".join(lines))
+            else:
+                self.parts_label.config(text="")
+        except Exception as e:
+            print(f"更新部件显示错误: {e}")
+    
     def init_database(self):
         """初始化数据库连接"""
         try:
+            if self.snapshot_path and os.path.exists(self.snapshot_path) and os.path.exists(self.db_path):
+                # 扫描由快照回答，主连接只读；建表和升级由finish_database_startup在后台完成
+                uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+                self.conn = sqlite3.connect(uri, uri=True)
+                self.db_upgrade_pending = True
+                print("数据库已以只读方式打开")
+                return
+            
             self.conn = sqlite3.connect(self.db_path)
             cursor = self.conn.cursor()
             
@@ -393,12 +484,88 @@ class BarcodeScannerStable:
             """)
             
             self.conn.commit()
+            
+            # 部件索引、搜索索引等辅助结构
+            upgrade_database(self.conn)
             print("数据库初始化成功")
             
         except Exception as e:
             print(f"数据库初始化失败: {e}")
             self.conn = None
         
+    def load_snapshot(self):
+        """打开目录快照，不存在或已过期时在后台重新生成"""
+        try:
+            if os.path.exists(self.snapshot_path):
+                self.snapshot = CatalogSnapshot(self.snapshot_path)
+                print(f"目录快照已加载: {self.snapshot_path} ({self.snapshot.count} 个产品)")
+            
+            if self.conn and (self.snapshot is None or self.snapshot.is_stale(self.conn)):
+                self.schedule_snapshot_rebuild(0)
+        except Exception as e:
+            print(f"加载目录快照失败: {e}")
+            self.snapshot = None
+    
+    def schedule_snapshot_rebuild(self, delay_ms=None):
+        """标记快照已过期，并在变更停止delay_ms毫秒后重新生成（连续的变更只生成一次）"""
+        self.snapshot_stale = True
+        if self.snapshot_rebuild_job:
+            self.root.after_cancel(self.snapshot_rebuild_job)
+        if delay_ms is None:
+            delay_ms = self.snapshot_rebuild_delay_ms
+        self.snapshot_rebuild_job = self.root.after(delay_ms, self.start_snapshot_rebuild)
+    
+    def start_snapshot_rebuild(self):
+        """启动后台生成；正在生成时稍后再试"""
+        self.snapshot_rebuild_job = None
+        if self.snapshot_rebuilding:
+            self.schedule_snapshot_rebuild()
+            return
+        self.snapshot_rebuilding = True
+        threading.Thread(target=self.rebuild_snapshot_worker, daemon=True).start()
+    
+    def rebuild_snapshot_worker(self):
+        """后台线程：用独立的数据库连接生成新快照文件，交给主线程换上"""
+        new_path = self.snapshot_path + '.new'
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                build_snapshot(conn, new_path)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"生成目录快照失败: {e}")
+            new_path = None
+        self.root.after(0, self.swap_snapshot, new_path)
+    
+    def swap_snapshot(self, new_path):
+        """主线程：关闭旧快照，用os.replace换上新文件并重新映射"""
+        self.snapshot_rebuilding = False
+        if new_path is None:
+            return
+        try:
+            # 先关闭映射，Windows下被映射的文件无法替换
+            if self.snapshot:
+                self.snapshot.close()
+                self.snapshot = None
+            os.replace(new_path, self.snapshot_path)
+            self.snapshot = CatalogSnapshot(self.snapshot_path)
+            # 生成期间又有变更时仍然过期，等待已安排的下一次生成
+            self.snapshot_stale = self.snapshot.is_stale(self.conn)
+            print(f"目录快照已更新: {self.snapshot_path} ({self.snapshot.count} 个产品)")
+        except Exception as e:
+            print(f"加载目录快照失败: {e}")
+            self.snapshot = None
+    
+    def lookup_product(self, code):
+        """查询产品及部件：优先查目录快照，快照过期或无法回答（非GTIN条码、快照中没有）时查数据库"""
+        symbology = self.barcode_types.get(code)
+        if self.snapshot and not self.snapshot_stale:
+            result = self.snapshot.lookup(code, symbology)
+            if result is not None:
+                return result
+        return load_product_with_parts(self.conn, code, symbology)
+    
     def create_widgets(self):
         """创建GUI界面"""
         # 主框架
@@ -720,16 +887,22 @@ class BarcodeScannerStable:
     def add_barcode_to_output(self, barcode_data, barcode_type):
         """Add barcode to output area and auto-search if GS1 code"""
         try:
-            timestamp = time.strftime("%H:%M:%S")
+            scanned_at = time.time()
+            timestamp = time.strftime("%H:%M:%S", time.localtime(scanned_at))
             output_text = f"[{timestamp}] {barcode_type}: {barcode_data}\n"
             
+            # 记录码制
+            self.barcode_types[barcode_data] = barcode_type
+            
             # 在主线程中更新GUI
             self.root.after(0, self.update_recognition_text, output_text)
             self.root.after(0, self.update_code_combobox, barcode_data)
             
             # 如果是GS1代码，自动搜索
-            if barcode_type in ['EAN13', 'EAN8', 'UPC_A', 'UPC_E', 'CODE128', 'CODE39']:
-                self.root.after(100, self.auto_search_barcode, barcode_data)
+            if barcode_type in ['EAN13', 'EAN8', 'UPCA', 'UPCE', 'UPC_A', 'UPC_E', 'CODE128', 'CODE39']:
+                self.root.after(100, self.auto_search_barcode, barcode_data, scanned_at)
+            else:
+                self.log_scan_event(barcode_data, scanned_at, 'not_searched')
                 
         except Exception as e:
             print(f"添加输出错误: {e}")
@@ -755,21 +928,33 @@ class BarcodeScannerStable:
         except Exception as e:
             print(f"更新下拉框错误: {e}")
     
-    def auto_search_barcode(self, barcode_data):
+    def auto_search_barcode(self, barcode_data, scanned_at=None):
         """自动搜索条形码"""
         try:
+            # 新的扫描使还在进行的AI问题失效，旧回答不会覆盖新产品
+            self.ai_requests.supersede()
+            
             # 设置选中的代码
             self.selected_code_var.set(barcode_data)
             
             # 执行搜索
+            self.last_lookup_ms = self.last_lookup_result = None
             found = self.search_product_in_database()
-            
-            # 如果当前编码未找到且存在上一个GS1编码，尝试搜索上一个编码
-            if not found and self.last_gs1_code and self.last_gs1_code != barcode_data:
+            latency_ms = self.last_lookup_ms
+            outcome = 'found' if found else 'miss'
+            
+            # 只有EAN/UPC条码校验失败（误读的残缺条码）时才尝试搜索上一个编码；
+            # 其他未找到的编码（包括CODE128等非GTIN条码）都是新产品，不能显示上一个产品的信息
+            symbology = self.barcode_types.get(barcode_data)
+            misread = symbology in GTIN_SYMBOLOGIES and normalize_gtin(barcode_data, symbology) is None
+            if not found and misread and self.last_gs1_code and self.last_gs1_code != barcode_data:
                 print(f"当前编码 {barcode_data} 未找到，尝试上一个编码: {self.last_gs1_code}")
                 self.selected_code_var.set(self.last_gs1_code)
                 found = self.search_product_in_database()
+                if latency_ms is not None and self.last_lookup_ms is not None:
+                    latency_ms += self.last_lookup_ms
                 if found:
+                    outcome = 'found_previous'
                     self.update_status(f"Status: 使用上一个编码找到产品: {self.last_gs1_code}")
                 else:
                     self.update_status(f"Status: 当前编码和上一个编码都未找到产品信息")
@@ -779,13 +964,31 @@ class BarcodeScannerStable:
                 else:
                     self.update_status(f"Status: 未找到产品信息 - {barcode_data}")
             
-            # 更新上一个GS1编码
-            self.last_gs1_code = barcode_data
+            # 记录本次扫描
+            self.log_scan_event(barcode_data, scanned_at, outcome, latency_ms,
+                                self.last_lookup_result if found else None)
+            
+            # 更新上一个GS1编码（误读的条码不作为备用）
+            if not misread:
+                self.last_gs1_code = barcode_data
             
         except Exception as e:
             print(f"自动搜索错误: {e}")
             self.update_status(f"Status: Auto-search failed - {str(e)}")
     
+    def log_scan_event(self, barcode_data, scanned_at, outcome, latency_ms=None, product=None):
+        """把扫描记录交给后台写入线程（不阻塞）"""
+        try:
+            if not self.scan_log:
+                return
+            packaging_waste_type = product_waste_type = None
+            if product:
+                packaging_waste_type, product_waste_type = product[2], product[3]
+            self.scan_log.log(barcode_data, self.barcode_types.get(barcode_data), self.scanner_lane,
+                              outcome, latency_ms, packaging_waste_type, product_waste_type, scanned_at)
+        except Exception as e:
+            print(f"记录扫描错误: {e}")
+    
     def search_product_in_database(self):
         """在数据库中搜索选中的GS1代码"""
         try:
@@ -798,21 +1001,16 @@ class BarcodeScannerStable:
                 messagebox.showerror("错误", "数据库连接失败")
                 return False
             
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                SELECT product_name, product_image, packaging_waste_type, 
-                       product_waste_type, packaging_material, plastic_type, created_at
-                FROM products 
-                WHERE gs1_code = ?
-            """, (selected_code,))
-            
-            result = cursor.fetchone()
+            # 一次索引连接查询同时取出产品和所有部件（按GTIN-14匹配各码制变体）
+            lookup_start = time.perf_counter()
+            result, parts = self.lookup_product(selected_code)
+            self.last_lookup_ms = (time.perf_counter() - lookup_start) * 1000
+            self.last_lookup_result = result
             
             if result:
-                product_name, product_image, packaging_waste_type, product_waste_type, packaging_material, plastic_type, created_at = result
-                
                 # 使用新的图形化显示更新产品信息
                 self.update_product_info_display(result)
+                self.update_parts_display(parts)
                 
                 return True
                 
@@ -873,12 +1071,15 @@ class BarcodeScannerStable:
             
             if os.path.exists(product_manager_path):
                 # 启动产品管理器，并传递GS1代码作为参数
-                subprocess.Popen([
+                command = [
                     sys.executable, 
                     product_manager_path, 
                     "--gs1-code", 
                     gs1_code
-                ])
+                ]
+                if gs1_code in self.barcode_types:
+                    command += ["--symbology", self.barcode_types[gs1_code]]
+                subprocess.Popen(command)
                 
                 self.add_chat_message("System", f"已打开产品管理器，GS1代码 '{gs1_code}' 已预填。")
                 self.update_status(f"Status: 已打开产品管理器添加新产品 - {gs1_code}")
@@ -892,6 +1093,51 @@ class BarcodeScannerStable:
             messagebox.showerror("错误", f"无法打开产品管理器: {str(e)}")
             self.add_chat_message("System", f"Error opening product manager: {str(e)}")
     
+    def poll_product_changes(self):
+        """轮询数据库变更，只刷新受影响的产品"""
+        try:
+            changes = self.change_feed.poll() if self.change_feed else []
+            if changes:
+                # 数据库有变更，后台重新生成目录快照，期间改查数据库
+                if self.snapshot_path:
+                    self.schedule_snapshot_rebuild()
+                self.load_local_classifier()
+                
+                current_code = self.selected_code_var.get()
+                current_gtin = normalize_gtin(current_code, self.barcode_types.get(current_code))
+                
+                for product_id, gs1_code, operation in changes:
+                    if not gs1_code:
+                        continue
+                    
+                    # 新增或删除的产品可以重新询问
+                    self.asked_gs1_codes.discard(gs1_code)
+                    
+                    # 当前显示的产品被修改时刷新显示
+                    if current_code and (gs1_code == current_code or 
+                                         (current_gtin and normalize_gtin(gs1_code) == current_gtin)):
+                        self.refresh_displayed_product(current_code, operation)
+        except Exception as e:
+            print(f"轮询数据库变更错误: {e}")
+        finally:
+            self.root.after(1000, self.poll_product_changes)
+    
+    def refresh_displayed_product(self, code, operation):
+        """重新加载当前显示的产品（不弹出添加询问）"""
+        try:
+            result, parts = self.lookup_product(code)
+            if result:
+                self.update_product_info_display(result)
+                self.update_parts_display(parts)
+                if operation == 'insert':
+                    self.add_chat_message("System", f"产品 '{code}' 已添加到数据库。")
+                self.update_status(f"Status: 产品信息已更新 - {code}")
+            else:
+                self.clear_product_info_display()
+                self.update_status(f"Status: 产品已被删除 - {code}")
+        except Exception as e:
+            print(f"刷新产品显示错误: {e}")
+    
     def update_status(self, status_text):
         """Update status display (called in main thread)"""
         try:
@@ -912,59 +1158,224 @@ class BarcodeScannerStable:
             # 显示用户消息
             self.add_chat_message("User", message)
             
-            # 在后台线程中调用DeepSeek API
-            threading.Thread(target=self.get_deepseek_response, args=(message,), daemon=True).start()
+            # 本地分类器可信度足够时直接回答，不调用API
+            local_result = self.local_classifier.classify(message)
+            if local_result and local_result['confidence'] >= LOCAL_CONFIDENCE_THRESHOLD:
+                local_answer = format_local_answer(local_result)
+                self.ai_requests.supersede()
+                self.add_chat_message("Local Classifier", local_answer)
+                self.parse_and_update_waste_classification(local_answer)
+                return
+            
+            # 在请求池中调用DeepSeek API；相同问题正在回答时不重复请求
+            request, coalesced = self.ai_requests.submit(message, self.get_deepseek_response)
+            if coalesced:
+                print(f"相同问题正在回答中，不重复请求: {message}")
             
         except Exception as e:
             print(f"发送聊天消息错误: {e}")
             self.add_chat_message("System", f"Failed to send message: {str(e)}")
     
-    def get_deepseek_response(self, user_message):
-        """获取DeepSeek回复"""
+    def finish_database_startup(self):
+        """后台线程：用独立的数据库连接完成推迟的升级，并加载本地分类器的产品目录"""
         try:
-            # 构建垃圾分类相关的系统提示
-            system_prompt = """You are a professional waste classification assistant. Please determine which waste category the product provided by the user should belong to.
-
-Waste Classification Standards:
-1. Recyclable Waste: Paper, plastic, metal, glass, textiles and other reusable materials
-2. Wet Waste (Organic Waste): Food scraps, fruit peels, vegetable leaves and other easily decomposable organic waste
-3. Hazardous Waste: Batteries, medicines, paint, fluorescent tubes and other environmentally harmful waste
-4. Other Waste (Dry Waste): Other waste except the above three categories
-
-Please answer concisely and clearly in the following format:
-Product Name: [Product Name]
-Waste Classification: [Waste Category]
-Explanation: [Brief explanation of the reason]
-
-If the product name is not clear enough, please ask for more details.
-
-IMPORTANT: Please respond in English only."""
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            try:
+                if self.db_upgrade_pending:
+                    upgrade_database(conn)
+                    print("数据库升级检查完成")
+                count = self.local_classifier.load_catalog(conn)
+                print(f"本地分类器已加载 {count} 个产品名称")
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"后台数据库初始化错误: {e}")
+        if self.db_upgrade_pending:
+            self.db_upgrade_pending = False
+            self.root.after(0, self.restart_change_feed)
+    
+    def restart_change_feed(self):
+        """升级可能刚创建变更记录表，此前无法监听变更时重新开始监听"""
+        if self.conn and not (self.change_feed and self.change_feed.enabled):
+            try:
+                self.change_feed = ChangeFeed(self.conn)
+            except Exception as e:
+                print(f"监听数据库变更失败: {e}")
+    
+    def load_local_classifier(self):
+        """(Re)load the catalog tier of the local classifier"""
+        if not self.conn:
+            return
+        try:
+            count = self.local_classifier.load_catalog(self.conn)
+            print(f"本地分类器已加载 {count} 个产品名称")
+        except Exception as e:
+            print(f"加载本地分类器错误: {e}")
+    
+    def get_deepseek_response(self, request):
+        """获取DeepSeek回复（在AI请求池中运行）"""
+        user_message = request.question
+        try:
+            cached_response = self.ai_cache.lookup(user_message) if self.ai_cache else None
+            if cached_response is not None:
+                print(f"AI回答来自缓存: {user_message}")
+                
+                # 在主线程中更新聊天显示
+                self.root.after(0, self.add_chat_message, "DeepSeek Assistant", cached_response)
+                
+                # 解析回复并更新垃圾分类显示
+                self.root.after(0, self.apply_ai_classification, request, cached_response)
+                return
             
-            response = self.openai_client.chat.completions.create(
-                model="deepseek-chat",
+            start_time = time.perf_counter()
+            stream = self.deepseek_breaker.call(
+                self.openai_client.chat.completions.create,
+                model=DEEPSEEK_MODEL,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": WASTE_SYSTEM_PROMPT},
                     {"role": "user", "content": user_message},
                 ],
-                stream=False
+                stream=True,
+                stream_options={"include_usage": True},
+                failure_exceptions=(APIConnectionError, InternalServerError)
             )
             
-            ai_response = response.choices[0].message.content
+            # 逐段显示收到的文字；分类行一完整就更新产品面板，不等整个回答
+            self.root.after(0, self.begin_assistant_message, request)
+            splitter = ReplyLineSplitter()
+            parts = []
+            tokens = 0
+            first_token_time = None
+            classified = False
+            superseded = False
+            try:
+                for chunk in stream:
+                    # 已有更新的问题或扫描时停止接收，关闭连接
+                    if not request.is_current():
+                        superseded = True
+                        stream.close()
+                        break
+                    if chunk.usage:
+                        tokens = chunk.usage.total_tokens
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    text = chunk.choices[0].delta.content
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter()
+                    parts.append(text)
+                    self.queue_chat_text(request, text)
+                    
+                    if not classified and any(is_classification_line(line) for line in splitter.feed(text)):
+                        classified = True
+                        self.root.after(0, self.apply_ai_classification, request, splitter.completed_text)
+            except Exception:
+                # 请求已被接受，接收中途的错误（连接断开、读取超时）是服务故障，计入熔断器
+                self.deepseek_breaker.record_failure()
+                raise
+            finally:
+                self.queue_chat_text(request, None)
+            
+            if superseded:
+                print(f"DeepSeek回答已被取代: {user_message}")
+                return
+            
+            ai_response = "".join(parts)
+            if first_token_time is not None:
+                print(f"DeepSeek首字 {(first_token_time - start_time) * 1000:.0f} ms，"
+                      f"完整回答 {(time.perf_counter() - start_time) * 1000:.0f} ms")
             
-            # 在主线程中更新聊天显示
-            self.root.after(0, self.add_chat_message, "DeepSeek Assistant", ai_response)
+            # 没有标准分类行时，用完整回答解析
+            if not classified:
+                self.root.after(0, self.apply_ai_classification, request, ai_response)
             
-            # 解析回复并更新垃圾分类显示
-            self.root.after(0, self.parse_and_update_waste_classification, ai_response)
+            # 只缓存给出了分类的回答，追问细节的回答不缓存
+            if self.ai_cache and self.extract_waste_type_from_response(ai_response):
+                self.ai_cache.store(user_message, ai_response, tokens)
             
         except Exception as e:
             print(f"获取DeepSeek回复错误: {e}")
             error_msg = f"Failed to get response: {str(e)}"
             self.root.after(0, self.add_chat_message, "System", error_msg)
     
+    def apply_ai_classification(self, request, ai_response):
+        """Update the product panel from an AI answer unless it was superseded (called in main thread)"""
+        if request.is_current():
+            self.parse_and_update_waste_classification(ai_response)
+        else:
+            print(f"忽略过期的AI回答: {request.question}")
+    
+    def begin_assistant_message(self, request):
+        """Start the streamed message of a request unless it was superseded (called in main thread)"""
+        # 先结束上一个回答，新回答不会和它的文字交错
+        self.flush_chat_text()
+        if not request.is_current():
+            return
+        try:
+            timestamp = time.strftime("%H:%M:%S")
+            self.chat_display.config(state=tk.NORMAL)
+            self.chat_display.insert(tk.END, f"[{timestamp}] DeepSeek Assistant:\n", "assistant")
+            self.chat_display.see(tk.END)
+            self.chat_display.config(state=tk.DISABLED)
+            self.chat_stream_request = request
+        except Exception as e:
+            print(f"添加聊天消息错误: {e}")
+    
+    def queue_chat_text(self, request, text):
+        """Worker thread: buffer streamed text of a request; one Tk update per STREAM_FLUSH_MS appends it
+        
+        text None ends the request's message.
+        """
+        with self.chat_stream_lock:
+            self.chat_stream_pending.append((request, text))
+            if self.chat_stream_flush_scheduled:
+                return
+            self.chat_stream_flush_scheduled = True
+        self.root.after(STREAM_FLUSH_MS, self.flush_chat_text)
+    
+    def flush_chat_text(self):
+        """Append the buffered text of the message being shown, drop that of other requests (called in main thread)"""
+        with self.chat_stream_lock:
+            pending = self.chat_stream_pending
+            self.chat_stream_pending = []
+            self.chat_stream_flush_scheduled = False
+        
+        parts = []
+        # 正在显示的回答已被取代：结束它，不再追加它的文字
+        if self.chat_stream_request is not None and not self.chat_stream_request.is_current():
+            parts.append("\n(superseded by a newer question)\n\n")
+            self.chat_stream_request = None
+        waiting = []
+        for request, text in pending:
+            if request is not self.chat_stream_request:
+                # 当前请求的消息还没开始（begin_assistant_message尚未执行）时保留，其他请求的丢弃
+                if request.is_current():
+                    waiting.append((request, text))
+                continue
+            if text is None:
+                parts.append("\n\n")
+                self.chat_stream_request = None
+            else:
+                parts.append(text)
+        if waiting:
+            with self.chat_stream_lock:
+                self.chat_stream_pending[:0] = waiting
+        
+        text = "".join(parts)
+        if not text:
+            return
+        try:
+            self.chat_display.config(state=tk.NORMAL)
+            self.chat_display.insert(tk.END, text, "assistant")
+            self.chat_display.see(tk.END)
+            self.chat_display.config(state=tk.DISABLED)
+        except Exception as e:
+            print(f"添加聊天消息错误: {e}")
+    
     def add_chat_message(self, sender, message):
         """添加聊天消息到显示区域"""
         try:
+            # 先追加尚未刷新的流式文字，消息才会出现在已收到的回答之后
+            self.flush_chat_text()
             self.chat_display.config(state=tk.NORMAL)
             
             # 添加时间戳
@@ -1358,6 +1769,7 @@ IMPORTANT: Please respond in English only."""
         try:
             self.detected_barcodes.clear()
             self.selected_barcodes.clear()
+            self.barcode_types.clear()
             self.recognition_text.delete(1.0, tk.END)
             
             # 清空图形化产品信息显示
@@ -1405,6 +1817,25 @@ IMPORTANT: Please respond in English only."""
             self.is_running = False
             if self.cap:
                 self.cap.release()
+            if self.scan_log:
+                self.scan_log.close()
+            if self.snapshot_rebuild_job:
+                self.root.after_cancel(self.snapshot_rebuild_job)
+            if self.snapshot:
+                self.snapshot.close()
+            classifier_stats = self.local_classifier.stats
+            if classifier_stats['questions']:
+                print(f"本地分类器: 回答 {classifier_stats['answered']}/{classifier_stats['questions']} 个问题")
+            self.ai_requests.shutdown()
+            request_stats = self.ai_requests.stats
+            if request_stats['submitted']:
+                print(f"AI请求: 发送 {request_stats['submitted']} 个, 合并 {request_stats['coalesced']} 个, "
+                      f"取消 {request_stats['superseded']} 个")
+            if self.ai_cache:
+                stats = self.ai_cache.stats()
+                print(f"AI回答缓存: 命中率 {stats['hit_rate'] * 100:.1f}% ({stats['hits']}/{stats['lookups']}), "
+                      f"节省 {stats['tokens_saved']} tokens")
+                self.ai_cache.close()
             if self.conn:
                 self.conn.close()
             cv2.destroyAllWindows()
@@ -1422,5 +1853,9 @@ IMPORTANT: Please respond in English only."""
             self.close_program()
 
 if __name__ == "__main__":
-    app = BarcodeScannerStable()
+    parser = argparse.ArgumentParser(description='Product Barcode Scanner')
+    parser.add_argument('--snapshot', type=str, help='Use a read-only catalog snapshot file for lookups (e.g. products.snapshot)')
+    args = parser.parse_args()
+    
+    app = BarcodeScannerStable(snapshot_path=args.snapshot)
     app.run()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Catalog Snapshot
+Compiles the products table into a compact read-only lookup file for kiosks.
+The file is memory-mapped and searched in place, so opening it is instant
+and a lookup touches only the pages it needs.
+
+File layout (little endian):
+    header   magic, format version, product count, source change id
+    keys     count x 14-byte GTIN-14 keys, sorted
+    offsets  (count + 1) x uint32 record offsets, relative to the records area
+    records  packed UTF-8 records: product fields joined by \\x1f, each part
+             appended as \\x1e followed by its fields joined by \\x1f
+
+Usage:
+    python catalog_snapshot.py build [--db products.db] [--output products.snapshot]
+    python catalog_snapshot.py lookup 6901234567892 [--symbology EAN13]
+    python catalog_snapshot.py info
+"""
+
+import argparse
+import bisect
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+from product_database import upgrade_database, normalize_gtin, table_exists, DB_PATH, PRODUCT_DETAIL_COLUMNS, PART_COLUMNS
+
+
+SNAPSHOT_PATH = 'products.snapshot'
+
+MAGIC = b'PCSNAP01'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIIq')
+KEY_SIZE = 14
+OFFSET = struct.Struct('<I')
+
+FIELD_SEPARATOR = '\x1f'
+PART_SEPARATOR = '\x1e'
+
+
+def source_version(conn):
+    """Id of the latest product change, used to tell whether a snapshot is stale"""
+    if not table_exists(conn, 'product_changes'):
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM product_changes").fetchone()[0]
+
+
+def pack_fields(values):
+    """Join field values, dropping separator characters from the text"""
+    fields = []
+    for value in values:
+        text = "" if value is None else str(value)
+        fields.append(text.replace(FIELD_SEPARATOR, " ").replace(PART_SEPARATOR, " "))
+    return FIELD_SEPARATOR.join(fields)
+
+
+def build_snapshot(conn, output_path=SNAPSHOT_PATH):
+    """Write a snapshot of all products with a GTIN code; returns the product count
+    
+    Products are keyed by gtin14, or by the normalized gs1_code when gtin14
+    is not set. A key shared by several products (GTIN variants that
+    collided when gtin14 was filled) is left out, so lookups of it go to the
+    database, which prefers the exactly matching gs1_code.
+    
+    The file is written next to the target and moved into place, so readers
+    never see a half-written snapshot.
+    """
+    version = source_version(conn)
+    product_columns = ", ".join(f"p.{column}" for column in PRODUCT_DETAIL_COLUMNS)
+    part_columns = ", ".join(f"pp.{column}" for column in PART_COLUMNS)
+    cursor = conn.execute(f'''
+        SELECT p.id, p.gtin14, p.gs1_code, {product_columns}, pp.id, {part_columns}
+        FROM products p
+        LEFT JOIN product_parts pp ON pp.product_id = p.id
+        WHERE p.gtin14 IS NOT NULL OR p.gs1_code IS NOT NULL
+        ORDER BY p.id, pp.id
+    ''')
+    
+    # 键 -> [产品id, 产品记录, 部件记录...]
+    products = {}
+    shared_keys = set()
+    detail_end = 3 + len(PRODUCT_DETAIL_COLUMNS)
+    for row in cursor:
+        key = row[1] or normalize_gtin(row[2])
+        if key is None:
+            continue
+        entry = products.get(key)
+        if entry is None:
+            entry = products[key] = [row[0], pack_fields(row[3:detail_end])]
+        elif entry[0] != row[0]:
+            shared_keys.add(key)
+            continue
+        if row[detail_end] is not None:
+            entry.append(pack_fields(row[detail_end + 1:]))
+    
+    keys = sorted(key for key in products if key not in shared_keys)
+    records = [products[key][1:] for key in keys]
+    
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(keys), version))
+        f.write("".join(keys).encode('ascii'))
+        
+        encoded = [PART_SEPARATOR.join(record).encode('utf-8') for record in records]
+        offset = 0
+        for data in encoded:
+            f.write(OFFSET.pack(offset))
+            offset += len(data)
+        f.write(OFFSET.pack(offset))
+        for data in encoded:
+            f.write(data)
+    os.replace(temp_path, output_path)
+    return len(keys)
+
+
+class SnapshotKeys:
+    """Sequence view of the sorted keys so bisect can search the mapping in place"""
+    
+    def __init__(self, data, count):
+        self.data = data
+        self.count = count
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, index):
+        start = HEADER.size + index * KEY_SIZE
+        return self.data[start:start + KEY_SIZE]
+
+
+class CatalogSnapshot:
+    """Read-only product lookups from a memory-mapped snapshot file"""
+    
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.file.close()
+            raise
+        
+        magic, version, self.count, self.source_version = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Not a catalog snapshot: {path}")
+        
+        self.keys = SnapshotKeys(self.data, self.count)
+        self.offsets_start = HEADER.size + self.count * KEY_SIZE
+        self.records_start = self.offsets_start + (self.count + 1) * OFFSET.size
+    
+    def close(self):
+        """Unmap and close the snapshot file"""
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+    
+    def is_stale(self, conn):
+        """True when products changed after the snapshot was built"""
+        return source_version(conn) != self.source_version
+    
+    def lookup(self, code, symbology=None):
+        """Look up a scanned code
+        
+        Returns (product, parts) like load_product_with_parts, with empty
+        strings for missing values. Returns None when the snapshot cannot
+        answer and the caller has to ask the database instead: the code is
+        not a valid GTIN, or it is not in the snapshot (a product added
+        since, or a GTIN shared by several products).
+        """
+        gtin14 = normalize_gtin(code, symbology)
+        if not gtin14:
+            return None
+        
+        key = gtin14.encode('ascii')
+        index = bisect.bisect_left(self.keys, key)
+        if index >= self.count or self.keys[index] != key:
+            return None
+        
+        start, end = struct.unpack_from('<II', self.data, self.offsets_start + index * OFFSET.size)
+        record = self.data[self.records_start + start:self.records_start + end].decode('utf-8')
+        product_fields, *part_records = record.split(PART_SEPARATOR)
+        product = tuple(product_fields.split(FIELD_SEPARATOR))
+        parts = [dict(zip(PART_COLUMNS, part.split(FIELD_SEPARATOR))) for part in part_records]
+        return product, parts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Catalog snapshot for read-only kiosk lookups')
+    parser.add_argument('command', choices=['build', 'lookup', 'info'])
+    parser.add_argument('code', nargs='?', help='Code to look up (lookup command)')
+    parser.add_argument('--db', default=DB_PATH, help='Products database (default: products.db)')
+    parser.add_argument('--output', default=SNAPSHOT_PATH, help='Snapshot file (default: products.snapshot)')
+    parser.add_argument('--symbology', type=str, help='Barcode symbology of the code (e.g. EAN13, UPCE)')
+    args = parser.parse_args()
+    
+    if args.command == 'build':
+        if not os.path.exists(args.db):
+            print(f"❌ 数据库文件不存在: {args.db}")
+            sys.exit(1)
+        conn = sqlite3.connect(args.db)
+        try:
+            upgrade_database(conn)
+            count = build_snapshot(conn, args.output)
+        finally:
+            conn.close()
+        print(f"✅ 已生成快照 {args.output}: {count} 个产品, {os.path.getsize(args.output):,} 字节")
+        return
+    
+    snapshot = CatalogSnapshot(args.output)
+    try:
+        if args.command == 'info':
+            print(f"📁 快照文件: {args.output}")
+            print(f"📦 产品数: {snapshot.count}")
+            print(f"🔢 数据版本: {snapshot.source_version}")
+        else:
+            if not args.code:
+                parser.error("lookup 需要提供条码")
+            result = snapshot.lookup(args.code, args.symbology)
+            if result is None:
+                print(f"📭 快照中没有此条码（无效GTIN或需查询数据库）: {args.code}")
+            else:
+                product, parts = result
+                for column, value in zip(PRODUCT_DETAIL_COLUMNS, product):
+                    print(f"{column:<22} {value}")
+                for part in parts:
+                    print(f"  - {part}")
+    finally:
+        snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,35 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import requests
 import json
+import os
+import http_client
 import threading
 import time
 
+# 聚合数据条码查询API（可用环境变量指向本地替身服务）
+JUHE_API_URL = os.environ.get('JUHE_API_URL', 'http://api.juheapi.com/jhbar/bar')
+
+
+def query_barcode(barcode, appkey, api_url=JUHE_API_URL, cityid="1", pkg="com.barcode.query.tool"):
+    """Query the Juhe barcode API; returns the response object"""
+    # 构建请求参数（根据聚合数据API文档）
+    params = {
+        'appkey': appkey,
+        'barcode': barcode,
+        'cityid': cityid,
+        'pkg': pkg
+    }
+    
+    # 设置请求头
+    headers = {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'User-Agent': 'Barcode-Query-Tool/1.0'
+    }
+    
+    # 发送GET请求（共享连接池，失败自动重试，服务故障时快速失败）
+    return http_client.get(api_url, params=params, headers=headers, timeout=(3.05, 30))
+
+
 class GS1BarcodeQuery:
     def __init__(self):
         self.root = tk.Tk()
@@ -13,7 +39,7 @@ class GS1BarcodeQuery:
         self.root.configure(bg='#f0f0f0')
         
         # API相关变量
-        self.api_url = "http://api.juheapi.com/jhbar/bar"  # 聚合数据条码查询API
+        self.api_url = JUHE_API_URL  # 聚合数据条码查询API
         self.api_key = ""  # 聚合数据API密钥
         self.pkg = "com.barcode.query.tool"  # 应用包名
         self.cityid = "1"  # 城市ID，默认1（上海）
@@ -188,27 +214,7 @@ class GS1BarcodeQuery:
     def perform_query(self, barcode):
         """执行查询（在后台线程中）"""
         try:
-            # 构建请求参数（根据聚合数据API文档）
-            params = {
-                'appkey': self.api_key,
-                'barcode': barcode,
-                'cityid': self.cityid,
-                'pkg': self.pkg
-            }
-            
-            # 设置请求头
-            headers = {
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'User-Agent': 'Barcode-Query-Tool/1.0'
-            }
-            
-            # 发送GET请求
-            response = requests.get(
-                self.api_url,
-                params=params,
-                headers=headers,
-                timeout=30
-            )
+            response = query_barcode(barcode, self.api_key, self.api_url, self.cityid, self.pkg)
             
             # 处理响应
             if response.status_code == 200:
@@ -218,6 +224,8 @@ class GS1BarcodeQuery:
                 error_msg = f"API请求失败: {response.status_code} - {response.text}"
                 self.root.after(0, self.display_error, error_msg)
                 
+        except http_client.CircuitOpenError as e:
+            self.root.after(0, self.display_error, f"查询服务暂时不可用: {e}")
         except requests.exceptions.Timeout:
             self.root.after(0, self.display_error, "请求超时，请检查网络连接")
         except requests.exceptions.ConnectionError:
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP Client
+Shared HTTP layer for the outbound APIs (Baidu OCR, Juhe barcode lookup,
+DeepSeek). Requests reuse keep-alive connections from one pooled session,
+transient failures are retried a bounded number of times with jittered
+exponential backoff, and every host has a circuit breaker: after repeated
+failures requests to that host fail immediately for a while instead of each
+one waiting out its full timeout.
+
+Usage:
+    import http_client
+    response = http_client.get(url, params=params)
+    response = http_client.post(url, data=payload, timeout=(3.05, 30))
+    
+    python http_client.py https://aip.baidubce.com   # probe a host and show breaker state
+"""
+
+import argparse
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Connections kept open per host
+POOL_SIZE = 10
+
+# Retries after the first attempt; only connection errors and RETRY_STATUSES
+# are retried, a read timeout is not (the server may still be working on it)
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# (connect, read) timeout used when the caller gives none
+DEFAULT_TIMEOUT = (3.05, 30)
+
+# Consecutive failures that open a host's circuit, and seconds until one
+# trial request is let through again
+BREAKER_FAILURES = 5
+BREAKER_RESET = 30
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without sending the request while the host's circuit is open"""
+
+
+# ========== 熔断器 ==========
+
+class CircuitBreaker:
+    """Per-host circuit breaker
+    
+    closed:    requests pass, consecutive failures are counted
+    open:      requests fail fast with CircuitOpenError
+    half-open: after reset_timeout one trial request passes; success closes
+               the circuit, failure opens it again, any other outcome (e.g.
+               HTTP 429) lets the next request try
+    """
+    
+    def __init__(self, host, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.trials = 0
+        self.lock = threading.Lock()
+    
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+    
+    def retry_after(self):
+        """Seconds until the next trial request is allowed"""
+        if self.opened_at is None:
+            return 0
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0)
+    
+    def admit(self):
+        """Ticket for a request that may be sent now, or None
+        
+        The ticket is 0 while the circuit is closed and the trial number for
+        the one trial request of a half-open circuit; pass it to end_trial()
+        when the request is done.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return 0
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self.trial_running:
+                self.trial_running = True
+                self.trials += 1
+                return self.trials
+            return None
+    
+    def end_trial(self, ticket):
+        """Free the trial slot when the trial ended without a success or failure being recorded"""
+        with self.lock:
+            # 试探失败后可能已经开始了新的试探，只释放自己的
+            if ticket and ticket == self.trials:
+                self.trial_running = False
+    
+    def check(self):
+        """Admit a request or raise CircuitOpenError; returns the ticket"""
+        ticket = self.admit()
+        if ticket is None:
+            raise CircuitOpenError(f"{self.host} 暂时不可用，{self.retry_after():.0f} 秒后重试")
+        return ticket
+    
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                print(f"✅ {self.host} 已恢复")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            was_trial = self.trial_running
+            self.trial_running = False
+            if was_trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                print(f"⚠️  {self.host} 连续失败 {self.failures} 次，{self.reset_timeout} 秒内直接返回失败")
+    
+    def call(self, func, *args, failure_exceptions=(Exception,), **kwargs):
+        """Run func(*args, **kwargs) guarded by the breaker
+        
+        For calls that do not go through HttpClient (e.g. an SDK client);
+        only failure_exceptions count as failures of the host.
+        """
+        ticket = self.check()
+        try:
+            result = func(*args, **kwargs)
+        except failure_exceptions:
+            self.record_failure()
+            raise
+        except Exception:
+            # 请求本身有问题（如参数错误），服务是正常的
+            self.record_success()
+            raise
+        finally:
+            self.end_trial(ticket)
+        self.record_success()
+        return result
+
+
+# ========== 限流 ==========
+
+class RateLimiter:
+    """Token bucket limiting requests per second across threads
+    
+    Batch jobs use it to stay under an API's QPS quota; a rate of 0 or
+    less disables the limit.
+    """
+    
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Wait until a request may be sent"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+# ========== HTTP客户端 ==========
+
+class HttpClient:
+    """Pooled session with retries and per-host circuit breakers"""
+    
+    def __init__(self, max_retries=MAX_RETRIES, pool_size=POOL_SIZE):
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.breakers = {}
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'rejected': 0}
+    
+    def breaker(self, url):
+        """The circuit breaker of the url's host"""
+        host = urlsplit(url).netloc or url
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(host)
+            return self.breakers[host]
+    
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+    
+    def backoff(self, attempt, response=None):
+        """Full-jitter exponential backoff, honouring Retry-After when given"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(int(retry_after), BACKOFF_MAX)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    
+    def request(self, method, url, retries=None, **kwargs):
+        """Send a request; returns the response like requests.request
+        
+        Raises CircuitOpenError while the host is failing, otherwise the
+        requests exception of the last attempt.
+        """
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        retries = self.max_retries if retries is None else retries
+        breaker = self.breaker(url)
+        
+        ticket = breaker.admit()
+        if ticket is None:
+            self.count('rejected')
+            raise CircuitOpenError(f"{breaker.host} 暂时不可用，{breaker.retry_after():.0f} 秒后重试")
+        try:
+            for attempt in range(retries + 1):
+                # 重试属于同一个请求，不再申请试探名额；熔断器已被失败打开时停止重试
+                if attempt and breaker.state == 'open':
+                    self.count('rejected')
+                    raise CircuitOpenError(f"{breaker.host} 暂时不可用，{breaker.retry_after():.0f} 秒后重试")
+                
+                self.count('requests')
+                response = None
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except requests.exceptions.ConnectionError:
+                    # 连接失败（包括连接超时），请求没有到达服务器，可以重试
+                    breaker.record_failure()
+                    self.count('failures')
+                    if attempt >= retries:
+                        raise
+                except requests.exceptions.RequestException:
+                    # 读取超时等：服务器可能已在处理，不重试
+                    breaker.record_failure()
+                    self.count('failures')
+                    raise
+                else:
+                    if response.status_code < 500 and response.status_code not in RETRY_STATUSES:
+                        breaker.record_success()
+                        return response
+                    if response.status_code >= 500:
+                        breaker.record_failure()
+                        self.count('failures')
+                    if attempt >= retries or response.status_code not in RETRY_STATUSES:
+                        return response
+                
+                self.count('retries')
+                time.sleep(self.backoff(attempt, response))
+        finally:
+            # 试探以429等结束时既不算成功也不算失败，释放名额让下一个请求试探
+            breaker.end_trial(ticket)
+    
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+    
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+# 进程内共用一个客户端，所有请求共享连接池和熔断状态
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
+
+
+def get(url, **kwargs):
+    return default_client().get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return default_client().post(url, **kwargs)
+
+
+def circuit_breaker(url):
+    """The shared circuit breaker of the url's host"""
+    return default_client().breaker(url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Probe a host through the shared HTTP client')
+    parser.add_argument('url', help='URL to request')
+    parser.add_argument('--count', type=int, default=3, help='Number of requests (default: 3)')
+    args = parser.parse_args()
+    
+    client = default_client()
+    for i in range(args.count):
+        start_time = time.perf_counter()
+        try:
+            response = client.get(args.url, timeout=(3.05, 10))
+            result = f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            result = f"❌ {e}"
+        print(f"{i + 1}. {result} ({(time.perf_counter() - start_time) * 1000:.0f} ms)")
+    
+    breaker = client.breaker(args.url)
+    print(f"🔌 {breaker.host}: {breaker.state}, 连续失败 {breaker.failures} 次")
+    print(f"📊 {client.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local API Server
+Offline stand-in for the external HTTP APIs used by the apps, for
+development and testing without internet access or API quota. It speaks the
+same request and response formats as the real services, so the apps only
+need their base URL pointed here.
+
+Endpoints:
+    POST /oauth/2.0/token                   Baidu access token
+    POST /rest/2.0/ocr/v1/accurate_basic    Baidu OCR (Tesseract, or fixed text)
+    POST /chat/completions                  DeepSeek chat, streamed (SSE) or not,
+                                            answered by the local classifier
+    GET  /jhbar/bar                         Juhe barcode query, from products.db
+
+Faults can be injected to test timeouts, retries and the circuit breakers:
+a fixed plus random latency before each response, a share of requests
+failing with HTTP 503, and a per-API requests-per-second limit answered in
+each API's own rate-limit format.
+
+Usage:
+    python local_api_server.py [--port 8765] [--engine auto|tesseract|fixed] [--text "..."] [--db products.db]
+                               [--latency-ms 0] [--jitter-ms 0] [--error-rate 0.1] [--rate-limit 5]
+                               [--token-delay-ms 20]
+    
+    OCR_BACKEND=local python product_manager.py
+    BAIDU_API_BASE=http://127.0.0.1:8765 python ocr_benchmark.py --ocr
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8765 python barcode_scanner_stable.py
+    JUHE_API_URL=http://127.0.0.1:8765/jhbar/bar python gs1_barcode_query.py
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import pathname2url
+from ocr_service import tesseract_lines, tesseract_available
+from product_database import load_product_with_parts, DB_PATH
+from ai_assistant import LocalClassifier, format_local_answer, CATALOG_WASTE_TYPES, DEEPSEEK_MODEL
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+LOCAL_ACCESS_TOKEN = 'local-access-token'
+LOCAL_TOKEN_EXPIRES_IN = 2592000
+
+# 百度接口的错误码
+BAIDU_ERROR_INVALID_PARAM = 100
+BAIDU_ERROR_INVALID_TOKEN = 110
+BAIDU_ERROR_IMAGE_FORMAT = 216201
+BAIDU_ERROR_QPS_LIMIT = 18
+
+# 聚合数据接口的错误码
+JUHE_ERROR_INVALID_KEY = 10001
+JUHE_ERROR_RATE_LIMIT = 10012
+JUHE_ERROR_INVALID_BARCODE = 205001
+JUHE_ERROR_NOT_FOUND = 205002
+
+# Delay between streamed chat chunks, like a model producing tokens
+DEFAULT_TOKEN_DELAY_MS = 20
+
+APIS = ('baidu', 'deepseek', 'juhe')
+
+
+class FaultInjector:
+    """Latency, error and rate-limit faults added to the stand-in responses"""
+    
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, rate_limit=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        # 每个API当前一秒窗口内的请求数
+        self.windows = {}
+    
+    def delay(self):
+        """Wait the configured latency plus a random share of the jitter"""
+        delay_ms = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+    
+    def fault(self, api):
+        """'rate_limit', 'error' or None for the next request to api"""
+        if self.rate_limit > 0:
+            window = int(time.monotonic())
+            with self.lock:
+                start, count = self.windows.get(api, (window, 0))
+                if start != window:
+                    count = 0
+                self.windows[api] = (window, count + 1)
+            if count >= self.rate_limit:
+                return 'rate_limit'
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            return 'error'
+        return None
+
+
+class LocalApiServer(ThreadingHTTPServer):
+    """HTTP server holding the stand-in settings and request statistics"""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, engine='auto', text='', latency_ms=0, jitter_ms=0, error_rate=0.0, rate_limit=0,
+                 db_path=DB_PATH, token_delay_ms=DEFAULT_TOKEN_DELAY_MS):
+        super().__init__(address, LocalApiHandler)
+        if engine == 'auto':
+            engine = 'tesseract' if tesseract_available() else 'fixed'
+        self.engine = engine
+        self.text = text
+        self.faults = FaultInjector(latency_ms, jitter_ms, error_rate, rate_limit)
+        self.token_delay_ms = token_delay_ms
+        self.stats_lock = threading.Lock()
+        self.request_count = 0
+        self.request_time = 0.0
+        self.api_stats = {api: {'requests': 0, 'errors': 0, 'rate_limited': 0} for api in APIS}
+        
+        # 条码查询和AI回答使用产品数据库（不存在时条码都查不到，AI只用关键词规则）
+        # 替身服务只读打开，不升级也不修改应用的数据库
+        self.db_path = db_path if db_path and os.path.exists(db_path) else None
+        self.classifier = LocalClassifier()
+        self.has_gtin14 = False
+        if self.db_path:
+            conn = self.open_database()
+            try:
+                self.has_gtin14 = any(row[1] == 'gtin14' for row in conn.execute("PRAGMA table_info(products)"))
+                self.classifier.load_catalog(conn)
+            finally:
+                conn.close()
+    
+    def open_database(self):
+        """Read-only connection to the products database"""
+        return sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro", uri=True)
+    
+    def handle_error(self, request, client_address):
+        # 客户端断开保持的连接是正常情况，不打印堆栈
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+    
+    def record_request(self, api, seconds, fault=None):
+        with self.stats_lock:
+            self.request_count += 1
+            self.request_time += seconds
+            self.api_stats[api]['requests'] += 1
+            if fault == 'error':
+                self.api_stats[api]['errors'] += 1
+            elif fault == 'rate_limit':
+                self.api_stats[api]['rate_limited'] += 1
+
+
+class LocalApiHandler(BaseHTTPRequestHandler):
+    """Routes requests to the stand-in endpoints"""
+    
+    protocol_version = 'HTTP/1.1'
+    # 保持连接时避免Nagle算法和延迟确认叠加带来的约40ms等待
+    disable_nagle_algorithm = True
+    
+    # (方法, 路径) -> (API, 处理方法)
+    ROUTES = {
+        ('POST', '/oauth/2.0/token'): ('baidu', 'baidu_token'),
+        ('POST', '/rest/2.0/ocr/v1/accurate_basic'): ('baidu', 'baidu_ocr'),
+        ('POST', '/chat/completions'): ('deepseek', 'deepseek_chat'),
+        ('POST', '/v1/chat/completions'): ('deepseek', 'deepseek_chat'),
+        ('GET', '/jhbar/bar'): ('juhe', 'juhe_barcode'),
+        ('POST', '/jhbar/bar'): ('juhe', 'juhe_barcode')
+    }
+    
+    def do_GET(self):
+        self.handle_route('GET')
+    
+    def do_POST(self):
+        self.handle_route('POST')
+    
+    def handle_route(self, method):
+        start_time = time.perf_counter()
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b''
+        
+        route = self.ROUTES.get((method, url.path))
+        if route is None:
+            self.send_json({'error': 'not_found', 'error_description': f"{method} {url.path}"}, 404)
+            return
+        api, handler_name = route
+        
+        self.server.faults.delay()
+        fault = self.server.faults.fault(api)
+        try:
+            if fault == 'rate_limit':
+                getattr(self, f"{api}_rate_limited")()
+            elif fault == 'error':
+                self.send_json({'error': 'service_unavailable', 'error_description': 'Injected fault'}, 503)
+            else:
+                getattr(self, handler_name)()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开（如取消了流式回答）
+            self.close_connection = True
+        except Exception as e:
+            print(f"❌ 处理请求出错 {url.path}: {e}")
+            self.send_json({'error': 'internal_error', 'error_description': str(e)}, 500)
+        self.server.record_request(api, time.perf_counter() - start_time, fault)
+    
+    def form(self):
+        """Form fields of an application/x-www-form-urlencoded body"""
+        return {key: values[-1] for key, values in parse_qs(self.body.decode('utf-8')).items()}
+    
+    def send_json(self, data, status=200, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_chunk(self, data):
+        """Write one chunk of a chunked (streamed) response; empty data ends it"""
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+    
+    def log_message(self, format, *args):
+        print(f"[{self.log_date_time_string()}] {self.address_string()} {format % args}")
+    
+    # ========== 百度OCR ==========
+    
+    def baidu_token(self):
+        if self.query.get('grant_type') != 'client_credentials':
+            self.send_json({'error': 'unsupported_grant_type',
+                            'error_description': 'The authorization grant type is not supported'}, 400)
+            return
+        self.send_json({
+            'access_token': LOCAL_ACCESS_TOKEN,
+            'expires_in': LOCAL_TOKEN_EXPIRES_IN,
+            'scope': 'brain_all_scope',
+            'session_key': 'local',
+            'session_secret': 'local'
+        })
+    
+    def baidu_error(self, error_code, error_msg):
+        # 百度接口出错时也返回200，错误放在JSON里
+        self.send_json({'log_id': int(time.time() * 1000), 'error_code': error_code, 'error_msg': error_msg})
+    
+    def baidu_rate_limited(self):
+        self.baidu_error(BAIDU_ERROR_QPS_LIMIT, 'Open api qps request limit reached')
+    
+    def baidu_ocr(self):
+        if self.query.get('access_token') != LOCAL_ACCESS_TOKEN:
+            self.baidu_error(BAIDU_ERROR_INVALID_TOKEN, 'Access token invalid or no longer valid')
+            return
+        
+        image = self.form().get('image')
+        if not image:
+            self.baidu_error(BAIDU_ERROR_INVALID_PARAM, 'Invalid parameter')
+            return
+        try:
+            image_data = base64.b64decode(image, validate=True)
+        except ValueError:
+            self.baidu_error(BAIDU_ERROR_IMAGE_FORMAT, 'image format error')
+            return
+        
+        if self.server.engine == 'tesseract':
+            lines = tesseract_lines(image_data)
+        else:
+            lines = self.server.text.splitlines()
+        
+        words_result = [{'words': line} for line in lines if line]
+        self.send_json({
+            'log_id': int(time.time() * 1000),
+            'words_result_num': len(words_result),
+            'words_result': words_result
+        })
+    
+    # ========== DeepSeek ==========
+    
+    def deepseek_error(self, status, message, error_type, headers=None):
+        self.send_json({'error': {'message': message, 'type': error_type, 'param': None, 'code': None}},
+                       status, headers)
+    
+    def deepseek_rate_limited(self):
+        self.deepseek_error(429, 'Rate limit reached for requests', 'rate_limit_error', {'Retry-After': '1'})
+    
+    def deepseek_chat(self):
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self.deepseek_error(401, 'Authentication Fails (no such user)', 'authentication_error')
+            return
+        try:
+            request = json.loads(self.body or b'{}')
+        except ValueError:
+            self.deepseek_error(400, 'Invalid JSON body', 'invalid_request_error')
+            return
+        questions = [message.get('content') or '' for message in request.get('messages') or []
+                     if message.get('role') == 'user']
+        if not questions:
+            self.deepseek_error(400, 'messages must contain a user message', 'invalid_request_error')
+            return
+        
+        if (request.get('response_format') or {}).get('type') == 'json_object':
+            content = self.batch_answer(questions[-1])
+        else:
+            content = self.chat_answer(questions[-1])
+        # 粗略估算token数（约4个字符一个token）
+        prompt_tokens = sum(len(message.get('content') or '') for message in request['messages']) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+        completion = {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'created': int(time.time()),
+            'model': request.get('model') or DEEPSEEK_MODEL
+        }
+        
+        if request.get('stream'):
+            include_usage = (request.get('stream_options') or {}).get('include_usage', False)
+            self.stream_chat(completion, content, usage if include_usage else None)
+            return
+        self.send_json({
+            **completion,
+            'object': 'chat.completion',
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': usage
+        })
+    
+    def chat_answer(self, question):
+        """Reply in the assistant's format from the local classifier"""
+        result = self.server.classifier.classify(question)
+        if result:
+            return format_local_answer(result)
+        return (f"Product Name: {question.strip()}\n"
+                f"Waste Classification: Other Waste\n"
+                f"Explanation: Not found in the local catalog or rules (local stand-in answer).")
+    
+    def batch_answer(self, question):
+        """JSON reply to a packed classification prompt (see ai_batch_classify.py)"""
+        waste_types = {key: value.title() for value, key in CATALOG_WASTE_TYPES.items()}
+        items = []
+        for item in json.loads(question):
+            result = self.server.classifier.classify(item.get('name') or '')
+            material = item.get('packaging_material') or ''
+            items.append({
+                'id': item.get('id'),
+                'packaging_waste_type': 'Recyclable' if material else 'Other Waste',
+                'product_waste_type': waste_types[result['waste_type']] if result else 'Other Waste',
+                'packaging_material': material,
+                'confidence': result['confidence'] if result else 0.3
+            })
+        return json.dumps({'items': items}, ensure_ascii=False)
+    
+    def stream_chat(self, completion, content, usage):
+        """Send the reply as server-sent events, one word per chunk"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        
+        def send_event(choices, **extra):
+            chunk = {**completion, 'object': 'chat.completion.chunk', 'choices': choices, **extra}
+            self.send_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+        
+        send_event([{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}])
+        for piece in re.findall(r'\s*\S+', content):
+            if self.server.token_delay_ms:
+                time.sleep(self.server.token_delay_ms / 1000)
+            send_event([{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}])
+        send_event([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+        if usage:
+            send_event([], usage=usage)
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+    
+    # ========== 聚合数据条码查询 ==========
+    
+    def juhe_error(self, error_code, reason):
+        # 聚合数据接口出错时也返回200，错误放在JSON里
+        self.send_json({'resultcode': str(error_code), 'reason': reason, 'result': None, 'error_code': error_code})
+    
+    def juhe_rate_limited(self):
+        self.juhe_error(JUHE_ERROR_RATE_LIMIT, '请求超过次数限制')
+    
+    def juhe_barcode(self):
+        params = {**self.query, **self.form()}
+        if not params.get('appkey'):
+            self.juhe_error(JUHE_ERROR_INVALID_KEY, '错误的请求KEY')
+            return
+        barcode = (params.get('barcode') or '').strip()
+        if not barcode.isdigit():
+            self.juhe_error(JUHE_ERROR_INVALID_BARCODE, '条码格式错误')
+            return
+        
+        product = None
+        if self.server.db_path:
+            conn = self.server.open_database()
+            try:
+                if self.server.has_gtin14:
+                    product, _ = load_product_with_parts(conn, barcode)
+                else:
+                    # 未升级的旧数据库没有gtin14列，只按原始条码查询
+                    product = conn.execute("SELECT product_name FROM products WHERE gs1_code = ?", (barcode,)).fetchone()
+            finally:
+                conn.close()
+        if not product:
+            self.juhe_error(JUHE_ERROR_NOT_FOUND, '查询不到该条码的信息')
+            return
+        
+        self.send_json({
+            'resultcode': '200',
+            'reason': '查询成功',
+            'result': {
+                'summary': {'barcode': barcode, 'name': product[0] or '', 'imgurl': '', 'interval': '',
+                            'shopNum': 0, 'eshopNum': 0},
+                'shop': [],
+                'eshop': []
+            },
+            'error_code': 0
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the external APIs')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Listen address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Listen port (default: 8765)')
+    parser.add_argument('--engine', choices=['auto', 'tesseract', 'fixed'], default='auto',
+                        help='OCR engine: tesseract, or fixed text (default: tesseract if installed)')
+    parser.add_argument('--text', default='本地OCR测试', help='Text returned by the fixed engine, one line per result')
+    parser.add_argument('--db', default=DB_PATH, help='Products database for barcode queries and AI answers')
+    parser.add_argument('--latency-ms', type=int, default=0, help='Extra delay added to every request')
+    parser.add_argument('--jitter-ms', type=int, default=0, help='Random extra delay of up to this much')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests failing with HTTP 503 (0-1)')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Requests per second per API before rate-limit replies')
+    parser.add_argument('--token-delay-ms', type=int, default=DEFAULT_TOKEN_DELAY_MS,
+                        help='Delay between streamed chat chunks (default: 20)')
+    args = parser.parse_args()
+    
+    server = LocalApiServer((args.host, args.port), args.engine, args.text, args.latency_ms, args.jitter_ms,
+                            args.error_rate, args.rate_limit, args.db, args.token_delay_ms)
+    print(f"🚀 本地API服务已启动: http://{args.host}:{args.port} (OCR引擎: {server.engine}, "
+          f"产品数据库: {server.db_path or '无'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if server.request_count:
+            print(f"📊 共处理 {server.request_count} 个请求，平均 "
+                  f"{server.request_time / server.request_count * 1000:.1f} ms")
+            for api, stats in server.api_stats.items():
+                if stats['requests']:
+                    print(f"  {api:<10} {stats['requests']:>6} 个请求, 注入错误 {stats['errors']}, "
+                          f"限流 {stats['rate_limited']}")
+
+
+if __name__ == "__main__":
+    main()
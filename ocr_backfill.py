@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OCR Backfill
+Suggests names for products that have a photo but no usable name, and for
+photos in photos/ that no product points to yet. Photos are preprocessed
+and recognized with a bounded number of workers and a request rate limit.
+Results go into the name_suggestions table for review and are only copied
+to products when accepted.
+
+Every finished photo is checkpointed in name_suggestions, so an interrupted
+run (Ctrl+C, crash, power loss) continues where it stopped.
+
+Usage:
+    python ocr_backfill.py run [--db products.db] [--ocr-backend baidu] [--workers 4] [--rate 2]
+                               [--limit 500] [--include-loose] [--retry-failed]
+    python ocr_backfill.py status
+    python ocr_backfill.py review
+    python ocr_backfill.py accept 12 15 | --all
+    python ocr_backfill.py reject 13
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from product_database import upgrade_database, DB_PATH
+from photo_store import resolve_photo_path, unreferenced_photo_files
+from ocr_service import OcrCache, perceptual_hash, preprocess_image_for_ocr, create_ocr_backend, OCR_BACKENDS
+from http_client import RateLimiter
+
+
+# Names treated as missing besides NULL and empty strings
+PLACEHOLDER_NAMES = ('unknown', 'unknown product', 'n/a', 'none', 'null', 'test', '未知', '未知产品', '未命名', '无', '待定')
+
+# Longest suggested name; the rest of the text stays in ocr_text
+NAME_MAX_LENGTH = 60
+
+# Results written per transaction
+CHECKPOINT_EVERY = 20
+
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 2.0
+
+
+def ensure_name_suggestions(conn):
+    """Create the review table; one row per product photo doubles as the run checkpoint
+    
+    Rows are unique per (product_id, photo_path), so products sharing a
+    stored photo each get their own suggestion. Loose photos have no
+    product_id.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS name_suggestions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            photo_path TEXT NOT NULL,
+            suggested_name TEXT,
+            ocr_text TEXT,
+            backend TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            elapsed_ms REAL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            reviewed_at DATETIME
+        )
+    ''')
+    # 散落照片没有产品ID，NULL按0参与唯一约束
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_name_suggestions_photo "
+                 "ON name_suggestions(IFNULL(product_id, 0), photo_path)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_name_suggestions_status ON name_suggestions(status)")
+    conn.commit()
+
+
+def missing_name_condition(alias='p'):
+    """SQL condition for products without a usable name"""
+    names = ", ".join(f"'{name}'" for name in PLACEHOLDER_NAMES)
+    return (f"({alias}.product_name IS NULL OR TRIM({alias}.product_name) = '' "
+            f"OR LOWER(TRIM({alias}.product_name)) IN ({names}) OR {alias}.product_name = {alias}.gs1_code)")
+
+
+def find_backfill_photos(conn, include_loose=False, retry_failed=False, limit=None):
+    """Photos still to process: [(product_id or None, photo_path)]
+    
+    Photos that already have a suggestion are skipped; failed ones only
+    with retry_failed.
+    """
+    done_statuses = "('pending', 'accepted', 'rejected')" if retry_failed else "('pending', 'accepted', 'rejected', 'failed')"
+    rows = conn.execute(f'''
+        SELECT p.id, p.product_image FROM products p
+        WHERE p.product_image IS NOT NULL AND p.product_image != ''
+          AND {missing_name_condition()}
+          AND NOT EXISTS (SELECT 1 FROM name_suggestions s
+                          WHERE IFNULL(s.product_id, 0) = p.id AND s.photo_path = p.product_image
+                            AND s.status IN {done_statuses})
+        ORDER BY p.id
+    ''').fetchall()
+    
+    if include_loose:
+        known = {row[0] for row in conn.execute(
+            f"SELECT photo_path FROM name_suggestions WHERE product_id IS NULL AND status IN {done_statuses}")}
+        for path in unreferenced_photo_files(conn):
+            # 预处理副本不是原始照片
+            if '_processed' in os.path.basename(path):
+                continue
+            stored_path = path.replace(os.sep, '/')
+            if stored_path not in known:
+                rows.append((None, stored_path))
+    
+    return rows[:limit] if limit else rows
+
+
+def suggest_name(text):
+    """Product name suggestion from recognized text"""
+    name = " ".join((text or "").split())
+    return name[:NAME_MAX_LENGTH].rstrip()
+
+
+class OcrBackfill:
+    """Recognizes photos on a worker pool and checkpoints the results"""
+    
+    def __init__(self, conn, backend, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, cache=None):
+        self.conn = conn
+        self.backend = backend
+        self.workers = max(workers, 1)
+        self.rate_limiter = RateLimiter(rate, burst=self.workers)
+        self.cache = cache
+        self.stop_event = threading.Event()
+        self.counts = {'done': 0, 'named': 0, 'empty': 0, 'failed': 0, 'cached': 0}
+    
+    def recognize_photo(self, photo_path):
+        """Worker: returns (text, from_cache, elapsed_ms)"""
+        import cv2
+        import numpy as np
+        
+        start_time = time.perf_counter()
+        image = cv2.imdecode(np.fromfile(resolve_photo_path(photo_path), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise Exception(f"无法读取图片: {photo_path}")
+        processed = preprocess_image_for_ocr(image)
+        
+        phash = perceptual_hash(processed)
+        cached_text = self.cache.lookup(self.backend.name, phash) if self.cache else None
+        if cached_text is not None:
+            return cached_text, True, (time.perf_counter() - start_time) * 1000
+        
+        if self.stop_event.is_set():
+            raise InterruptedError("已停止")
+        self.rate_limiter.acquire()
+        text = self.backend.recognize(processed)
+        if self.cache and self.backend.cache_results:
+            self.cache.store(self.backend.name, phash, text)
+        return text, False, (time.perf_counter() - start_time) * 1000
+    
+    def record(self, product_id, photo_path, text=None, error=None, elapsed_ms=None):
+        """Write one result (committed in batches by run)"""
+        if error is not None:
+            status, name = 'failed', None
+            self.counts['failed'] += 1
+        else:
+            name = suggest_name(text)
+            status = 'pending' if name else 'failed'
+            error = None if name else '未识别到文字'
+            self.counts['named' if name else 'empty'] += 1
+        self.conn.execute('''
+            INSERT INTO name_suggestions (product_id, photo_path, suggested_name, ocr_text, backend,
+                                          status, error, elapsed_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(IFNULL(product_id, 0), photo_path) DO UPDATE SET
+                suggested_name = excluded.suggested_name,
+                ocr_text = excluded.ocr_text, backend = excluded.backend, status = excluded.status,
+                error = excluded.error, elapsed_ms = excluded.elapsed_ms, created_at = CURRENT_TIMESTAMP
+        ''', (product_id, photo_path, name, text, self.backend.name, status,
+              None if error is None else str(error), elapsed_ms))
+        self.counts['done'] += 1
+    
+    def run(self, photos, progress=None):
+        """Process photos; returns the counters. Ctrl+C stops after the running requests"""
+        pending = {}
+        queue = iter(photos)
+        uncommitted = 0
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while True:
+                # 只提交少量任务，中断时不会留下大量排队的请求
+                while len(pending) < self.workers * 2 and not self.stop_event.is_set():
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    pending[executor.submit(self.recognize_photo, item[1])] = item
+                if not pending:
+                    break
+                
+                finished, _ = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    product_id, photo_path = pending.pop(future)
+                    try:
+                        text, from_cache, elapsed_ms = future.result()
+                    except InterruptedError:
+                        continue
+                    except Exception as e:
+                        print(f"⚠️  识别失败 {photo_path}: {e}")
+                        self.record(product_id, photo_path, error=e)
+                    else:
+                        self.counts['cached'] += from_cache
+                        self.record(product_id, photo_path, text, elapsed_ms=elapsed_ms)
+                    uncommitted += 1
+                    if progress:
+                        progress(self.counts)
+                
+                if uncommitted >= CHECKPOINT_EVERY:
+                    self.conn.commit()
+                    uncommitted = 0
+        except KeyboardInterrupt:
+            print("\n⏹️  正在停止，等待进行中的请求完成...")
+            self.stop_event.set()
+            for future, (product_id, photo_path) in pending.items():
+                try:
+                    text, from_cache, elapsed_ms = future.result()
+                except Exception:
+                    continue
+                self.record(product_id, photo_path, text, elapsed_ms=elapsed_ms)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.conn.commit()
+        return self.counts
+
+
+def print_status(conn):
+    total = conn.execute(f'''
+        SELECT COUNT(*) FROM products p
+        WHERE p.product_image IS NOT NULL AND p.product_image != '' AND {missing_name_condition()}
+    ''').fetchone()[0]
+    print(f"📷 有照片但缺少名称的产品: {total}")
+    for status, count in conn.execute("SELECT status, COUNT(*) FROM name_suggestions GROUP BY status ORDER BY status"):
+        print(f"  {status:<10} {count}")
+    row = conn.execute("SELECT AVG(elapsed_ms) FROM name_suggestions WHERE elapsed_ms IS NOT NULL").fetchone()
+    if row[0] is not None:
+        print(f"⏱️  平均每张耗时: {row[0]:.0f} ms")
+
+
+def print_review(conn):
+    rows = conn.execute('''
+        SELECT s.id, p.gs1_code, s.suggested_name, s.photo_path
+        FROM name_suggestions s LEFT JOIN products p ON p.id = s.product_id
+        WHERE s.status = 'pending' ORDER BY s.id
+    ''').fetchall()
+    if not rows:
+        print("📭 没有待审核的建议")
+        return
+    print(f"{'ID':>5}  {'GS1代码':<15} {'建议名称':<30} 照片")
+    print("-" * 90)
+    for suggestion_id, gs1_code, name, photo_path in rows:
+        print(f"{suggestion_id:>5}  {gs1_code or '(无产品)':<15} {name:<30} {photo_path}")
+    print(f"\n📝 共 {len(rows)} 条待审核；accept/reject 加ID处理")
+
+
+def accept_suggestions(conn, ids=None):
+    """Copy accepted names into products; returns (updated, skipped)
+    
+    Photos without a product and products that got a name in the meantime
+    are skipped and stay pending.
+    """
+    query = '''
+        SELECT s.id, s.product_id, s.suggested_name FROM name_suggestions s
+        WHERE s.status = 'pending' AND s.product_id IS NOT NULL
+    '''
+    params = []
+    if ids:
+        query += f" AND s.id IN ({', '.join('?' * len(ids))})"
+        params = list(ids)
+    
+    updated = skipped = 0
+    with conn:
+        for suggestion_id, product_id, name in conn.execute(query, params).fetchall():
+            cursor = conn.execute(f'''
+                UPDATE products SET product_name = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND {missing_name_condition('products')}
+            ''', (name, product_id))
+            if cursor.rowcount:
+                conn.execute("UPDATE name_suggestions SET status = 'accepted', reviewed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                             (suggestion_id,))
+                updated += 1
+            else:
+                skipped += 1
+    return updated, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suggest product names from photos with OCR')
+    parser.add_argument('command', choices=['run', 'status', 'review', 'accept', 'reject'])
+    parser.add_argument('ids', nargs='*', type=int, help='Suggestion IDs (accept/reject)')
+    parser.add_argument('--db', default=DB_PATH, help='Products database (default: products.db)')
+    parser.add_argument('--ocr-backend', choices=list(OCR_BACKENDS), help='OCR engine (default: OCR_BACKEND or baidu)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent OCR requests (default: 4)')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='OCR requests per second, 0 = unlimited (default: 2)')
+    parser.add_argument('--limit', type=int, help='Process at most N photos in this run')
+    parser.add_argument('--include-loose', action='store_true', help='Also process photos no product points to')
+    parser.add_argument('--retry-failed', action='store_true', help='Process failed photos again')
+    parser.add_argument('--no-cache', action='store_true', help='Do not use the OCR result cache')
+    parser.add_argument('--all', action='store_true', help='Accept all pending suggestions')
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.db):
+        print(f"❌ 数据库文件不存在: {args.db}")
+        sys.exit(1)
+    conn = sqlite3.connect(args.db, timeout=30)
+    
+    try:
+        upgrade_database(conn)
+        ensure_name_suggestions(conn)
+        
+        if args.command == 'status':
+            print_status(conn)
+        
+        elif args.command == 'review':
+            print_review(conn)
+        
+        elif args.command == 'accept':
+            if not args.ids and not args.all:
+                parser.error("accept 需要提供建议ID，或使用 --all")
+            updated, skipped = accept_suggestions(conn, None if args.all else args.ids)
+            print(f"✅ 已更新 {updated} 个产品名称" + (f"，跳过 {skipped} 个（已有名称）" if skipped else ""))
+        
+        elif args.command == 'reject':
+            if not args.ids:
+                parser.error("reject 需要提供建议ID")
+            with conn:
+                cursor = conn.execute(f'''
+                    UPDATE name_suggestions SET status = 'rejected', reviewed_at = CURRENT_TIMESTAMP
+                    WHERE status = 'pending' AND id IN ({', '.join('?' * len(args.ids))})
+                ''', args.ids)
+            print(f"🗑️  已拒绝 {cursor.rowcount} 条建议")
+        
+        else:
+            photos = find_backfill_photos(conn, args.include_loose, args.retry_failed, args.limit)
+            if not photos:
+                print("✅ 没有需要处理的照片")
+                return
+            
+            backend = create_ocr_backend(args.ocr_backend)
+            cache = None if args.no_cache else OcrCache()
+            print(f"🚀 开始处理 {len(photos)} 张照片（后端: {backend.name}, 并发: {args.workers}, "
+                  f"限速: {args.rate or '不限'}/秒）")
+            
+            start_time = time.perf_counter()
+            
+            def show_progress(counts):
+                print(f"\r  {counts['done']}/{len(photos)}  名称 {counts['named']}  无文字 {counts['empty']}  "
+                      f"失败 {counts['failed']}  缓存 {counts['cached']}", end="", flush=True)
+            
+            backfill = OcrBackfill(conn, backend, args.workers, args.rate, cache)
+            try:
+                counts = backfill.run(photos, show_progress)
+            finally:
+                if cache:
+                    cache.close()
+            elapsed = time.perf_counter() - start_time
+            print(f"\n✅ 完成 {counts['done']} 张，用时 {elapsed:.1f} 秒；使用 review 查看建议")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OCR Upload Benchmark
+Compares the OCR upload payload of the old path (whole image, BGR->RGB swap,
+default JPEG) with prepare_ocr_upload (text crop, downscale, per-image
+encoding) over the photos in photos/. With --ocr both payloads are sent to
+Baidu to compare latency and recognized text.
+
+Usage:
+    python ocr_benchmark.py [--photos photos] [--limit 20] [--ocr]
+"""
+
+import argparse
+import base64
+import difflib
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from ocr_service import preprocess_image_for_ocr, prepare_ocr_upload, request_baidu_access_token, recognize_text_baidu
+from photo_store import PHOTO_ROOT, IMAGE_EXTENSIONS
+
+
+def legacy_upload(image):
+    """Payload of the old image_to_base64 path"""
+    if len(image.shape) == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    success, encoded = cv2.imencode('.jpg', image)
+    if not success:
+        raise Exception("图像编码失败")
+    return encoded.tobytes()
+
+
+def find_photos(root, limit=None):
+    """All photos under root, including the hash-sharded store"""
+    photos = []
+    for directory, _, names in os.walk(root):
+        photos.extend(os.path.join(directory, name) for name in sorted(names)
+                      if name.lower().endswith(IMAGE_EXTENSIONS))
+    photos.sort()
+    return photos[:limit] if limit else photos
+
+
+def timed_ocr(data, access_token):
+    """Recognize a payload; returns (text, seconds)"""
+    start_time = time.perf_counter()
+    text = recognize_text_baidu(data, access_token)
+    return text, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark OCR upload preparation')
+    parser.add_argument('--photos', default=PHOTO_ROOT, help='Photo directory (default: photos)')
+    parser.add_argument('--limit', type=int, help='Only use the first N photos')
+    parser.add_argument('--ocr', action='store_true', help='Also send both payloads to Baidu OCR')
+    args = parser.parse_args()
+    
+    photos = find_photos(args.photos, args.limit)
+    if not photos:
+        print(f"❌ 没有找到照片: {args.photos}")
+        sys.exit(1)
+    
+    access_token = request_baidu_access_token()[0] if args.ocr else None
+    
+    header = f"{'照片':<40} {'原大小':>9} {'新大小':>9} {'比例':>6} {'格式':>8} {'准备ms':>7}"
+    if args.ocr:
+        header += f" {'原耗时':>7} {'新耗时':>7} {'一致度':>6}"
+    print(header)
+    print("-" * len(header))
+    
+    totals = {'legacy': 0, 'new': 0, 'prepare': 0.0, 'legacy_ocr': 0.0, 'new_ocr': 0.0, 'agreement': 0.0}
+    count = 0
+    for path in photos:
+        image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"⚠️  无法读取: {path}")
+            continue
+        processed = preprocess_image_for_ocr(image)
+        
+        legacy_data = legacy_upload(processed)
+        start_time = time.perf_counter()
+        new_data, info = prepare_ocr_upload(processed)
+        prepare_time = time.perf_counter() - start_time
+        
+        # 实际上传的是base64，按base64长度比较
+        legacy_size = len(base64.b64encode(legacy_data))
+        new_size = len(base64.b64encode(new_data))
+        image_format = info['format'] + (f"/{info['quality']}" if info['quality'] else "")
+        line = (f"{os.path.basename(path)[:40]:<40} {legacy_size:>9,} {new_size:>9,} "
+                f"{new_size * 100 / legacy_size:>5.0f}% {image_format:>8} {prepare_time * 1000:>7.1f}")
+        
+        if args.ocr:
+            try:
+                legacy_text, legacy_time = timed_ocr(legacy_data, access_token)
+                new_text, new_time = timed_ocr(new_data, access_token)
+            except Exception as e:
+                print(f"{line}  ❌ OCR失败: {e}")
+                continue
+            agreement = difflib.SequenceMatcher(None, legacy_text, new_text).ratio() if legacy_text or new_text else 1.0
+            totals['legacy_ocr'] += legacy_time
+            totals['new_ocr'] += new_time
+            totals['agreement'] += agreement
+            line += f" {legacy_time * 1000:>7.0f} {new_time * 1000:>7.0f} {agreement * 100:>5.0f}%"
+        
+        print(line)
+        totals['legacy'] += legacy_size
+        totals['new'] += new_size
+        totals['prepare'] += prepare_time
+        count += 1
+    
+    if not count:
+        return
+    print("-" * len(header))
+    print(f"📷 照片数: {count}")
+    print(f"📦 上传数据: {totals['legacy']:,} -> {totals['new']:,} 字节 "
+          f"({totals['new'] * 100 / totals['legacy']:.0f}%)")
+    print(f"⏱️  平均准备耗时: {totals['prepare'] / count * 1000:.1f} ms")
+    if args.ocr:
+        print(f"🌐 平均OCR耗时: {totals['legacy_ocr'] / count * 1000:.0f} ms -> {totals['new_ocr'] / count * 1000:.0f} ms")
+        print(f"🔤 平均文字一致度: {totals['agreement'] / count * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
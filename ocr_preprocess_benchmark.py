@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OCR Preprocessing Benchmark
+Runs configurable preprocessing chains over the photos in photos/ and
+reports, per chain, the CPU time of every step, the size of the resulting
+OCR upload, and how well the recognized text agrees with the reference
+chain and with the product names saved in the database.
+
+OCR results come from a recorded-response stand-in (ocr_recordings.json),
+keyed by the preprocessed image, so benchmark runs need no network. Record
+the responses once with --record, which sends every image not recorded yet
+to the selected OCR backend.
+
+Steps: flip, gray, clahe, median, gaussian, otsu, adaptive, downscale
+(see PREPROCESS_STEPS in ocr_service.py).
+
+Usage:
+    python ocr_preprocess_benchmark.py --record [--ocr-backend baidu] [--limit 20]
+    python ocr_preprocess_benchmark.py [--chain flip,gray,otsu --chain ...] [--threads 1]
+"""
+
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import cv2
+import numpy as np
+from ocr_service import (PREPROCESS_STEPS, DEFAULT_PREPROCESS_CHAIN, run_preprocess_chain, prepare_ocr_upload,
+                         create_ocr_backend, OCR_BACKENDS)
+from ocr_benchmark import find_photos
+from photo_store import PHOTO_ROOT, resolve_photo_path
+from product_database import DB_PATH
+
+
+RECORDINGS_PATH = 'ocr_recordings.json'
+
+DEFAULT_CHAINS = (
+    DEFAULT_PREPROCESS_CHAIN,
+    ('flip', 'gray', 'otsu'),
+    ('flip', 'gray', 'clahe', 'otsu'),
+    ('flip', 'gray', 'median', 'otsu'),
+    ('flip', 'gray', 'clahe', 'median', 'adaptive'),
+    ('flip', 'downscale', 'gray', 'clahe', 'median', 'otsu'),
+    ('flip', 'gray')
+)
+
+
+class RecordedOcr:
+    """Recorded-response stand-in for an OCR backend
+    
+    Texts are keyed by a hash of the preprocessed image. With a backend,
+    images not recorded yet are recognized and recorded; without one a
+    missing recording returns None.
+    """
+    
+    def __init__(self, path=RECORDINGS_PATH, backend=None):
+        self.path = path
+        self.backend = backend
+        self.recordings = {}
+        self.recorded = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.recordings = json.load(f)
+    
+    @staticmethod
+    def image_key(image):
+        digest = hashlib.sha256(image.tobytes())
+        digest.update(str(image.shape).encode('ascii'))
+        return digest.hexdigest()
+    
+    def recognize(self, image):
+        key = self.image_key(image)
+        if key in self.recordings:
+            return self.recordings[key]
+        if self.backend is None:
+            return None
+        text = self.backend.recognize(image)
+        self.recordings[key] = text
+        self.recorded += 1
+        return text
+    
+    def save(self):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.recordings, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+
+
+def parse_chain(text):
+    chain = tuple(step.strip() for step in text.split(',') if step.strip())
+    unknown = [step for step in chain if step not in PREPROCESS_STEPS]
+    if not chain or unknown:
+        raise argparse.ArgumentTypeError(f"未知的预处理步骤: {', '.join(unknown) or text}"
+                                         f"（可选: {', '.join(PREPROCESS_STEPS)}）")
+    return chain
+
+
+def load_product_names(db_path):
+    """Saved product names by photo path, used as ground truth"""
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute('''
+            SELECT product_image, product_name FROM products
+            WHERE product_image IS NOT NULL AND product_image != '' AND TRIM(COALESCE(product_name, '')) != ''
+        ''').fetchall()
+    finally:
+        conn.close()
+    return {os.path.normcase(os.path.abspath(resolve_photo_path(path))): name for path, name in rows}
+
+
+def text_agreement(reference, text):
+    """Similarity of two OCR texts, 0..1"""
+    if not reference and not text:
+        return 1.0
+    return difflib.SequenceMatcher(None, reference, text).ratio()
+
+
+def name_recall(name, text):
+    """Share of the product name's characters found in order in the text, 0..1"""
+    name = "".join(name.split()).lower()
+    text = "".join((text or "").split()).lower()
+    if not name:
+        return 0.0
+    matched = sum(block.size for block in difflib.SequenceMatcher(None, name, text).get_matching_blocks())
+    return matched / len(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark OCR preprocessing chains')
+    parser.add_argument('--photos', default=PHOTO_ROOT, help='Photo directory (default: photos)')
+    parser.add_argument('--limit', type=int, help='Only use the first N photos')
+    parser.add_argument('--chain', action='append', type=parse_chain,
+                        help='Comma-separated steps; repeat for several chains (default: a built-in set)')
+    parser.add_argument('--recordings', default=RECORDINGS_PATH, help='Recorded OCR responses (default: ocr_recordings.json)')
+    parser.add_argument('--record', action='store_true', help='Recognize images missing from the recordings')
+    parser.add_argument('--ocr-backend', choices=list(OCR_BACKENDS), help='OCR engine used by --record')
+    parser.add_argument('--db', default=DB_PATH, help='Products database with the saved names (default: products.db)')
+    parser.add_argument('--threads', type=int, help='OpenCV worker threads (1 makes CPU times comparable)')
+    args = parser.parse_args()
+    
+    chains = args.chain or list(DEFAULT_CHAINS)
+    reference_chain = chains[0]
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+    
+    photos = find_photos(args.photos, args.limit)
+    photos = [path for path in photos if '_processed' not in os.path.basename(path)]
+    if not photos:
+        print(f"❌ 没有找到照片: {args.photos}")
+        sys.exit(1)
+    
+    ocr = RecordedOcr(args.recordings, create_ocr_backend(args.ocr_backend) if args.record else None)
+    names = load_product_names(args.db)
+    
+    results = {chain: {'timings': {}, 'bytes': 0, 'texts': {}, 'missing': 0, 'errors': 0} for chain in chains}
+    try:
+        for path in photos:
+            image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                print(f"⚠️  无法读取: {path}")
+                continue
+            for chain in chains:
+                result = results[chain]
+                try:
+                    processed = run_preprocess_chain(image, chain, result['timings'])
+                    upload_data, _ = prepare_ocr_upload(processed)
+                    text = ocr.recognize(processed)
+                except Exception as e:
+                    print(f"⚠️  {'+'.join(chain)} 处理失败 {os.path.basename(path)}: {e}")
+                    result['errors'] += 1
+                    continue
+                result['bytes'] += len(upload_data)
+                if text is None:
+                    result['missing'] += 1
+                else:
+                    result['texts'][path] = text
+    finally:
+        if ocr.recorded:
+            ocr.save()
+            print(f"💾 已录制 {ocr.recorded} 个识别结果到 {args.recordings}")
+    
+    count = len(photos)
+    reference_texts = results[reference_chain]['texts']
+    print(f"\n📷 照片数: {count}，参照链: {'+'.join(reference_chain)}，有产品名称的照片: "
+          f"{sum(1 for path in photos if os.path.normcase(os.path.abspath(path)) in names)}")
+    header = (f"{'预处理链':<42} {'CPU ms':>7} {'上传KB':>7} {'有文字':>6} {'一致度':>6} {'名称命中':>8} {'缺录制':>6}")
+    print(header)
+    print("-" * len(header))
+    for chain in chains:
+        result = results[chain]
+        done = count - result['errors']
+        cpu_ms = sum(cpu for cpu, _ in result['timings'].values()) / max(done, 1) * 1000
+        texts = result['texts']
+        recognized = sum(1 for text in texts.values() if text.strip())
+        
+        pairs = [(reference_texts[path], text) for path, text in texts.items() if path in reference_texts]
+        agreement = sum(text_agreement(a, b) for a, b in pairs) / len(pairs) if pairs else None
+        recalls = []
+        for path, text in texts.items():
+            name = names.get(os.path.normcase(os.path.abspath(path)))
+            if name:
+                recalls.append(name_recall(name, text))
+        recall = sum(recalls) / len(recalls) if recalls else None
+        
+        agreement_text = f"{agreement * 100:>5.0f}%" if agreement is not None else f"{'-':>6}"
+        recall_text = f"{recall * 100:>7.0f}%" if recall is not None else f"{'-':>8}"
+        print(f"{'+'.join(chain):<42} {cpu_ms:>7.1f} {result['bytes'] / max(done, 1) / 1024:>7.1f} "
+              f"{recognized:>6} {agreement_text} {recall_text} {result['missing']:>6}")
+    
+    print("\n⏱️  各步骤平均耗时 (CPU ms / 实际 ms):")
+    for chain in chains:
+        result = results[chain]
+        done = max(count - result['errors'], 1)
+        steps = "  ".join(f"{name} {cpu / done * 1000:.1f}/{wall / done * 1000:.1f}"
+                          for name, (cpu, wall) in result['timings'].items())
+        print(f"  {'+'.join(chain):<42} {steps}")
+    if any(result['missing'] for result in results.values()):
+        print("\n💡 部分图片没有录制的识别结果，使用 --record 录制（需要OCR服务）")
+
+
+if __name__ == "__main__":
+    main()
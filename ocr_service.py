@@ -0,0 +1,706 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OCR Service
+Shared OCR helpers for the product manager: image preprocessing, upload
+preparation (crop to text, downscale, per-image encoding), pluggable OCR
+backends, and a cache of recognized text keyed by a perceptual hash of the
+preprocessed image, so retakes of the same packaging skip the API call.
+
+OCR backends (choose with OCR_BACKEND or --ocr-backend):
+    baidu      Baidu accurate_basic API (BAIDU_API_BASE overrides the host)
+    tesseract  local Tesseract engine, no network needed
+    local      Baidu-compatible stand-in served by local_api_server.py (LOCAL_API_BASE)
+
+Usage:
+    python ocr_service.py stats
+    python ocr_service.py clear
+"""
+
+import abc
+import argparse
+import base64
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+import http_client
+
+
+# Baidu OCR credentials (override with environment variables)
+BAIDU_OCR_API_KEY = os.environ.get('BAIDU_OCR_API_KEY', 'eJAk0i6aKQbGabIk9UPrcxcR')
+BAIDU_OCR_SECRET_KEY = os.environ.get('BAIDU_OCR_SECRET_KEY', 'PTYD5yhAJIsHeWL6SRswQkHRT37kk2AG')
+BAIDU_API_BASE = os.environ.get('BAIDU_API_BASE', 'https://aip.baidubce.com').rstrip('/')
+BAIDU_TOKEN_PATH = '/oauth/2.0/token'
+BAIDU_OCR_PATH = '/rest/2.0/ocr/v1/accurate_basic'
+
+# Default OCR backend and the address of local_api_server.py
+OCR_BACKEND = os.environ.get('OCR_BACKEND', 'baidu').lower()
+LOCAL_API_BASE = os.environ.get('LOCAL_API_BASE', 'http://127.0.0.1:8765').rstrip('/')
+
+# Access tokens are shared by all processes through this file and refreshed
+# in the background this many seconds before they expire
+OCR_TOKEN_PATH = os.environ.get('OCR_TOKEN_PATH', 'ocr_tokens.json')
+TOKEN_REFRESH_MARGIN = 300
+TOKEN_RETRY_INTERVAL = 60
+
+# 百度接口中表示access token无效或过期的错误码
+BAIDU_TOKEN_ERROR_CODES = (110, 111)
+
+TESSERACT_CMD = os.environ.get('TESSERACT_CMD', 'tesseract')
+TESSERACT_LANG = os.environ.get('TESSERACT_LANG', 'chi_sim+eng')
+
+# Upload preparation: longest side after downscaling, smallest text line height
+# kept when downscaling, and the JPEG size budget used to pick a quality
+OCR_MAX_SIDE = 1600
+OCR_MIN_TEXT_HEIGHT = 24
+OCR_UPLOAD_BUDGET = 150 * 1024
+OCR_JPEG_QUALITIES = (90, 80, 70, 60)
+
+OCR_CACHE_PATH = os.environ.get('OCR_CACHE_PATH', 'ocr_cache.db')
+
+# Maximum number of differing hash bits for two photos to count as the same
+OCR_CACHE_THRESHOLD = 6
+
+
+# ========== 图片预处理 ==========
+
+def flip_step(img):
+    """左右翻转图片（摄像头画面是镜像的）"""
+    import cv2
+    return cv2.flip(img, 1)  # 1表示水平翻转
+
+
+def gray_step(img):
+    """转换为灰度图"""
+    import cv2
+    if len(img.shape) == 3:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return img
+
+
+def clahe_step(img):
+    """增强对比度"""
+    import cv2
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+    return clahe.apply(img)
+
+
+def median_step(img):
+    """中值滤波去噪"""
+    import cv2
+    return cv2.medianBlur(img, 3)
+
+
+def gaussian_step(img):
+    """高斯模糊去噪"""
+    import cv2
+    return cv2.GaussianBlur(img, (3, 3), 0)
+
+
+def otsu_step(img):
+    """Otsu全局二值化"""
+    import cv2
+    _, binary = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+
+def adaptive_step(img):
+    """自适应二值化，光照不均时比Otsu好"""
+    import cv2
+    return cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+
+
+def downscale_step(img):
+    """缩小到OCR_MAX_SIDE，后续步骤处理的像素更少"""
+    import cv2
+    height, width = img.shape[:2]
+    scale = OCR_MAX_SIDE / max(height, width)
+    if scale >= 1:
+        return img
+    return cv2.resize(img, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+# Preprocessing steps by name, for configurable chains (see ocr_preprocess_benchmark.py)
+PREPROCESS_STEPS = {
+    'flip': flip_step,
+    'gray': gray_step,
+    'clahe': clahe_step,
+    'median': median_step,
+    'gaussian': gaussian_step,
+    'otsu': otsu_step,
+    'adaptive': adaptive_step,
+    'downscale': downscale_step
+}
+
+DEFAULT_PREPROCESS_CHAIN = ('flip', 'gray', 'clahe', 'median', 'otsu')
+
+
+def run_preprocess_chain(img, chain, timings=None):
+    """Apply the named steps in order
+    
+    When timings is a dict, the (CPU seconds, wall seconds) of every step
+    are added to it.
+    """
+    for name in chain:
+        step = PREPROCESS_STEPS[name]
+        if timings is None:
+            img = step(img)
+            continue
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        img = step(img)
+        cpu, wall = timings.get(name, (0.0, 0.0))
+        timings[name] = (cpu + time.process_time() - cpu_start, wall + time.perf_counter() - wall_start)
+    return img
+
+
+def preprocess_image_for_ocr(img):
+    """Flip, grey, CLAHE contrast, median denoise and Otsu binarize a photo for OCR"""
+    try:
+        binary = run_preprocess_chain(img, DEFAULT_PREPROCESS_CHAIN)
+        print("图片已进行左右翻转处理")
+        return binary
+    
+    except Exception as e:
+        print(f"图片预处理错误: {e}")
+        return img  # 如果预处理失败，返回原图
+
+
+# ========== 上传准备 ==========
+
+def find_text_region(image):
+    """Locate the text lines of a preprocessed image
+    
+    Returns ((left, top, right, bottom), median line height), or
+    (None, None) when nothing text-like is found.
+    """
+    import cv2
+    
+    gray = image if len(image.shape) == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    
+    # 形态学梯度提取笔画边缘（不论黑底白字还是白底黑字），再横向闭运算把字连成行
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+    _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel_width = max(width // 40, 3)
+    lines = cv2.morphologyEx(edges, cv2.MORPH_CLOSE,
+                             cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_width, max(kernel_width // 4, 1))))
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        # 文字行：不太小、不太高、宽大于高
+        if h < height * 0.01 or h > height * 0.5 or w < h:
+            continue
+        boxes.append((x, y, w, h))
+    if not boxes:
+        return None, None
+    
+    pad_x, pad_y = width // 50, height // 50
+    left = max(min(x for x, _, _, _ in boxes) - pad_x, 0)
+    top = max(min(y for _, y, _, _ in boxes) - pad_y, 0)
+    right = min(max(x + w for x, _, w, _ in boxes) + pad_x, width)
+    bottom = min(max(y + h for _, y, _, h in boxes) + pad_y, height)
+    line_heights = sorted(h for _, _, _, h in boxes)
+    return (left, top, right, bottom), line_heights[len(line_heights) // 2]
+
+
+def encode_for_upload(image):
+    """Encode an image as compactly as OCR allows; returns (bytes, format, quality)
+    
+    JPEG uses the highest quality that fits OCR_UPLOAD_BUDGET. Lossless PNG
+    is used instead whenever it is smaller, which is usual for binarized
+    images.
+    """
+    import cv2
+    
+    jpeg = None
+    for quality in OCR_JPEG_QUALITIES:
+        success, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if success:
+            jpeg = (encoded.tobytes(), 'jpg', quality)
+            if len(jpeg[0]) <= OCR_UPLOAD_BUDGET:
+                break
+    
+    success, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 9])
+    if success and (jpeg is None or len(encoded) <= len(jpeg[0])):
+        return encoded.tobytes(), 'png', None
+    if jpeg is None:
+        raise Exception("图像编码失败")
+    return jpeg
+
+
+def prepare_ocr_upload(image):
+    """Crop a preprocessed image to its text, downscale it and encode it
+    
+    Returns (encoded bytes, info dict with crop, scale, format, quality, size).
+    Images are passed to OpenCV in BGR (or grey) order as they are; no
+    colour conversion is needed before encoding.
+    """
+    import cv2
+    
+    info = {'crop': None, 'scale': 1.0}
+    region, line_height = find_text_region(image)
+    height, width = image.shape[:2]
+    if region:
+        left, top, right, bottom = region
+        # 文字区域几乎占满整张图时不裁剪
+        if (right - left) * (bottom - top) < width * height * 0.9:
+            image = image[top:bottom, left:right]
+            info['crop'] = region
+    
+    # 缩小到最长边不超过OCR_MAX_SIDE，但文字行高不低于OCR_MIN_TEXT_HEIGHT
+    height, width = image.shape[:2]
+    scale = OCR_MAX_SIDE / max(height, width)
+    if line_height:
+        scale = max(scale, OCR_MIN_TEXT_HEIGHT / line_height)
+    if scale < 1.0:
+        image = cv2.resize(image, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                           interpolation=cv2.INTER_AREA)
+        info['scale'] = scale
+    
+    data, image_format, quality = encode_for_upload(image)
+    info.update({'format': image_format, 'quality': quality, 'size': len(data),
+                 'width': image.shape[1], 'height': image.shape[0]})
+    return data, info
+
+
+# ========== 百度OCR ==========
+
+class OcrTokenError(Exception):
+    """The OCR service rejected the access token"""
+
+def request_baidu_access_token(api_key=BAIDU_OCR_API_KEY, secret_key=BAIDU_OCR_SECRET_KEY, base_url=BAIDU_API_BASE):
+    """Request a new access token; returns (token, expires_in seconds)"""
+    params = {
+        'grant_type': 'client_credentials',
+        'client_id': api_key,
+        'client_secret': secret_key
+    }
+    response = http_client.post(base_url + BAIDU_TOKEN_PATH, params=params, timeout=(3.05, 10))
+    result = response.json()
+    if 'access_token' not in result:
+        raise Exception(f"获取访问令牌失败: {result}")
+    return result['access_token'], result.get('expires_in', 3600)
+
+
+def recognize_text_baidu(image_data, access_token, base_url=BAIDU_API_BASE):
+    """Recognize encoded image bytes with Baidu accurate_basic; returns the text lines joined by spaces"""
+    # 百度接口要求图片以base64表单字段上传
+    base64_image = base64.b64encode(image_data).decode('utf-8')
+    payload = {
+        'image': base64_image,
+        'detect_direction': 'false',
+        'paragraph': 'true',
+        'probability': 'false',
+        'multidirectional_recognize': 'false'
+    }
+    headers = {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'Accept': 'application/json'
+    }
+    
+    print(f"发送OCR请求，图片大小: {len(base64_image)} chars")
+    response = http_client.post(f"{base_url}{BAIDU_OCR_PATH}?access_token={access_token}", headers=headers,
+                                data=payload, timeout=(3.05, 30))
+    response.raise_for_status()
+    result = response.json()
+    print(f"OCR识别响应: {result}")
+    
+    if result.get('error_code') in BAIDU_TOKEN_ERROR_CODES:
+        raise OcrTokenError(f"OCR识别失败: {result.get('error_msg', '未知错误')}")
+    if 'error_code' in result:
+        raise Exception(f"OCR识别失败: {result.get('error_msg', '未知错误')}")
+    
+    texts = [item['words'] for item in result.get('words_result', []) if 'words' in item]
+    return " ".join(texts)
+
+
+# ========== Tesseract ==========
+
+def tesseract_available():
+    """True if the tesseract command is installed"""
+    return shutil.which(TESSERACT_CMD) is not None
+
+
+def tesseract_lines(image_data, lang=TESSERACT_LANG):
+    """Run the tesseract command on encoded image bytes; returns the non-empty text lines"""
+    result = subprocess.run([TESSERACT_CMD, 'stdin', 'stdout', '-l', lang],
+                            input=image_data, capture_output=True, timeout=60)
+    if result.returncode != 0:
+        raise Exception(f"Tesseract识别失败: {result.stderr.decode('utf-8', 'replace').strip()}")
+    lines = [line.strip() for line in result.stdout.decode('utf-8', 'replace').splitlines()]
+    return [line for line in lines if line]
+
+
+def recognize_text_tesseract(image_data, lang=TESSERACT_LANG):
+    """Recognize encoded image bytes with Tesseract; returns the text lines joined by spaces"""
+    return " ".join(tesseract_lines(image_data, lang))
+
+
+# ========== Access token ==========
+
+class TokenManager:
+    """Access token shared by every process through a small JSON file
+    
+    get_token() returns the cached token without a network request while it
+    is valid; a token refreshed by another process is picked up from the
+    file. start() refreshes in a background thread before the token
+    expires, so callers normally never wait for the token endpoint. Two
+    processes refreshing at the same moment is harmless, both tokens stay
+    valid.
+    """
+    
+    def __init__(self, key, fetch_token, path=OCR_TOKEN_PATH, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.key = key
+        # fetch_token() -> (token, expires_in seconds)
+        self.fetch_token = fetch_token
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self.access_token = ''
+        self.expires_at = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.refresh_thread = None
+    
+    def is_fresh(self):
+        return bool(self.access_token) and self.expires_at - self.refresh_margin > time.time()
+    
+    def read_file(self):
+        """All tokens in the shared file, {} if it is missing or unreadable"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def load(self):
+        """Take over the token stored in the shared file"""
+        entry = self.read_file().get(self.key)
+        if entry and entry.get('expires_at', 0) > self.expires_at:
+            self.access_token = entry['access_token']
+            self.expires_at = entry['expires_at']
+    
+    def save(self):
+        """Write the token to the shared file (readable by the current user only)"""
+        tokens = self.read_file()
+        tokens[self.key] = {'access_token': self.access_token, 'expires_at': self.expires_at}
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(tokens, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"保存access token失败: {e}")
+    
+    def get_token(self):
+        """Valid access token, requested from the service only when none is cached"""
+        if self.is_fresh():
+            return self.access_token
+        with self.lock:
+            self.load()
+            if self.is_fresh():
+                return self.access_token
+            
+            access_token, expires_in = self.fetch_token()
+            self.access_token = access_token
+            self.expires_at = time.time() + expires_in
+            self.save()
+            print(f"OCR access token obtained successfully ({self.key})")
+            return access_token
+    
+    def invalidate(self, access_token):
+        """Drop a token the service rejected so the next get_token() fetches a new one"""
+        with self.lock:
+            if self.access_token == access_token:
+                self.access_token = ''
+                self.expires_at = 0
+                tokens = self.read_file()
+                if tokens.get(self.key, {}).get('access_token') == access_token:
+                    self.save()
+    
+    def start(self):
+        """Start refreshing in the background; returns immediately"""
+        with self.lock:
+            if self.refresh_thread and self.refresh_thread.is_alive():
+                return
+            self.stop_event.clear()
+            self.refresh_thread = threading.Thread(target=self.refresh_loop, daemon=True)
+            self.refresh_thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+    
+    def refresh_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                self.get_token()
+                delay = max(self.expires_at - self.refresh_margin - time.time(), 1)
+            except Exception as e:
+                print(f"刷新OCR access token失败: {e}")
+                delay = TOKEN_RETRY_INTERVAL
+            self.stop_event.wait(delay)
+
+
+# 同一进程内的窗口共用一个TokenManager
+_token_managers = {}
+_token_managers_lock = threading.Lock()
+
+
+def shared_token_manager(key, fetch_token):
+    """The process-wide TokenManager for a key"""
+    with _token_managers_lock:
+        if key not in _token_managers:
+            _token_managers[key] = TokenManager(key, fetch_token)
+        return _token_managers[key]
+
+
+# ========== OCR后端 ==========
+
+class OcrBackend(abc.ABC):
+    """Interface of an OCR engine
+    
+    recognize() takes a preprocessed OpenCV image and returns the text. It
+    is called from worker threads, never from the Tk thread.
+    """
+    
+    name = ''
+    # Whether results may be stored in the OCR cache
+    cache_results = True
+    
+    def prepare(self):
+        """Warm up before the first request (e.g. start a token refresh); must not block"""
+    
+    @abc.abstractmethod
+    def recognize(self, image):
+        """Text recognized in a preprocessed image"""
+
+
+class BaiduOcrBackend(OcrBackend):
+    """Baidu accurate_basic over HTTP"""
+    
+    name = 'baidu'
+    
+    def __init__(self, api_key=BAIDU_OCR_API_KEY, secret_key=BAIDU_OCR_SECRET_KEY, base_url=BAIDU_API_BASE):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.base_url = base_url
+        self.tokens = shared_token_manager(
+            f"{base_url}|{api_key}",
+            lambda: request_baidu_access_token(self.api_key, self.secret_key, self.base_url))
+    
+    def get_access_token(self):
+        return self.tokens.get_token()
+    
+    def prepare(self):
+        self.tokens.start()
+    
+    def recognize(self, image):
+        # 裁剪到文字区域、缩小并按图片选择编码格式和质量，减少上传数据量
+        upload_data, upload_info = prepare_ocr_upload(image)
+        print(f"OCR上传准备: {upload_info}")
+        access_token = self.get_access_token()
+        try:
+            return recognize_text_baidu(upload_data, access_token, self.base_url)
+        except OcrTokenError:
+            # token被提前作废（例如在别处重新生成了密钥），换新token重试一次
+            self.tokens.invalidate(access_token)
+            return recognize_text_baidu(upload_data, self.get_access_token(), self.base_url)
+
+
+class LocalApiOcrBackend(BaiduOcrBackend):
+    """Baidu-compatible stand-in served by local_api_server.py"""
+    
+    name = 'local'
+    # 替身服务的结果不一定是真实识别结果，不写入缓存
+    cache_results = False
+    
+    def __init__(self, base_url=LOCAL_API_BASE):
+        super().__init__('local', 'local', base_url)
+
+
+class TesseractOcrBackend(OcrBackend):
+    """Local Tesseract engine, works without internet"""
+    
+    name = 'tesseract'
+    
+    def __init__(self, lang=TESSERACT_LANG):
+        self.lang = lang
+    
+    def prepare(self):
+        if not tesseract_available():
+            raise Exception(f"未找到Tesseract命令: {TESSERACT_CMD}")
+    
+    def recognize(self, image):
+        import cv2
+        
+        success, encoded = cv2.imencode('.png', image)
+        if not success:
+            raise Exception("图像编码失败")
+        return recognize_text_tesseract(encoded.tobytes(), self.lang)
+
+
+OCR_BACKENDS = {
+    'baidu': BaiduOcrBackend,
+    'tesseract': TesseractOcrBackend,
+    'local': LocalApiOcrBackend
+}
+
+
+def create_ocr_backend(name=None):
+    """Create an OCR backend by name (default: OCR_BACKEND, 'baidu')"""
+    name = (name or OCR_BACKEND).lower()
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"未知的OCR后端: {name}（可选: {', '.join(OCR_BACKENDS)}）")
+    return OCR_BACKENDS[name]()
+
+
+# ========== 感知哈希缓存 ==========
+
+def perceptual_hash(image):
+    """64-bit difference hash (dHash) of an OpenCV image
+    
+    The image is shrunk to 9x8 grey pixels and each bit says whether a pixel
+    is brighter than its right neighbour, so small shifts, noise and
+    re-encoding barely change the hash.
+    """
+    import cv2
+    
+    if len(image.shape) == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    value = 0
+    for row in small.tolist():
+        for left, right in zip(row, row[1:]):
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+
+class OcrCache:
+    """Persistent OCR results keyed by OCR backend and perceptual hash
+    
+    Engines read the same photo differently, so a result is only reused for
+    the backend that produced it. All hashes are kept in memory for the nearest-match scan; the SQLite
+    file only stores them between runs. Safe to use from worker threads.
+    """
+    
+    def __init__(self, db_path=OCR_CACHE_PATH, threshold=OCR_CACHE_THRESHOLD):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                id INTEGER PRIMARY KEY,
+                backend TEXT NOT NULL,
+                phash INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            
+            CREATE TABLE IF NOT EXISTS ocr_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            
+            INSERT OR IGNORE INTO ocr_cache_stats (name, value) VALUES ('lookups', 0), ('hits', 0);
+        ''')
+        self.conn.commit()
+        # SQLite整数是有符号64位，哈希按有符号数存储
+        self.entries = [(entry_id, backend, phash & 0xFFFFFFFFFFFFFFFF, text) for entry_id, backend, phash, text in
+                        self.conn.execute("SELECT id, backend, phash, text FROM ocr_cache")]
+    
+    def lookup(self, backend, phash):
+        """Cached text of the closest photo stored by this backend within the threshold, or None"""
+        with self.lock:
+            best = None
+            best_distance = self.threshold + 1
+            for entry in self.entries:
+                if entry[1] != backend:
+                    continue
+                distance = hamming_distance(phash, entry[2])
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+                    if distance == 0:
+                        break
+            
+            self.conn.execute("UPDATE ocr_cache_stats SET value = value + 1 WHERE name = 'lookups'")
+            if best:
+                self.conn.execute("UPDATE ocr_cache_stats SET value = value + 1 WHERE name = 'hits'")
+                self.conn.execute("UPDATE ocr_cache SET hits = hits + 1 WHERE id = ?", (best[0],))
+            self.conn.commit()
+            return best[3] if best else None
+    
+    def store(self, backend, phash, text):
+        """Remember the text a backend recognized in a photo (empty results are not cached)"""
+        if not text or not text.strip():
+            return
+        signed_hash = phash - (1 << 64) if phash >= (1 << 63) else phash
+        with self.lock:
+            cursor = self.conn.execute("INSERT INTO ocr_cache (backend, phash, text) VALUES (?, ?, ?)",
+                                       (backend, signed_hash, text))
+            self.conn.commit()
+            self.entries.append((cursor.lastrowid, backend, phash, text))
+    
+    def stats(self):
+        """Entries, lookups, hits, hit rate and API calls saved"""
+        with self.lock:
+            counters = dict(self.conn.execute("SELECT name, value FROM ocr_cache_stats"))
+        lookups = counters.get('lookups', 0)
+        hits = counters.get('hits', 0)
+        return {
+            'entries': len(self.entries),
+            'lookups': lookups,
+            'hits': hits,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'api_calls_saved': hits
+        }
+    
+    def clear(self):
+        """Drop all cached results and reset the counters"""
+        with self.lock:
+            self.conn.execute("DELETE FROM ocr_cache")
+            self.conn.execute("UPDATE ocr_cache_stats SET value = 0")
+            self.conn.commit()
+            self.entries = []
+    
+    def close(self):
+        """Close the cache database"""
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR service tools')
+    parser.add_argument('command', choices=['stats', 'clear'])
+    parser.add_argument('--cache', default=OCR_CACHE_PATH, help='OCR cache database (default: ocr_cache.db)')
+    args = parser.parse_args()
+    
+    cache = OcrCache(args.cache)
+    try:
+        if args.command == 'stats':
+            stats = cache.stats()
+            print(f"📦 缓存条目: {stats['entries']}")
+            print(f"🔍 查询次数: {stats['lookups']}")
+            print(f"✅ 命中次数: {stats['hits']} ({stats['hit_rate'] * 100:.1f}%)")
+            print(f"💰 节省的OCR API调用: {stats['api_calls_saved']}")
+        else:
+            cache.clear()
+            print("✅ OCR缓存已清空")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Photo Store
+Content-addressed storage for product photos. A photo is saved under the
+SHA-256 of its encoded bytes in hash-sharded directories
+(photos/ab/cd/abcd....webp), so identical photos are stored once and no
+directory grows large. Stored paths use forward slashes and work on both
+Windows and Linux.
+
+Usage:
+    python photo_store.py migrate [--db products.db] [--format webp] [--quality 80] [--remove-originals]
+    python photo_store.py cleanup [--yes]
+    python photo_store.py stats
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+from product_database import DB_PATH
+
+
+PHOTO_ROOT = 'photos'
+
+# Format and quality for new photos; PHOTO_FORMAT=webp gives much smaller files
+PHOTO_FORMAT = os.environ.get('PHOTO_FORMAT', 'jpg').lower()
+PHOTO_QUALITY = {'jpg': 85, 'webp': 80}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+# (表, 列) 中保存的照片路径
+PHOTO_COLUMNS = (('products', 'product_image'), ('product_parts', 'part_image'))
+
+
+def resolve_photo_path(path):
+    """Turn a stored product_image path into a path for this OS
+    
+    Older rows were saved on Windows with backslashes.
+    """
+    if not path:
+        return path
+    return path.replace('\\', '/').replace('/', os.sep)
+
+
+def is_store_path(path, root=PHOTO_ROOT):
+    """True if the path already points into the content-addressed store"""
+    parts = resolve_photo_path(path).split(os.sep)
+    return (len(parts) == 4 and parts[0] == root and len(parts[1]) == 2 and len(parts[2]) == 2
+            and parts[3].startswith(parts[1] + parts[2]))
+
+
+def encode_image(image, image_format=None, quality=None):
+    """Encode an OpenCV image; returns (bytes, extension)"""
+    import cv2
+    
+    image_format = (image_format or PHOTO_FORMAT).lower()
+    if image_format == 'jpeg':
+        image_format = 'jpg'
+    quality = quality or PHOTO_QUALITY.get(image_format, 85)
+    if image_format == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    elif image_format == 'jpg':
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+    else:
+        params = []
+    
+    success, encoded = cv2.imencode('.' + image_format, image, params)
+    if not success:
+        raise Exception(f"图像编码失败: {image_format}")
+    return encoded.tobytes(), image_format
+
+
+def save_photo_bytes(data, extension, root=PHOTO_ROOT):
+    """Store encoded image bytes and return the stored path
+    
+    An identical photo that is already stored is reused, not written again.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    directory = os.path.join(root, digest[:2], digest[2:4])
+    path = os.path.join(directory, f"{digest}.{extension.lstrip('.')}")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    return path.replace(os.sep, '/')
+
+
+def save_photo(image, image_format=None, quality=None, root=PHOTO_ROOT):
+    """Encode an OpenCV image and store it; returns the stored path"""
+    data, extension = encode_image(image, image_format, quality)
+    return save_photo_bytes(data, extension, root)
+
+
+def store_file(path, image_format=None, quality=None, root=PHOTO_ROOT):
+    """Store an existing image file, re-encoding it when image_format is given"""
+    if image_format:
+        import cv2
+        import numpy as np
+        
+        image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise Exception(f"无法读取图片: {path}")
+        return save_photo(image, image_format, quality, root)
+    
+    with open(path, 'rb') as f:
+        data = f.read()
+    extension = os.path.splitext(path)[1].lstrip('.').lower() or 'jpg'
+    return save_photo_bytes(data, extension, root)
+
+
+def loose_photo_files(root=PHOTO_ROOT):
+    """Image files directly in the photo root (the old flat layout)"""
+    if not os.path.isdir(root):
+        return []
+    return [os.path.join(root, name) for name in sorted(os.listdir(root))
+            if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(os.path.join(root, name))]
+
+
+def referenced_photo_paths(conn):
+    """(table, column, row id, path) of every photo path in PHOTO_COLUMNS"""
+    for table, column in PHOTO_COLUMNS:
+        rows = conn.execute(f"SELECT id, {column} FROM {table} WHERE {column} IS NOT NULL AND {column} != ''")
+        for row_id, path in rows:
+            yield table, column, row_id, path
+
+
+def migrate_products(conn, image_format=None, quality=None, remove_originals=False, root=PHOTO_ROOT):
+    """Move every product_image and part_image into the store and rewrite the paths
+    
+    Returns (migrated, missing, bytes_before, bytes_after). Originals are
+    only removed after the new paths are committed.
+    """
+    rows = list(referenced_photo_paths(conn))
+    
+    updates = {}
+    originals = set()
+    missing = 0
+    bytes_before = bytes_after = 0
+    for table, column, row_id, photo_path in rows:
+        if is_store_path(photo_path, root):
+            continue
+        path = resolve_photo_path(photo_path)
+        if not os.path.exists(path):
+            print(f"⚠️  图片不存在，跳过: {photo_path}")
+            missing += 1
+            continue
+        new_path = store_file(path, image_format, quality, root)
+        bytes_before += os.path.getsize(path)
+        bytes_after += os.path.getsize(resolve_photo_path(new_path))
+        updates.setdefault((table, column), []).append((new_path, row_id))
+        originals.add(path)
+    
+    with conn:
+        for (table, column), values in updates.items():
+            conn.executemany(f"UPDATE {table} SET {column} = ? WHERE id = ?", values)
+    
+    if remove_originals:
+        for path in originals:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"⚠️  删除原图失败 {path}: {e}")
+    return sum(len(values) for values in updates.values()), missing, bytes_before, bytes_after
+
+
+def unreferenced_photo_files(conn, root=PHOTO_ROOT):
+    """Loose photos and stored photos that no product or part points to (retakes, _processed copies)"""
+    referenced = {os.path.normcase(os.path.abspath(resolve_photo_path(path)))
+                  for _, _, _, path in referenced_photo_paths(conn)}
+    files = loose_photo_files(root)
+    for directory, _, names in os.walk(root):
+        if directory != root:
+            files.extend(os.path.join(directory, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+    return [path for path in files if os.path.normcase(os.path.abspath(path)) not in referenced]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Content-addressed product photo store')
+    parser.add_argument('command', choices=['migrate', 'cleanup', 'stats'])
+    parser.add_argument('--db', default=DB_PATH, help='Products database (default: products.db)')
+    parser.add_argument('--format', choices=['jpg', 'webp'], help='Re-encode photos to this format while migrating')
+    parser.add_argument('--quality', type=int, help='Encoding quality (default: jpg 85, webp 80)')
+    parser.add_argument('--remove-originals', action='store_true', help='Delete the old files after migrating')
+    parser.add_argument('--yes', action='store_true', help='Actually delete files in cleanup')
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.db):
+        print(f"❌ 数据库文件不存在: {args.db}")
+        sys.exit(1)
+    conn = sqlite3.connect(args.db)
+    
+    try:
+        if args.command == 'migrate':
+            migrated, missing, before, after = migrate_products(conn, args.format, args.quality,
+                                                               args.remove_originals)
+            print(f"✅ 已迁移 {migrated} 张产品和部件照片，缺失 {missing} 张")
+            if migrated:
+                print(f"📏 {before:,} 字节 -> {after:,} 字节 ({after * 100 / max(before, 1):.0f}%)")
+        
+        elif args.command == 'cleanup':
+            files = unreferenced_photo_files(conn)
+            total = sum(os.path.getsize(path) for path in files)
+            for path in files:
+                print(f"  {path}")
+            print(f"🗑️  {len(files)} 个未被引用的照片，共 {total:,} 字节")
+            if files and args.yes:
+                for path in files:
+                    os.remove(path)
+                print("✅ 已删除")
+            elif files:
+                print("💡 使用 --yes 删除这些文件")
+        
+        else:
+            stored = []
+            for directory, _, names in os.walk(PHOTO_ROOT):
+                if directory != PHOTO_ROOT:
+                    stored.extend(os.path.join(directory, name) for name in names)
+            loose = loose_photo_files()
+            print(f"📦 存储中的照片: {len(stored)} 个, {sum(os.path.getsize(p) for p in stored):,} 字节")
+            print(f"📁 旧目录中的照片: {len(loose)} 个, {sum(os.path.getsize(p) for p in loose):,} 字节")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
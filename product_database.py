@@ -0,0 +1,692 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Product Database Helpers
+Shared schema upgrades and queries for products.db, used by the scanner,
+the product manager and the database viewer
+"""
+
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+
+DB_PATH = 'products.db'
+
+# Columns shown in the products list, in display order
+PRODUCT_LIST_COLUMNS = ('gs1_code', 'product_name', 'packaging_waste_type', 'packaging_material',
+                        'plastic_type', 'product_waste_type', 'created_at')
+
+# Columns of the scanner's product panel, in the order update_product_info_display expects
+PRODUCT_DETAIL_COLUMNS = ('product_name', 'product_image', 'packaging_waste_type', 'product_waste_type',
+                          'packaging_material', 'plastic_type', 'created_at')
+
+PART_COLUMNS = ('part_name', 'material', 'waste_category', 'recycling_method', 'part_image')
+
+# Default disposal instructions when a part has no recycling_method
+DISPOSAL_INSTRUCTIONS = {
+    'Recyclable': 'Empty, rinse and put in the recyclable bin',
+    'Hazardous': 'Take to a hazardous waste collection point',
+    'Wet Waste': 'Put in the wet (kitchen) waste bin',
+    'Other Waste': 'Put in the other (residual) waste bin'
+}
+
+
+def table_exists(conn, name):
+    """Check whether a table (or virtual table) exists"""
+    cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def upgrade_database(conn):
+    """Create the helper tables, indexes and triggers used by the applications
+    
+    Everything runs in one transaction, so a failed upgrade leaves the
+    schema as it was; the error is raised after the rollback.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN")
+    try:
+        ensure_product_parts_table(conn)
+        ensure_search_index(conn)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_product_parts_product_id ON product_parts (product_id)")
+        # Products list is ordered by created_at DESC
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_products_created_at ON products (created_at)")
+        ensure_gtin14_column(conn)
+        ensure_change_log(conn)
+        ensure_statistics(conn)
+        ensure_scan_events(conn)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Database upgrade failed: {e}")
+        raise
+
+
+def ensure_product_parts_table(conn):
+    """Create product_parts table (already present in shipped products.db)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS product_parts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            part_name TEXT,
+            material TEXT,
+            waste_category TEXT,
+            recycling_method TEXT,
+            part_image TEXT,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+
+
+# ========== GTIN-14 规范化 ==========
+
+def gtin_check_digit(digits):
+    """GS1 mod-10 check digit for the digits preceding it"""
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        total += int(digit) * (3 if i % 2 == 0 else 1)
+    return str((10 - total % 10) % 10)
+
+
+def expand_upc_e(code):
+    """Expand a UPC-E code (6, 7 or 8 digits) to the 12-digit UPC-A it stands for"""
+    if len(code) == 6:
+        number_system, digits, check = '0', code, None
+    elif len(code) == 7:
+        number_system, digits, check = code[0], code[1:], None
+    else:
+        number_system, digits, check = code[0], code[1:7], code[7]
+    
+    d1, d2, d3, d4, d5, d6 = digits
+    if d6 in '012':
+        body = f"{number_system}{d1}{d2}{d6}0000{d3}{d4}{d5}"
+    elif d6 == '3':
+        body = f"{number_system}{d1}{d2}{d3}00000{d4}{d5}"
+    elif d6 == '4':
+        body = f"{number_system}{d1}{d2}{d3}{d4}00000{d5}"
+    else:
+        body = f"{number_system}{d1}{d2}{d3}{d4}{d5}0000{d6}"
+    return body + (check if check is not None else gtin_check_digit(body))
+
+
+# Scanner symbologies (pyzbar names and common spellings) that always carry a GTIN
+GTIN_SYMBOLOGIES = ('EAN13', 'EAN8', 'UPCA', 'UPCE', 'EAN-13', 'EAN-8', 'UPC-A', 'UPC-E', 'EAN_13', 'EAN_8',
+                    'UPC_A', 'UPC_E', 'GTIN14', 'ITF14')
+
+
+def normalize_gtin(code, symbology=None):
+    """Canonical GTIN-14 for an EAN-8/EAN-13/UPC-A/UPC-E/GTIN-14 code, None if the code is not a GTIN
+    
+    Left-padding with zeros keeps the check digit valid, so every variant of
+    the same item (UPC-A vs EAN-13 with a leading zero, UPC-E vs UPC-A) maps
+    to one key. 8-digit codes are EAN-8 unless the scanner reports UPC-E.
+    """
+    if not code:
+        return None
+    code = code.strip()
+    if not code.isdigit():
+        return None
+    
+    if symbology in ('UPCE', 'UPC_E', 'UPC-E') and len(code) in (6, 7, 8):
+        if len(code) != 6 and code[0] not in '01':
+            return None
+        code = expand_upc_e(code)
+    
+    if len(code) not in (8, 12, 13, 14):
+        return None
+    if gtin_check_digit(code[:-1]) != code[-1]:
+        return None
+    return code.zfill(14)
+
+
+def ensure_gtin14_column(conn):
+    """Add the canonical gtin14 column, fill it for existing rows and index it"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(products)")]
+    if 'gtin14' not in columns:
+        conn.execute("ALTER TABLE products ADD COLUMN gtin14 TEXT")
+        print("Added gtin14 column")
+    
+    # 唯一索引建立前先迁移，重复的变体只保留最早的记录
+    used = {row[0] for row in conn.execute("SELECT gtin14 FROM products WHERE gtin14 IS NOT NULL")}
+    updates = []
+    for product_id, gs1_code in conn.execute("SELECT id, gs1_code FROM products WHERE gtin14 IS NULL ORDER BY id").fetchall():
+        gtin14 = normalize_gtin(gs1_code)
+        if gtin14 is None:
+            continue
+        if gtin14 in used:
+            print(f"GTIN-14 {gtin14} of '{gs1_code}' duplicates another product, left unset")
+            continue
+        used.add(gtin14)
+        updates.append((gtin14, product_id))
+    if updates:
+        conn.executemany("UPDATE products SET gtin14 = ? WHERE id = ?", updates)
+        print(f"Filled gtin14 for {len(updates)} products")
+    
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_products_gtin14 ON products (gtin14)")
+
+
+# ========== 产品与部件 ==========
+
+def load_product_with_parts(conn, gs1_code, symbology=None):
+    """Load a product and all its parts with one indexed join
+    
+    GTIN codes are matched on the canonical gtin14 key so every symbology
+    variant finds the same row; gs1_code is matched as well for other codes
+    and rows not yet migrated. Returns (product, parts): product is a tuple
+    in PRODUCT_DETAIL_COLUMNS order (None if not found), parts is a list of
+    dicts keyed by PART_COLUMNS.
+    """
+    product_columns = ", ".join(f"p.{column}" for column in PRODUCT_DETAIL_COLUMNS)
+    part_columns = ", ".join(f"pp.{column}" for column in PART_COLUMNS)
+    cursor = conn.execute(f'''
+        SELECT p.id, {product_columns}, pp.id, {part_columns}
+        FROM products p
+        LEFT JOIN product_parts pp ON pp.product_id = p.id
+        WHERE p.gtin14 = ? OR p.gs1_code = ?
+        ORDER BY p.gs1_code = ? DESC, pp.id
+    ''', (normalize_gtin(gs1_code, symbology), gs1_code, gs1_code))
+    rows = cursor.fetchall()
+    if not rows:
+        return None, []
+    
+    product_id = rows[0][0]
+    detail_end = 1 + len(PRODUCT_DETAIL_COLUMNS)
+    product = tuple(rows[0][1:detail_end])
+    parts = []
+    for row in rows:
+        # LEFT JOIN: 没有部件时部件id为NULL
+        if row[0] == product_id and row[detail_end] is not None:
+            parts.append(dict(zip(PART_COLUMNS, row[detail_end + 1:])))
+    return product, parts
+
+
+def format_part_disposal(part):
+    """One line of disposal instructions for a part"""
+    name = part.get('part_name') or 'Part'
+    if part.get('material'):
+        name += f" ({part['material']})"
+    category = part.get('waste_category') or 'Unclassified'
+    method = part.get('recycling_method') or DISPOSAL_INSTRUCTIONS.get(category, 'Check local rules')
+    return f"{name}: {category} - {method}"
+
+
+# ========== 变更通知 ==========
+
+# Number of change-log rows kept; older rows are pruned on upgrade
+CHANGE_LOG_KEEP = 1000
+
+
+def ensure_change_log(conn):
+    """Create the product_changes log and the triggers that write it"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS product_changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            gs1_code TEXT,
+            operation TEXT,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    parent_code_sql = "(SELECT gs1_code FROM products WHERE id = {})"
+    triggers = (
+        '''CREATE TRIGGER IF NOT EXISTS products_change_insert AFTER INSERT ON products BEGIN
+            INSERT INTO product_changes (product_id, gs1_code, operation) VALUES (NEW.id, NEW.gs1_code, 'insert');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS products_change_update AFTER UPDATE ON products BEGIN
+            INSERT INTO product_changes (product_id, gs1_code, operation) VALUES (NEW.id, NEW.gs1_code, 'update');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS products_change_rename AFTER UPDATE OF gs1_code ON products
+        WHEN OLD.gs1_code IS NOT NEW.gs1_code BEGIN
+            INSERT INTO product_changes (product_id, gs1_code, operation) VALUES (OLD.id, OLD.gs1_code, 'delete');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS products_change_delete AFTER DELETE ON products BEGIN
+            INSERT INTO product_changes (product_id, gs1_code, operation) VALUES (OLD.id, OLD.gs1_code, 'delete');
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS product_parts_change_insert AFTER INSERT ON product_parts BEGIN
+            INSERT INTO product_changes (product_id, gs1_code, operation)
+            VALUES (NEW.product_id, {parent_code_sql.format('NEW.product_id')}, 'update');
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS product_parts_change_update AFTER UPDATE ON product_parts BEGIN
+            INSERT INTO product_changes (product_id, gs1_code, operation)
+            VALUES (NEW.product_id, {parent_code_sql.format('NEW.product_id')}, 'update');
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS product_parts_change_delete AFTER DELETE ON product_parts BEGIN
+            INSERT INTO product_changes (product_id, gs1_code, operation)
+            VALUES (OLD.product_id, {parent_code_sql.format('OLD.product_id')}, 'update');
+        END'''
+    )
+    # 逐条执行：executescript会先提交当前事务
+    for trigger in triggers:
+        conn.execute(trigger)
+    
+    conn.execute("DELETE FROM product_changes WHERE id <= (SELECT MAX(id) FROM product_changes) - ?",
+                 (CHANGE_LOG_KEEP,))
+
+
+class ChangeFeed:
+    """Cheap poller for product changes made by other windows or processes
+    
+    PRAGMA data_version only changes when another connection commits and
+    total_changes when this connection writes, so a poll with nothing new
+    costs two pragma reads and never touches the change log.
+    """
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.enabled = table_exists(conn, 'product_changes')
+        self.version = self.current_version()
+        self.last_change_id = 0
+        if self.enabled:
+            self.last_change_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM product_changes").fetchone()[0]
+    
+    def current_version(self):
+        """Version stamp that changes whenever anybody commits a write"""
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return data_version, self.conn.total_changes
+    
+    def poll(self):
+        """Return changes since the last poll as a list of (product_id, gs1_code, operation)
+        
+        Several changes to one product are collapsed into the latest one.
+        """
+        if not self.enabled:
+            return []
+        version = self.current_version()
+        if version == self.version:
+            return []
+        self.version = version
+        
+        rows = self.conn.execute(
+            "SELECT id, product_id, gs1_code, operation FROM product_changes WHERE id > ? ORDER BY id",
+            (self.last_change_id,)
+        ).fetchall()
+        if not rows:
+            return []
+        self.last_change_id = rows[-1][0]
+        
+        latest = {}
+        for change_id, product_id, gs1_code, operation in rows:
+            latest[(product_id, gs1_code)] = operation
+        return [(product_id, gs1_code, operation) for (product_id, gs1_code), operation in latest.items()]
+
+
+# ========== 分类统计 ==========
+
+# Classification columns counted in product_stats; 'total' counts all products
+STATS_DIMENSIONS = ('packaging_waste_type', 'product_waste_type', 'packaging_material', 'plastic_type')
+
+
+def ensure_statistics(conn):
+    """Create product_stats and the triggers that keep its counts current
+    
+    Each row is (dimension, value, product_count); NULL and empty values are
+    both counted under ''. Triggers adjust only the affected counters, so
+    reading totals never scans products.
+    """
+    created = not table_exists(conn, 'product_stats')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS product_stats (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            product_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        ) WITHOUT ROWID
+    ''')
+    
+    increment_sql = ("INSERT INTO product_stats (dimension, value, product_count) VALUES ('{0}', {1}, 1) "
+                     "ON CONFLICT (dimension, value) DO UPDATE SET product_count = product_count + 1;")
+    decrement_sql = "UPDATE product_stats SET product_count = product_count - 1 WHERE dimension = '{0}' AND value = {1};"
+    
+    insert_body = [increment_sql.format('total', "''")]
+    delete_body = [decrement_sql.format('total', "''")]
+    for dimension in STATS_DIMENSIONS:
+        insert_body.append(increment_sql.format(dimension, f"COALESCE(NEW.{dimension}, '')"))
+        delete_body.append(decrement_sql.format(dimension, f"COALESCE(OLD.{dimension}, '')"))
+    
+    triggers = [
+        f'''CREATE TRIGGER IF NOT EXISTS product_stats_insert AFTER INSERT ON products BEGIN
+            {" ".join(insert_body)}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS product_stats_delete AFTER DELETE ON products BEGIN
+            {" ".join(delete_body)}
+        END'''
+    ]
+    for dimension in STATS_DIMENSIONS:
+        triggers.append(f'''CREATE TRIGGER IF NOT EXISTS product_stats_update_{dimension} AFTER UPDATE OF {dimension} ON products
+        WHEN COALESCE(OLD.{dimension}, '') <> COALESCE(NEW.{dimension}, '') BEGIN
+            {decrement_sql.format(dimension, f"COALESCE(OLD.{dimension}, '')")}
+            {increment_sql.format(dimension, f"COALESCE(NEW.{dimension}, '')")}
+        END''')
+    for trigger in triggers:
+        conn.execute(trigger)
+    
+    if created:
+        rebuild_statistics(conn)
+        print("Created classification statistics")
+
+
+def rebuild_statistics(conn):
+    """Recount product_stats from scratch (first run or repair)"""
+    conn.execute("DELETE FROM product_stats")
+    conn.execute("INSERT INTO product_stats (dimension, value, product_count) SELECT 'total', '', COUNT(*) FROM products")
+    for dimension in STATS_DIMENSIONS:
+        conn.execute(f'''
+            INSERT INTO product_stats (dimension, value, product_count)
+            SELECT '{dimension}', COALESCE({dimension}, ''), COUNT(*) FROM products
+            GROUP BY COALESCE({dimension}, '')
+        ''')
+
+
+def read_statistics(conn):
+    """Return {'total': n, dimension: [(value, count), ...]} from product_stats"""
+    stats = {'total': 0}
+    for dimension in STATS_DIMENSIONS:
+        stats[dimension] = []
+    cursor = conn.execute('''
+        SELECT dimension, value, product_count FROM product_stats
+        WHERE product_count > 0 ORDER BY dimension, product_count DESC
+    ''')
+    for dimension, value, count in cursor.fetchall():
+        if dimension == 'total':
+            stats['total'] = count
+        elif dimension in stats:
+            stats[dimension].append((value, count))
+    return stats
+
+
+# ========== 全文搜索 ==========
+
+def fts5_available(conn):
+    """Check whether this SQLite build has the FTS5 extension"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def ensure_search_index(conn):
+    """Create the FTS5 index over product and part names and the triggers that keep it in sync
+    
+    The index row id is products.id. The trigram tokenizer indexes every
+    three-character substring, so a query matches anywhere inside a name;
+    Chinese names have no spaces between words, so word tokenizers cannot
+    find "饼干" in "乐天小熊饼干". Needs SQLite 3.34 or later.
+    """
+    if not fts5_available(conn):
+        print("SQLite FTS5 not available, product search falls back to LIKE")
+        return False
+    
+    created = not table_exists(conn, 'products_fts')
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                product_name, part_names,
+                tokenize = 'trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        print("SQLite trigram tokenizer not available, product search falls back to LIKE")
+        return False
+    
+    part_names_sql = "(SELECT group_concat(part_name, ' ') FROM product_parts WHERE product_id = {})"
+    
+    triggers = (
+        f'''CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, product_name, part_names)
+            VALUES (NEW.id, NEW.product_name, {part_names_sql.format('NEW.id')});
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF product_name ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = OLD.id;
+            INSERT INTO products_fts (rowid, product_name, part_names)
+            VALUES (NEW.id, NEW.product_name, {part_names_sql.format('NEW.id')});
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = OLD.id;
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS product_parts_fts_insert AFTER INSERT ON product_parts BEGIN
+            UPDATE products_fts SET part_names = {part_names_sql.format('NEW.product_id')}
+            WHERE rowid = NEW.product_id;
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS product_parts_fts_update AFTER UPDATE ON product_parts BEGIN
+            UPDATE products_fts SET part_names = {part_names_sql.format('OLD.product_id')}
+            WHERE rowid = OLD.product_id;
+            UPDATE products_fts SET part_names = {part_names_sql.format('NEW.product_id')}
+            WHERE rowid = NEW.product_id;
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS product_parts_fts_delete AFTER DELETE ON product_parts BEGIN
+            UPDATE products_fts SET part_names = {part_names_sql.format('OLD.product_id')}
+            WHERE rowid = OLD.product_id;
+        END'''
+    )
+    for trigger in triggers:
+        conn.execute(trigger)
+    
+    if created:
+        # 首次创建时为已有产品建立索引
+        conn.execute(f'''
+            INSERT INTO products_fts (rowid, product_name, part_names)
+            SELECT id, product_name, {part_names_sql.format('products.id')} FROM products
+        ''')
+        print("Created product search index")
+    return True
+
+
+# Shortest word the trigram index can look up; shorter words are matched with LIKE
+TRIGRAM_MIN_LENGTH = 3
+
+
+def build_match_query(tokens):
+    """Turn search words into an FTS5 substring query: ['pet', 'bot'] -> '"pet" "bot"'"""
+    return " ".join('"{}"'.format(token.replace('"', '""')) for token in tokens)
+
+
+def product_search_queries(text, use_fts=True, limit=200):
+    """(sql, params) pairs that search_products tries in order for text
+    
+    Digit-only input gets a barcode prefix query first. The name query uses
+    the trigram FTS index only when use_fts is set and every word is long
+    enough for it, otherwise LIKE.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    
+    columns = ", ".join(f"p.{column}" for column in PRODUCT_LIST_COLUMNS)
+    queries = []
+    
+    # 纯数字输入按条形码前缀查找（走gs1_code唯一索引的范围扫描）
+    if text.isdigit():
+        queries.append((f'''
+            SELECT {columns} FROM products p
+            WHERE p.gs1_code >= ? AND p.gs1_code < ?
+            ORDER BY p.gs1_code LIMIT ?
+        ''', (text, text[:-1] + chr(ord(text[-1]) + 1), limit)))
+    
+    tokens = re.findall(r'\w+', text)
+    if not tokens:
+        return queries
+    
+    if use_fts and min(len(token) for token in tokens) >= TRIGRAM_MIN_LENGTH:
+        # bm25: 产品名称命中的权重高于部件名称
+        queries.append((f'''
+            SELECT {columns} FROM products_fts
+            JOIN products p ON p.id = products_fts.rowid
+            WHERE products_fts MATCH ?
+            ORDER BY bm25(products_fts, 10.0, 1.0)
+            LIMIT ?
+        ''', (build_match_query(tokens), limit)))
+        return queries
+    
+    # 一两个字的词（中文里很常见）三元组索引查不到，用LIKE匹配产品名称和部件名称
+    conditions = []
+    params = []
+    for token in tokens:
+        conditions.append("(p.product_name LIKE ? OR EXISTS (SELECT 1 FROM product_parts pp "
+                          "WHERE pp.product_id = p.id AND pp.part_name LIKE ?))")
+        params.extend([f"%{token}%"] * 2)
+    queries.append((f'''
+        SELECT {columns} FROM products p
+        WHERE {" AND ".join(conditions)}
+        ORDER BY p.product_name LIKE ? DESC, p.created_at DESC LIMIT ?
+    ''', (*params, f"%{tokens[0]}%", limit)))
+    return queries
+
+
+def search_products(conn, text, limit=200):
+    """Search products by name, part name or barcode prefix, best matches first
+    
+    Returns rows in PRODUCT_LIST_COLUMNS order.
+    """
+    queries = product_search_queries(text, table_exists(conn, 'products_fts'), limit)
+    for i, (query, params) in enumerate(queries):
+        rows = conn.execute(query, params).fetchall()
+        # 条码前缀没有结果时再按名称查找
+        if rows or i == len(queries) - 1:
+            return rows
+    return []
+
+
+# ========== 扫描记录 ==========
+
+SCAN_EVENT_COLUMNS = ('scanned_at', 'lane', 'code', 'symbology', 'gtin14', 'outcome', 'latency_ms',
+                      'packaging_waste_type', 'product_waste_type')
+
+# Lookup outcomes stored in scan_events.outcome
+SCAN_OUTCOMES = ('found', 'found_previous', 'miss', 'not_searched')
+
+
+def ensure_scan_events(conn):
+    """Create the append-only scan_events table
+    
+    scanned_at is a unix timestamp. Triggers reject UPDATE and DELETE so the
+    log can only grow.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scan_events (
+            id INTEGER PRIMARY KEY,
+            scanned_at REAL NOT NULL,
+            lane TEXT,
+            code TEXT NOT NULL,
+            symbology TEXT,
+            gtin14 TEXT,
+            outcome TEXT NOT NULL,
+            latency_ms REAL,
+            packaging_waste_type TEXT,
+            product_waste_type TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_events_scanned_at ON scan_events (scanned_at)")
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS scan_events_no_update BEFORE UPDATE ON scan_events BEGIN
+            SELECT RAISE(ABORT, 'scan_events is append-only');
+        END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS scan_events_no_delete BEFORE DELETE ON scan_events BEGIN
+            SELECT RAISE(ABORT, 'scan_events is append-only');
+        END''')
+
+
+class ScanEventWriter:
+    """Background writer that appends scan events in batches
+    
+    log() only puts the event on a queue, so the scan path never waits on
+    disk. A worker thread with its own connection writes whatever has queued
+    up in one transaction, at most every FLUSH_INTERVAL seconds.
+    """
+    
+    BATCH_SIZE = 200
+    FLUSH_INTERVAL = 0.5
+    MAX_PENDING = 10000
+    
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.events = queue.Queue(maxsize=self.MAX_PENDING)
+        self.stopping = threading.Event()
+        self.dropped = 0
+        self.written = 0
+        self.thread = threading.Thread(target=self.writer_loop, daemon=True)
+        self.thread.start()
+    
+    def log(self, code, symbology=None, lane=None, outcome='not_searched', latency_ms=None,
+            packaging_waste_type=None, product_waste_type=None, scanned_at=None):
+        """Queue one scan event; never blocks"""
+        event = (scanned_at or time.time(), lane, code, symbology, normalize_gtin(code, symbology),
+                 outcome, latency_ms, packaging_waste_type, product_waste_type)
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+    
+    def close(self, timeout=5):
+        """Write the remaining events and stop the worker, waiting at most timeout seconds
+        
+        Signals with an event instead of queueing a sentinel, which would
+        block while the queue is full.
+        """
+        self.stopping.set()
+        self.thread.join(timeout=timeout)
+        if self.thread.is_alive():
+            print(f"Scan event writer did not finish within {timeout}s, {self.events.qsize()} events not written")
+    
+    def writer_loop(self):
+        """Worker thread: collect queued events into batches until close() and the queue is empty"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            while not (self.stopping.is_set() and self.events.empty()):
+                try:
+                    batch = [self.events.get(timeout=self.FLUSH_INTERVAL)]
+                except queue.Empty:
+                    continue
+                deadline = time.monotonic() + self.FLUSH_INTERVAL
+                while len(batch) < self.BATCH_SIZE:
+                    try:
+                        batch.append(self.events.get(timeout=max(deadline - time.monotonic(), 0)))
+                    except queue.Empty:
+                        break
+                self.write_batch(conn, batch)
+        finally:
+            conn.close()
+    
+    def write_batch(self, conn, batch):
+        """Insert one batch in a single transaction"""
+        placeholders = ", ".join("?" * len(SCAN_EVENT_COLUMNS))
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO scan_events ({', '.join(SCAN_EVENT_COLUMNS)}) VALUES ({placeholders})", batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            print(f"Writing scan events failed: {e}")
+
+
+# Shifts by local hour: 06-14 morning, 14-22 day, 22-06 night (counted on the day it started)
+SHIFT_NAMES = ('早班', '中班', '夜班')
+
+
+def read_scan_summary(conn, days=7):
+    """Scan counts, miss rate and lookup latency per lane and shift for the last days
+    
+    Returns rows of (shift_date, shift, lane, scans, misses, avg_latency_ms,
+    first_scan, last_scan), newest shift first.
+    """
+    cursor = conn.execute('''
+        SELECT date(scanned_at, 'unixepoch', 'localtime', '-6 hours') AS shift_date,
+               CAST(strftime('%H', scanned_at, 'unixepoch', 'localtime', '-6 hours') AS INTEGER) / 8 AS shift,
+               COALESCE(lane, '') AS lane,
+               COUNT(*),
+               SUM(outcome = 'miss'),
+               AVG(latency_ms),
+               MIN(scanned_at),
+               MAX(scanned_at)
+        FROM scan_events
+        WHERE scanned_at >= ?
+        GROUP BY shift_date, shift, lane
+        ORDER BY shift_date DESC, shift DESC, lane
+    ''', (time.time() - days * 86400,))
+    return [(shift_date, SHIFT_NAMES[shift], *rest) for shift_date, shift, *rest in cursor.fetchall()]
@@ -16,15 +16,17 @@ import time
 import os
 import sqlite3
 from datetime import datetime
-import requests
 import base64
 import json
 import sys
 import argparse
+from product_database import upgrade_database, search_products, load_product_with_parts, format_part_disposal, normalize_gtin, ChangeFeed, PRODUCT_LIST_COLUMNS
+from photo_store import save_photo
+from ocr_service import OcrCache, perceptual_hash, preprocess_image_for_ocr, create_ocr_backend, OCR_BACKENDS
 
 
 class ProductManager:
-    def __init__(self, prefill_gs1_code=None):
+    def __init__(self, prefill_gs1_code=None, prefill_symbology=None, ocr_backend=None):
         self.root = tk.Tk()
         self.root.title("Product Management System")
         self.root.geometry("800x600")
@@ -32,6 +34,10 @@ class ProductManager:
         
         # Store prefill GS1 code
         self.prefill_gs1_code = prefill_gs1_code
+        self.prefill_symbology = prefill_symbology
+        
+        # OCR backend name for new product windows (None: OCR_BACKEND environment variable)
+        self.ocr_backend = ocr_backend
         
         # Database initialization
         self.init_database()
@@ -80,6 +86,9 @@ class ProductManager:
                 print("Added plastic type column")
             
             self.conn.commit()
+            
+            # Search index, helper tables and triggers
+            upgrade_database(self.conn)
             print("Database initialization successful")
             
         except Exception as e:
@@ -128,7 +137,8 @@ class ProductManager:
         """Open create new product window"""
         try:
             # Create new product window
-            product_window = CreateProductWindow(self.root, self.conn, self.prefill_gs1_code)
+            product_window = CreateProductWindow(self.root, self.conn, self.prefill_gs1_code, self.prefill_symbology,
+                                                 self.ocr_backend)
             product_window.run()
         except Exception as e:
             print(f"Failed to open create product window: {e}")
@@ -163,11 +173,28 @@ class ProductManager:
             print(f"Close program error: {e}")
 
 
+class OcrJob:
+    """One background capture -> encode -> OCR job of CreateProductWindow"""
+    
+    def __init__(self, job_id, frame, save_photo):
+        self.job_id = job_id
+        self.frame = frame
+        self.save_photo = save_photo  # False when re-running OCR on a photo that is already saved
+        self.image_path = ""
+        self.name_before = ""
+        self.cancelled = threading.Event()
+        self.photo_saved = threading.Event()
+
+
 class CreateProductWindow:
-    def __init__(self, parent, conn, prefill_gs1_code=None):
+    # Progress steps of an OCR job
+    OCR_STEPS = ("Saving photo...", "Preparing image...", "Recognizing text...")
+    
+    def __init__(self, parent, conn, prefill_gs1_code=None, prefill_symbology=None, ocr_backend=None):
         self.parent = parent
         self.conn = conn
         self.prefill_gs1_code = prefill_gs1_code
+        self.prefill_symbology = prefill_symbology
         self.window = tk.Toplevel(parent)
         self.window.title("Create New Product")
         
@@ -194,10 +221,16 @@ class CreateProductWindow:
         
         # Product data
         self.barcode = ""
+        self.barcode_type = None
         self.product_name = ""
         self.image_path = ""
         self.captured_image = None
         
+        # Background OCR jobs: the running OCR job and the job saving the latest photo
+        self.ocr_job = None
+        self.photo_job = None
+        self.ocr_job_id = 0
+        
         # Waste classification selection
         self.packaging_waste_type = tk.StringVar(value="")
         self.product_waste_type = tk.StringVar(value="")
@@ -211,18 +244,21 @@ class CreateProductWindow:
         self.is_running = False
         self.current_frame = None
         
-        # Baidu OCR configuration
-        self.baidu_ocr_config = {
-            'api_key': 'eJAk0i6aKQbGabIk9UPrcxcR',
-            'secret_key': 'PTYD5yhAJIsHeWL6SRswQkHRT37kk2AG',
-            'access_token': ''
-        }
+        # OCR backend (baidu / tesseract / local, see ocr_service.py)
+        self.ocr_backend = create_ocr_backend(ocr_backend)
+        
+        # OCR results cached by perceptual hash, so retakes skip the API call
+        try:
+            self.ocr_cache = OcrCache()
+        except Exception as e:
+            print(f"Failed to open OCR cache: {e}")
+            self.ocr_cache = None
         
-        # Automatically get access token
+        # Start the background token refresh; never blocks window creation
         try:
-            self.get_baidu_access_token()
+            self.ocr_backend.prepare()
         except Exception as e:
-            print(f"Failed to get Baidu OCR access token: {e}")
+            print(f"Failed to prepare OCR backend '{self.ocr_backend.name}': {e}")
         
         # Create interface
         self.create_interface()
@@ -311,6 +347,7 @@ class CreateProductWindow:
         # 如果有预填的GS1代码，设置barcode变量
         if self.prefill_gs1_code:
             self.barcode = self.prefill_gs1_code
+            self.barcode_type = self.prefill_symbology
         
         # Product name area
         name_frame = tk.Frame(scrollable_frame, bg='white')
@@ -332,6 +369,21 @@ class CreateProductWindow:
                            command=self.ocr_product_name)
         ocr_btn.pack(pady=5)
         
+        # OCR job progress (shown while a background OCR job runs)
+        self.ocr_job_frame = tk.Frame(name_frame, bg='white')
+        self.ocr_progress = ttk.Progressbar(self.ocr_job_frame, mode='determinate',
+                                           maximum=len(self.OCR_STEPS))
+        self.ocr_progress.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.ocr_cancel_btn = tk.Button(self.ocr_job_frame, text="Cancel OCR", 
+                                       font=('Arial', 9),
+                                       relief=tk.RAISED, bd=1,
+                                       padx=5,
+                                       command=self.cancel_ocr_job)
+        self.ocr_cancel_btn.pack(side=tk.LEFT, padx=(5, 0))
+        self.ocr_progress_label = tk.Label(self.ocr_job_frame, text="", 
+                                          font=('Arial', 9), bg='white', fg='#666666')
+        self.ocr_progress_label.pack(side=tk.LEFT, padx=(5, 0))
+        
         # Product photo area
         photo_frame = tk.Frame(scrollable_frame, bg='white')
         photo_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -661,6 +713,7 @@ class CreateProductWindow:
                     # 更新条形码显示
                     if barcode_data != self.barcode:
                         self.barcode = barcode_data
+                        self.barcode_type = barcode_type
                         self.barcode_label.config(text=barcode_data, fg='#333333')
                         self.status_label.config(text=f"Status: Recognized barcode - {barcode_data}")
                         
@@ -722,19 +775,9 @@ class CreateProductWindow:
                 messagebox.showwarning("Warning", "Please start camera first")
                 return
             
-            # 保存照片
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"product_photo_{timestamp}.jpg"
-            
-            # 创建photos目录
-            if not os.path.exists("photos"):
-                os.makedirs("photos")
-            
-            self.image_path = os.path.join("photos", filename)
-            cv2.imwrite(self.image_path, self.current_frame)
-            
             # 保存当前帧用于显示
             self.captured_image = self.current_frame.copy()
+            self.image_path = ""
             
             # 显示照片
             self.display_captured_photo()
@@ -742,8 +785,8 @@ class CreateProductWindow:
             # Update status
             self.status_label.config(text=f"Status: Photo taken, recognizing text...")
             
-            # 直接开始OCR识别
-            self.ocr_product_name()
+            # 照片编码保存和OCR识别在后台进行，界面不等待
+            self.start_ocr_job(self.captured_image, save_photo=True)
             
         except Exception as e:
             print(f"拍照错误: {e}")
@@ -788,180 +831,137 @@ class CreateProductWindow:
             print(f"显示照片错误: {e}")
             self.photo_label.config(text="Photo display failed", fg='#ff0000')
     
-    def get_baidu_access_token(self):
-        """Get Baidu OCR access token"""
-        try:
-            # 如果token还有效，直接返回
-            if (self.baidu_ocr_config.get('access_token') and 
-                self.baidu_ocr_config.get('token_expire_time', 0) > time.time()):
-                return self.baidu_ocr_config['access_token']
-            
-            url = "https://aip.baidubce.com/oauth/2.0/token"
-            params = {
-                'grant_type': 'client_credentials',
-                'client_id': self.baidu_ocr_config['api_key'],
-                'client_secret': self.baidu_ocr_config['secret_key']
-            }
-            
-            response = requests.post(url, params=params, timeout=10)
-            result = response.json()
-            
-            if 'access_token' in result:
-                self.baidu_ocr_config['access_token'] = result['access_token']
-                # 设置过期时间（提前5分钟刷新）
-                self.baidu_ocr_config['token_expire_time'] = time.time() + result.get('expires_in', 3600) - 300
-                print("Baidu OCR access token obtained successfully")
-                return self.baidu_ocr_config['access_token']
-            else:
-                raise Exception(f"获取访问令牌失败: {result}")
-                
-        except Exception as e:
-            print(f"Error getting Baidu OCR access token: {e}")
-            raise e
-    
     def ocr_product_name(self):
         """OCR recognize product name"""
         try:
-            if not self.image_path or not os.path.exists(self.image_path):
+            if self.captured_image is None:
                 messagebox.showwarning("Warning", "Please take a photo first")
                 return
             
-            # 获取访问令牌
-            try:
-                access_token = self.get_baidu_access_token()
-            except Exception as e:
-                messagebox.showerror("Error", f"Baidu OCR service unavailable: {e}")
-                return
-            
-            # 读取图片
-            img = cv2.imread(self.image_path)
-            if img is None:
-                messagebox.showerror("Error", "Unable to read image file")
-                return
-            
-            # 预处理图片以提高识别效果
-            processed_img = self.preprocess_image_for_ocr_cv2(img)
-            
-            # 使用百度OCR进行文字识别
-            recognized_text = self.recognize_text_with_baidu(processed_img, access_token)
-            
-            if recognized_text and recognized_text.strip():
-                # 更新产品名称输入框
-                self.name_entry.delete(0, tk.END)
-                self.name_entry.insert(0, recognized_text.strip())
-                self.status_label.config(text="Status: OCR recognition completed")
-                messagebox.showinfo("Success", f"Recognized text: {recognized_text.strip()}")
-            else:
-                self.status_label.config(text="Status: No valid text recognized")
-                messagebox.showinfo("Info", "No valid text recognized")
+            # 照片已经保存过，只重新识别
+            self.start_ocr_job(self.captured_image, save_photo=False)
                 
         except Exception as e:
             print(f"OCR识别错误: {e}")
             messagebox.showerror("Error", f"OCR recognition failed: {e}")
     
-    def preprocess_image_for_ocr_cv2(self, img):
-        """Preprocess image to improve OCR recognition"""
+    def start_ocr_job(self, frame, save_photo):
+        """Start a background encode -> OCR job, replacing any running one"""
+        if self.ocr_job:
+            self.ocr_job.cancelled.set()
+        
+        self.ocr_job_id += 1
+        job = OcrJob(self.ocr_job_id, frame, save_photo)
+        job.name_before = self.name_entry.get()
+        self.ocr_job = job
+        if save_photo:
+            self.photo_job = job
+        
+        self.ocr_progress['value'] = 0
+        self.ocr_progress_label.config(text=self.OCR_STEPS[0] if save_photo else self.OCR_STEPS[1])
+        self.ocr_job_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        threading.Thread(target=self.run_ocr_job, args=(job,), daemon=True).start()
+    
+    def run_ocr_job(self, job):
+        """Worker thread: save the photo, then preprocess and recognize it"""
         try:
-            # 左右翻转图片
-            flipped_img = cv2.flip(img, 1)  # 1表示水平翻转
-            
-            # 转换为灰度图
-            if len(flipped_img.shape) == 3:
-                gray = cv2.cvtColor(flipped_img, cv2.COLOR_BGR2GRAY)
+            if job.save_photo:
+                self.report_ocr_progress(job, 0)
+                job.image_path = save_photo(job.frame)
+                job.photo_saved.set()
+                self.window.after(0, self.on_photo_saved, job)
             else:
-                gray = flipped_img
+                job.photo_saved.set()
             
-            # 增强对比度
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(gray)
-            
-            # 去噪
-            denoised = cv2.medianBlur(enhanced, 3)
-            
-            # 二值化
-            _, binary = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            if job.cancelled.is_set():
+                return
+            self.report_ocr_progress(job, 1)
+            processed_img = self.preprocess_image_for_ocr_cv2(job.frame)
+            
+            # 几乎相同的照片（重拍）直接使用缓存的识别结果
+            phash = perceptual_hash(processed_img)
+            cached_text = self.ocr_cache.lookup(self.ocr_backend.name, phash) if self.ocr_cache else None
+            if cached_text is not None:
+                if not job.cancelled.is_set():
+                    self.window.after(0, self.finish_ocr_job, job, cached_text, None, True)
+                return
             
-            print("图片已进行左右翻转处理")
-            return binary
+            if job.cancelled.is_set():
+                return
+            self.report_ocr_progress(job, 2)
+            recognized_text = self.ocr_backend.recognize(processed_img)
+            if self.ocr_cache and self.ocr_backend.cache_results:
+                self.ocr_cache.store(self.ocr_backend.name, phash, recognized_text)
             
+            if not job.cancelled.is_set():
+                self.window.after(0, self.finish_ocr_job, job, recognized_text, None)
         except Exception as e:
-            print(f"图片预处理错误: {e}")
-            return img  # 如果预处理失败，返回原图
+            job.photo_saved.set()
+            print(f"OCR识别错误: {e}")
+            try:
+                self.window.after(0, self.finish_ocr_job, job, None, e)
+            except Exception:
+                pass  # 窗口已关闭
     
-    def recognize_text_with_baidu(self, img, access_token):
-        """Use Baidu OCR to recognize text"""
+    def report_ocr_progress(self, job, step):
+        """Post job progress to the Tk thread"""
         try:
-            # 将图像转换为base64
-            base64_image = self.image_to_base64(img)
-            
-            # 构建请求URL - 使用accurate_basic接口提高精度
-            url = f"https://aip.baidubce.com/rest/2.0/ocr/v1/accurate_basic?access_token={access_token}"
-            
-            # 构建请求参数
-            payload = {
-                'image': base64_image,
-                'detect_direction': 'false',
-                'paragraph': 'true',
-                'probability': 'false',
-                'multidirectional_recognize': 'false'
-            }
-            
-            headers = {
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'Accept': 'application/json'
-            }
-            
-            print(f"发送OCR请求，图片大小: {len(base64_image)} chars")
-            
-            # 发送请求
-            response = requests.post(url, headers=headers, data=payload, timeout=30)
-            response.raise_for_status()
-            
-            # 解析响应
-            result = response.json()
-            
-            print(f"OCR识别响应: {result}")
-            
-            if 'error_code' in result:
-                raise Exception(f"OCR识别失败: {result.get('error_msg', '未知错误')}")
-            
-            # 提取文字内容
-            texts = []
-            if 'words_result' in result:
-                for item in result['words_result']:
-                    if 'words' in item:
-                        texts.append(item['words'])
-            
-            # 合并所有文字
-            recognized_text = " ".join(texts)
-            
-            return recognized_text
-            
-        except Exception as e:
-            print(f"百度OCR识别错误: {e}")
-            raise e
+            self.window.after(0, self.update_ocr_progress, job, step)
+        except Exception:
+            pass  # 窗口已关闭
+    
+    def update_ocr_progress(self, job, step):
+        """Show job progress (called in main thread)"""
+        if job is not self.ocr_job or job.cancelled.is_set():
+            return
+        self.ocr_progress['value'] = step
+        self.ocr_progress_label.config(text=self.OCR_STEPS[step])
+    
+    def on_photo_saved(self, job):
+        """Remember the stored photo path (called in main thread)"""
+        if job is self.photo_job and job.image_path:
+            self.image_path = job.image_path
     
-    def image_to_base64(self, image):
-        """Convert OpenCV image to base64 encoding"""
+    def finish_ocr_job(self, job, recognized_text, error, from_cache=False):
+        """Fill in the product name from the OCR result (called in main thread)"""
         try:
-            # 将BGR转换为RGB
-            if len(image.shape) == 3:
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            else:
-                image_rgb = image
+            if job is not self.ocr_job or job.cancelled.is_set():
+                return
+            self.ocr_job = None
+            self.ocr_job_frame.pack_forget()
             
-            # 编码为JPEG格式
-            success, encoded_image = cv2.imencode('.jpg', image_rgb)
-            if not success:
-                raise Exception("图像编码失败")
+            if error:
+                self.status_label.config(text=f"Status: OCR recognition failed: {error}")
+                return
             
-            # 转换为base64
-            base64_image = base64.b64encode(encoded_image).decode('utf-8')
-            return base64_image
+            recognized_text = (recognized_text or "").strip()
+            if not recognized_text:
+                self.status_label.config(text="Status: No valid text recognized")
+                return
             
+            # 用户在识别期间已修改名称时不覆盖
+            if self.name_entry.get() == job.name_before:
+                self.name_entry.delete(0, tk.END)
+                self.name_entry.insert(0, recognized_text)
+                source = "from cache" if from_cache else "completed"
+                self.status_label.config(text=f"Status: OCR recognition {source}: {recognized_text}")
+            else:
+                self.status_label.config(text=f"Status: Recognized text (name not replaced): {recognized_text}")
         except Exception as e:
-            print(f"图像编码错误: {e}")
-            raise e
+            print(f"OCR结果处理错误: {e}")
+    
+    def cancel_ocr_job(self):
+        """Cancel the running OCR job; the photo is still saved"""
+        if self.ocr_job:
+            self.ocr_job.cancelled.set()
+            self.ocr_job = None
+        self.ocr_job_frame.pack_forget()
+        self.status_label.config(text="Status: OCR cancelled")
+    
+    def preprocess_image_for_ocr_cv2(self, img):
+        """Preprocess image to improve OCR recognition"""
+        return preprocess_image_for_ocr(img)
     
     def select_waste_type(self, category, waste_type):
         """Select waste classification"""
@@ -1144,12 +1144,19 @@ class CreateProductWindow:
                 packaging_material = ""
                 plastic_type = ""
             
+            # 照片还在后台编码保存时等它完成（通常只需几十毫秒）
+            if self.photo_job and self.photo_job.photo_saved.wait(timeout=5):
+                self.image_path = self.photo_job.image_path or self.image_path
+            
+            # 规范化为GTIN-14，同一商品的不同码制变体对应同一条记录
+            gtin14 = normalize_gtin(self.barcode, self.barcode_type)
+            
             # 保存到数据库
             cursor = self.conn.cursor()
             cursor.execute('''
-                INSERT INTO products (gs1_code, product_name, product_image, packaging_waste_type, product_waste_type, packaging_material, plastic_type)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (self.barcode, product_name, self.image_path, packaging_waste_type, product_waste_type, packaging_material, plastic_type))
+                INSERT INTO products (gs1_code, gtin14, product_name, product_image, packaging_waste_type, product_waste_type, packaging_material, plastic_type)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (self.barcode, gtin14, product_name, self.image_path, packaging_waste_type, product_waste_type, packaging_material, plastic_type))
             
             self.conn.commit()
             
@@ -1177,6 +1184,11 @@ class CreateProductWindow:
         """Close window"""
         try:
             self.is_running = False
+            if self.ocr_job:
+                self.ocr_job.cancelled.set()
+            if self.ocr_cache:
+                stats = self.ocr_cache.stats()
+                print(f"OCR缓存命中率: {stats['hit_rate'] * 100:.1f}%, 节省API调用: {stats['api_calls_saved']}")
             if self.cap:
                 self.cap.release()
             self.window.destroy()
@@ -1190,6 +1202,28 @@ class CreateProductWindow:
 
 
 class ProductsListWindow:
+    # Treeview columns and the database fields behind the editable ones
+    COLUMN_NAMES = ['gs1_code', 'name', 'packaging_waste', 'packaging_material', 'plastic_type', 'product_waste', 'created_at']
+    EDITABLE_FIELDS = {
+        'name': 'product_name',
+        'packaging_waste': 'packaging_waste_type',
+        'packaging_material': 'packaging_material',
+        'plastic_type': 'plastic_type',
+        'product_waste': 'product_waste_type'
+    }
+    FIELD_LABELS = {
+        'name': 'Product Name',
+        'packaging_waste': 'Packaging Classification',
+        'packaging_material': 'Packaging Material',
+        'plastic_type': 'Plastic Type',
+        'product_waste': 'Product Classification'
+    }
+    WASTE_OPTIONS = ["", "Recyclable", "Hazardous", "Wet Waste", "Other Waste"]
+    MATERIAL_OPTIONS = ["", "Paper", "Plastic", "Metal", "Glass"]
+    MAX_UNDO_STEPS = 20
+    # SQLite limits the number of bound parameters per statement
+    SQL_CHUNK_SIZE = 500
+    
     def __init__(self, parent, conn):
         self.parent = parent
         self.conn = conn
@@ -1203,8 +1237,24 @@ class ProductsListWindow:
         self.editing_column = None
         self.edit_widget = None
         
+        # Pending single-cell edits are grouped into one commit
+        self.commit_job = None
+        
+        # Undo log: each entry holds the previous values of one batch operation
+        self.undo_stack = []
+        
+        # Search-as-you-type state
+        self.search_job = None
+        
+        # List row of each shown product (gs1_code -> tree item)
+        self.tree_items = {}
+        
         self.create_interface()
         self.load_products()
+        
+        # Watch for products changed by other windows or the scanner
+        self.change_feed = ChangeFeed(self.conn)
+        self.change_poll_job = self.window.after(1000, self.poll_product_changes)
     
     def create_interface(self):
         """Create interface"""
@@ -1214,8 +1264,26 @@ class ProductsListWindow:
                               bg='#f0f0f0', fg='#333333')
         title_label.pack(pady=(10, 5))
         
+        # Search box
+        search_frame = tk.Frame(self.window, bg='#f0f0f0')
+        search_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        
+        tk.Label(search_frame, text="Search:", 
+                font=('Arial', 10, 'bold'), bg='#f0f0f0').pack(side=tk.LEFT)
+        
+        self.search_var = tk.StringVar()
+        self.search_entry = tk.Entry(search_frame, textvariable=self.search_var,
+                                    font=('Arial', 10), relief=tk.SUNKEN, bd=1)
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 5))
+        self.search_entry.bind('<KeyRelease>', self.on_search_key)
+        self.search_entry.bind('<Escape>', lambda e: self.clear_search())
+        
+        self.search_info_label = tk.Label(search_frame, text="Name, part name or barcode prefix", 
+                                         font=('Arial', 9), bg='#f0f0f0', fg='#666666')
+        self.search_info_label.pack(side=tk.LEFT)
+        
         # Products list
-        self.tree = ttk.Treeview(self.window, columns=('gs1_code', 'name', 'packaging_waste', 'packaging_material', 'plastic_type', 'product_waste', 'created_at'), show='headings')
+        self.tree = ttk.Treeview(self.window, columns=tuple(self.COLUMN_NAMES), show='headings', selectmode='extended')
         self.tree.heading('gs1_code', text='Barcode')
         self.tree.heading('name', text='Product Name')
         self.tree.heading('packaging_waste', text='Packaging Classification')
@@ -1249,6 +1317,12 @@ class ProductsListWindow:
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Parts of the selected product with disposal instructions
+        self.parts_label = tk.Label(self.window, text="", 
+                                   font=('Arial', 9), bg='#f0f0f0', fg='#333333',
+                                   justify=tk.LEFT, anchor='w')
+        self.parts_label.pack(fill=tk.X, padx=10)
+        
         # 底部操作区域（灵活布局）
         bottom_frame = tk.Frame(self.window, bg='#f0f0f0')
         bottom_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
@@ -1273,7 +1347,26 @@ class ProductsListWindow:
                                    padx=12, pady=6,
                                    command=self.delete_selected_product,
                                    state=tk.DISABLED)
-        self.delete_btn.pack(side=tk.LEFT, padx=(0, 15))
+        self.delete_btn.pack(side=tk.LEFT, padx=(0, 8))
+        
+        self.bulk_edit_btn = tk.Button(button_frame, text="Bulk Edit", 
+                                      font=('Arial', 10),
+                                      bg='#9C27B0', fg='white',
+                                      relief=tk.RAISED, bd=1,
+                                      padx=12, pady=6,
+                                      command=self.open_bulk_edit_dialog,
+                                      state=tk.DISABLED)
+        self.bulk_edit_btn.pack(side=tk.LEFT, padx=(0, 8))
+        
+        self.undo_btn = tk.Button(button_frame, text="Undo", 
+                                 font=('Arial', 10),
+                                 bg='#607D8B', fg='white',
+                                 relief=tk.RAISED, bd=1,
+                                 padx=12, pady=6,
+                                 command=self.undo_last_change,
+                                 state=tk.DISABLED)
+        self.undo_btn.pack(side=tk.LEFT, padx=(0, 15))
+        self.window.bind('<Control-z>', lambda e: self.undo_last_change())
         
         # Status information
         self.status_label = tk.Label(bottom_frame, text="Please select product", 
@@ -1293,27 +1386,75 @@ class ProductsListWindow:
     def load_products(self):
         """Load products list"""
         try:
+            # 有搜索条件时只显示搜索结果
+            if self.search_var.get().strip():
+                self.run_search()
+                return
+            
             cursor = self.conn.cursor()
             cursor.execute('SELECT gs1_code, product_name, packaging_waste_type, packaging_material, plastic_type, product_waste_type, created_at FROM products ORDER BY created_at DESC')
             products = cursor.fetchall()
-            
-            for product in products:
-                # Handle empty values, display as "Unclassified" or empty string
-                processed_product = list(product)
-                if not processed_product[2]:  # packaging_waste_type
-                    processed_product[2] = "Unclassified"
-                if not processed_product[3]:  # packaging_material
-                    processed_product[3] = ""
-                if not processed_product[4]:  # plastic_type
-                    processed_product[4] = ""
-                if not processed_product[5]:  # product_waste_type
-                    processed_product[5] = "Unclassified"
-                self.tree.insert('', 'end', values=processed_product)
+            self.insert_product_rows(products)
                 
         except Exception as e:
             print(f"加载产品列表错误: {e}")
             messagebox.showerror("Error", f"Failed to load products list: {e}")
     
+    def insert_product_rows(self, products):
+        """Insert product rows into the list"""
+        for product in products:
+            # Handle empty values, display as "Unclassified" or empty string
+            processed_product = list(product)
+            if not processed_product[2]:  # packaging_waste_type
+                processed_product[2] = "Unclassified"
+            if not processed_product[3]:  # packaging_material
+                processed_product[3] = ""
+            if not processed_product[4]:  # plastic_type
+                processed_product[4] = ""
+            if not processed_product[5]:  # product_waste_type
+                processed_product[5] = "Unclassified"
+            self.tree_items[product[0]] = self.tree.insert('', 'end', values=processed_product)
+    
+    def clear_product_rows(self):
+        """Remove all rows from the list"""
+        self.tree.delete(*self.tree.get_children())
+        self.tree_items.clear()
+    
+    def on_search_key(self, event):
+        """Debounce keystrokes so only the latest search text is queried"""
+        if self.search_job is not None:
+            self.window.after_cancel(self.search_job)
+        self.search_job = self.window.after(120, self.run_search)
+    
+    def run_search(self):
+        """Show products matching the search box (ranked full-text search)"""
+        try:
+            self.search_job = None
+            text = self.search_var.get().strip()
+            
+            self.clear_product_rows()
+            
+            if not text:
+                self.search_info_label.config(text="Name, part name or barcode prefix")
+                self.load_products()
+                return
+            
+            start_time = time.perf_counter()
+            products = search_products(self.conn, text)
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            
+            self.insert_product_rows(products)
+            self.search_info_label.config(text=f"{len(products)} results ({elapsed_ms:.1f} ms)")
+        
+        except Exception as e:
+            print(f"搜索产品错误: {e}")
+            self.search_info_label.config(text="Search failed")
+    
+    def clear_search(self):
+        """Clear the search box and show all products"""
+        self.search_var.set("")
+        self.run_search()
+    
     def on_item_select(self, event):
         """Handle product selection event"""
         try:
@@ -1321,14 +1462,81 @@ class ProductsListWindow:
             if selected_items:
                 self.edit_btn.config(state=tk.NORMAL)
                 self.delete_btn.config(state=tk.NORMAL)
+                self.bulk_edit_btn.config(state=tk.NORMAL)
                 self.status_label.config(text=f"Selected {len(selected_items)} products")
             else:
                 self.edit_btn.config(state=tk.DISABLED)
                 self.delete_btn.config(state=tk.DISABLED)
+                self.bulk_edit_btn.config(state=tk.DISABLED)
                 self.status_label.config(text="Please select product")
+            
+            # Show parts of a single selected product
+            if len(selected_items) == 1:
+                self.show_product_parts(self.tree.item(selected_items[0], 'values')[0])
+            else:
+                self.parts_label.config(text="")
         except Exception as e:
             print(f"选择事件处理错误: {e}")
     
+    def poll_product_changes(self):
+        """Apply product changes made elsewhere to the affected rows only"""
+        try:
+            changes = self.change_feed.poll()
+            if changes:
+                self.apply_product_changes([gs1_code for product_id, gs1_code, operation in changes if gs1_code])
+        except Exception as e:
+            print(f"轮询产品变更错误: {e}")
+        finally:
+            if self.window.winfo_exists():
+                self.change_poll_job = self.window.after(1000, self.poll_product_changes)
+    
+    def apply_product_changes(self, barcodes):
+        """Update, insert or remove the rows of changed products, read in chunks"""
+        # 正在编辑的行不刷新，避免覆盖编辑控件
+        if self.editing_item:
+            editing_barcode = self.tree.item(self.editing_item, 'values')[0]
+            barcodes = [barcode for barcode in barcodes if barcode != editing_barcode]
+        
+        rows = {}
+        columns = ", ".join(PRODUCT_LIST_COLUMNS)
+        for i in range(0, len(barcodes), self.SQL_CHUNK_SIZE):
+            chunk = barcodes[i:i + self.SQL_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            for row in self.conn.execute(f"SELECT {columns} FROM products WHERE gs1_code IN ({placeholders})", chunk):
+                rows[row[0]] = row
+        
+        searching = bool(self.search_var.get().strip())
+        for barcode in barcodes:
+            item = self.tree_items.get(barcode)
+            row = rows.get(barcode)
+            if row is None:
+                # 已删除的产品
+                if item:
+                    self.tree.delete(item)
+                    del self.tree_items[barcode]
+                continue
+            
+            values = [self.display_value(column, value) for column, value in zip(self.COLUMN_NAMES, row)]
+            if item:
+                self.tree.item(item, values=values)
+            elif not searching:
+                # 新产品按创建时间倒序显示在最前面
+                self.tree_items[barcode] = self.tree.insert('', 0, values=values)
+    
+    def show_product_parts(self, barcode):
+        """Show parts and per-part disposal instructions of a product"""
+        try:
+            product, parts = load_product_with_parts(self.conn, barcode)
+            if parts:
+                self.parts_label.config(text="Parts: " + "  |  ".join(format_part_disposal(part) for part in parts))
+            elif product:
+                self.parts_label.config(text="Parts: none recorded")
+            else:
+                self.parts_label.config(text="")
+        except Exception as e:
+            print(f"加载产品部件错误: {e}")
+            self.parts_label.config(text="")
+    
     def on_item_double_click(self, event):
         """Handle double-click event, edit product directly"""
         try:
@@ -1354,12 +1562,11 @@ class ProductsListWindow:
             
             # 获取列名
             column_index = int(column.replace('#', '')) - 1
-            column_names = ['gs1_code', 'name', 'packaging_waste', 'packaging_material', 'plastic_type', 'product_waste', 'created_at']
             
-            if column_index >= len(column_names):
+            if column_index >= len(self.COLUMN_NAMES):
                 return
             
-            column_name = column_names[column_index]
+            column_name = self.COLUMN_NAMES[column_index]
             
             # Barcode and creation time are not editable
             if column_name in ['gs1_code', 'created_at']:
@@ -1376,7 +1583,7 @@ class ProductsListWindow:
         try:
             # 获取当前值
             values = self.tree.item(item, 'values')
-            column_index = ['gs1_code', 'name', 'packaging_waste', 'packaging_material', 'plastic_type', 'product_waste', 'created_at'].index(column_name)
+            column_index = self.COLUMN_NAMES.index(column_name)
             current_value = values[column_index] if column_index < len(values) else ""
             
             # 获取单元格位置
@@ -1390,9 +1597,9 @@ class ProductsListWindow:
                 self.edit_widget = ttk.Combobox(self.tree, state="readonly")
                 
                 if column_name == 'packaging_waste' or column_name == 'product_waste':
-                    options = ["", "Recyclable", "Hazardous", "Wet Waste", "Other Waste"]
+                    options = self.WASTE_OPTIONS
                 elif column_name == 'packaging_material':
-                    options = ["", "Paper", "Plastic", "Metal", "Glass"]
+                    options = self.MATERIAL_OPTIONS
                 
                 self.edit_widget['values'] = options
                 self.edit_widget.set(current_value)
@@ -1429,28 +1636,30 @@ class ProductsListWindow:
             
             # 获取产品数据
             values = list(self.tree.item(self.editing_item, 'values'))
-            column_index = ['gs1_code', 'name', 'packaging_waste', 'packaging_material', 'plastic_type', 'product_waste', 'created_at'].index(self.editing_column)
+            column_index = self.COLUMN_NAMES.index(self.editing_column)
+            field = self.EDITABLE_FIELDS[self.editing_column]
+            barcode = values[0]  # 条形码作为主键
+            
+            # 记录旧值用于撤销
+            old_values = self.fetch_field_values(field, [barcode])
+            if old_values.get(barcode) == new_value:
+                self.cancel_edit()
+                return
             
             # 更新显示
             values[column_index] = new_value
             self.tree.item(self.editing_item, values=values)
             
-            # 更新数据库
-            barcode = values[0]  # 条形码作为主键
-            
+            # 更新数据库（提交延迟合并，连续编辑只触发一次提交）
             cursor = self.conn.cursor()
-            if self.editing_column == 'name':
-                cursor.execute("UPDATE products SET product_name = ? WHERE gs1_code = ?", (new_value, barcode))
-            elif self.editing_column == 'packaging_waste':
-                cursor.execute("UPDATE products SET packaging_waste_type = ? WHERE gs1_code = ?", (new_value, barcode))
-            elif self.editing_column == 'packaging_material':
-                cursor.execute("UPDATE products SET packaging_material = ? WHERE gs1_code = ?", (new_value, barcode))
-            elif self.editing_column == 'plastic_type':
-                cursor.execute("UPDATE products SET plastic_type = ? WHERE gs1_code = ?", (new_value, barcode))
-            elif self.editing_column == 'product_waste':
-                cursor.execute("UPDATE products SET product_waste_type = ? WHERE gs1_code = ?", (new_value, barcode))
+            cursor.execute(f"UPDATE products SET {field} = ?, updated_at = CURRENT_TIMESTAMP WHERE gs1_code = ?", (new_value, barcode))
+            self.schedule_commit()
             
-            self.conn.commit()
+            self.push_undo({
+                'description': f"edit {self.FIELD_LABELS[self.editing_column]} of {barcode}",
+                'field': field,
+                'old_values': old_values
+            })
             
             # 清理编辑状态
             self.cancel_edit()
@@ -1459,6 +1668,193 @@ class ProductsListWindow:
             print(f"保存编辑错误: {e}")
             self.cancel_edit()
     
+    def schedule_commit(self):
+        """Group pending single-cell edits into one commit"""
+        if self.commit_job is None:
+            self.commit_job = self.window.after(500, self.flush_pending_edits)
+    
+    def flush_pending_edits(self):
+        """Commit pending single-cell edits"""
+        try:
+            if self.commit_job is not None:
+                self.window.after_cancel(self.commit_job)
+                self.commit_job = None
+            self.conn.commit()
+        except Exception as e:
+            print(f"提交编辑错误: {e}")
+    
+    def fetch_field_values(self, field, barcodes):
+        """Return {gs1_code: value} for the given products, read in chunks"""
+        values = {}
+        cursor = self.conn.cursor()
+        for i in range(0, len(barcodes), self.SQL_CHUNK_SIZE):
+            chunk = barcodes[i:i + self.SQL_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(f"SELECT gs1_code, {field} FROM products WHERE gs1_code IN ({placeholders})", chunk)
+            for gs1_code, value in cursor.fetchall():
+                values[gs1_code] = value
+        return values
+    
+    def push_undo(self, entry):
+        """Push an entry onto the undo log"""
+        self.undo_stack.append(entry)
+        if len(self.undo_stack) > self.MAX_UNDO_STEPS:
+            self.undo_stack.pop(0)
+        self.undo_btn.config(state=tk.NORMAL)
+    
+    def display_value(self, column_name, value):
+        """Convert a database value to the text shown in the list"""
+        if not value and column_name in ('packaging_waste', 'product_waste'):
+            return "Unclassified"
+        return value or ""
+    
+    def update_tree_column(self, column_name, new_values):
+        """Update one column of the listed products in place ({gs1_code: value})"""
+        column_index = self.COLUMN_NAMES.index(column_name)
+        for barcode, value in new_values.items():
+            item = self.tree_items.get(barcode)
+            if item:
+                values = list(self.tree.item(item, 'values'))
+                values[column_index] = self.display_value(column_name, value)
+                self.tree.item(item, values=values)
+    
+    def open_bulk_edit_dialog(self):
+        """Open bulk edit dialog for the selected products"""
+        try:
+            selected_items = self.tree.selection()
+            if not selected_items:
+                messagebox.showwarning("Warning", "Please select products to edit first")
+                return
+            
+            if self.editing_item:
+                self.save_edit()
+            
+            dialog = tk.Toplevel(self.window)
+            dialog.title("Bulk Edit")
+            dialog.geometry("400x220")
+            dialog.configure(bg='#f0f0f0')
+            dialog.transient(self.window)
+            dialog.grab_set()
+            
+            tk.Label(dialog, text=f"Edit {len(selected_items)} selected products", 
+                    font=('Arial', 12, 'bold'), bg='#f0f0f0').pack(pady=10)
+            
+            # 字段选择
+            tk.Label(dialog, text="Field:", font=('Arial', 10), bg='#f0f0f0').pack(anchor='w', padx=20)
+            label_to_column = {label: column for column, label in self.FIELD_LABELS.items()}
+            field_var = tk.StringVar(value=self.FIELD_LABELS['product_waste'])
+            field_combo = ttk.Combobox(dialog, textvariable=field_var, state="readonly",
+                                      values=list(label_to_column.keys()))
+            field_combo.pack(fill=tk.X, padx=20, pady=(0, 10))
+            
+            # 新值选择
+            tk.Label(dialog, text="New Value:", font=('Arial', 10), bg='#f0f0f0').pack(anchor='w', padx=20)
+            value_var = tk.StringVar()
+            value_combo = ttk.Combobox(dialog, textvariable=value_var)
+            value_combo.pack(fill=tk.X, padx=20, pady=(0, 10))
+            
+            def on_field_change(event=None):
+                column_name = label_to_column[field_var.get()]
+                value_var.set("")
+                if column_name in ('packaging_waste', 'product_waste'):
+                    value_combo.config(values=self.WASTE_OPTIONS, state="readonly")
+                elif column_name == 'packaging_material':
+                    value_combo.config(values=self.MATERIAL_OPTIONS, state="readonly")
+                else:
+                    value_combo.config(values=[], state="normal")
+            
+            field_combo.bind('<<ComboboxSelected>>', on_field_change)
+            on_field_change()
+            
+            def apply():
+                column_name = label_to_column[field_var.get()]
+                barcodes = [self.tree.item(item, 'values')[0] for item in selected_items]
+                dialog.destroy()
+                self.apply_bulk_update(column_name, value_var.get().strip(), barcodes)
+            
+            tk.Button(dialog, text="Apply", font=('Arial', 10, 'bold'),
+                     bg='#4CAF50', fg='white', padx=15, pady=4,
+                     command=apply).pack(pady=5)
+        
+        except Exception as e:
+            print(f"批量编辑错误: {e}")
+            messagebox.showerror("Error", f"Failed to open bulk edit: {e}")
+    
+    def apply_bulk_update(self, column_name, new_value, barcodes):
+        """Set one field on many products in a single transaction"""
+        try:
+            field = self.EDITABLE_FIELDS[column_name]
+            
+            # 先提交之前的单元格编辑，避免与本次批量操作混在同一个撤销步骤里
+            self.flush_pending_edits()
+            
+            old_values = self.fetch_field_values(field, barcodes)
+            with self.conn:
+                self.conn.executemany(
+                    f"UPDATE products SET {field} = ?, updated_at = CURRENT_TIMESTAMP WHERE gs1_code = ?",
+                    [(new_value, barcode) for barcode in old_values]
+                )
+            
+            self.push_undo({
+                'description': f"bulk edit {self.FIELD_LABELS[column_name]} of {len(old_values)} products",
+                'field': field,
+                'old_values': old_values
+            })
+            
+            self.update_tree_column(column_name, {barcode: new_value for barcode in old_values})
+            self.status_label.config(text=f"Updated {len(old_values)} products (Ctrl+Z to undo)")
+        
+        except Exception as e:
+            print(f"批量更新错误: {e}")
+            messagebox.showerror("Error", f"Bulk update failed: {e}")
+    
+    def undo_last_change(self):
+        """Revert the last edit, bulk edit or deletion in one transaction"""
+        try:
+            if self.editing_item:
+                self.save_edit()
+            if not self.undo_stack:
+                return
+            
+            self.flush_pending_edits()
+            entry = self.undo_stack.pop()
+            
+            with self.conn:
+                if 'deleted_rows' in entry:
+                    columns = entry['columns']
+                    placeholders = ",".join("?" * len(columns))
+                    self.conn.executemany(
+                        f"INSERT INTO products ({', '.join(columns)}) VALUES ({placeholders})",
+                        entry['deleted_rows']
+                    )
+                    # 产品按原id恢复，部件仍指向它们
+                    if entry.get('deleted_parts'):
+                        part_columns = entry['part_columns']
+                        self.conn.executemany(
+                            f"INSERT INTO product_parts ({', '.join(part_columns)}) "
+                            f"VALUES ({','.join('?' * len(part_columns))})",
+                            entry['deleted_parts']
+                        )
+                else:
+                    self.conn.executemany(
+                        f"UPDATE products SET {entry['field']} = ?, updated_at = CURRENT_TIMESTAMP WHERE gs1_code = ?",
+                        [(value, barcode) for barcode, value in entry['old_values'].items()]
+                    )
+            
+            if 'deleted_rows' in entry:
+                self.refresh_product_list()
+            else:
+                column_name = next(column for column, field in self.EDITABLE_FIELDS.items() if field == entry['field'])
+                self.update_tree_column(column_name, entry['old_values'])
+            
+            if not self.undo_stack:
+                self.undo_btn.config(state=tk.DISABLED)
+            self.status_label.config(text=f"Undone: {entry['description']}")
+        
+        except Exception as e:
+            print(f"撤销错误: {e}")
+            messagebox.showerror("Error", f"Undo failed: {e}")
+    
     def cancel_edit(self):
         """Cancel edit"""
         try:
@@ -1513,19 +1909,53 @@ class ProductsListWindow:
                 confirm_msg = f"Are you sure you want to delete the selected {len(selected_items)} products?"
             
             if messagebox.askyesno("Confirm Deletion", confirm_msg):
-                # Execute deletion
+                self.flush_pending_edits()
+                barcodes = [self.tree.item(item, 'values')[0] for item in selected_items]
+                
+                # Save the full product and part rows for undo and delete them in one transaction
                 cursor = self.conn.cursor()
-                for item in selected_items:
-                    values = self.tree.item(item, 'values')
-                    barcode = values[0]  # Barcode
-                    cursor.execute("DELETE FROM products WHERE gs1_code = ?", (barcode,))
+                deleted_rows = []
+                deleted_parts = []
+                columns = part_columns = None
+                with self.conn:
+                    # 读取和删除在同一事务中，其他进程不能在中间修改部件；
+                    # 共用连接上已有未提交的事务时直接加入它
+                    if not self.conn.in_transaction:
+                        self.conn.execute("BEGIN IMMEDIATE")
+                    for i in range(0, len(barcodes), self.SQL_CHUNK_SIZE):
+                        chunk = barcodes[i:i + self.SQL_CHUNK_SIZE]
+                        placeholders = ",".join("?" * len(chunk))
+                        cursor.execute(f"SELECT * FROM products WHERE gs1_code IN ({placeholders})", chunk)
+                        columns = [description[0] for description in cursor.description]
+                        deleted_rows.extend(cursor.fetchall())
+                        cursor.execute(f'''
+                            SELECT pp.* FROM product_parts pp JOIN products p ON p.id = pp.product_id
+                            WHERE p.gs1_code IN ({placeholders})
+                        ''', chunk)
+                        part_columns = [description[0] for description in cursor.description]
+                        deleted_parts.extend(cursor.fetchall())
+                    
+                    self.conn.executemany(
+                        "DELETE FROM product_parts WHERE product_id IN (SELECT id FROM products WHERE gs1_code = ?)",
+                        [(barcode,) for barcode in barcodes])
+                    self.conn.executemany("DELETE FROM products WHERE gs1_code = ?",
+                                          [(barcode,) for barcode in barcodes])
                 
-                self.conn.commit()
+                self.push_undo({
+                    'description': f"delete {len(deleted_rows)} products",
+                    'columns': columns,
+                    'deleted_rows': deleted_rows,
+                    'part_columns': part_columns,
+                    'deleted_parts': deleted_parts
+                })
                 
-                # Refresh list
-                self.refresh_product_list()
+                # Remove deleted rows from the list
+                self.tree.delete(*selected_items)
+                for barcode in barcodes:
+                    self.tree_items.pop(barcode, None)
+                self.on_item_select(None)
                 
-                messagebox.showinfo("Success", f"Deleted {len(selected_items)} products")
+                messagebox.showinfo("Success", f"Deleted {len(selected_items)} products (Undo to restore)")
                 
         except Exception as e:
             print(f"删除产品错误: {e}")
@@ -1535,8 +1965,7 @@ class ProductsListWindow:
         """Refresh products list"""
         try:
             # Clear existing data
-            for item in self.tree.get_children():
-                self.tree.delete(item)
+            self.clear_product_rows()
             
             # Reload data
             self.load_products()
@@ -1546,10 +1975,15 @@ class ProductsListWindow:
     
     def close_window(self):
         """Close window"""
+        if self.editing_item:
+            self.save_edit()
+        self.flush_pending_edits()
+        self.window.after_cancel(self.change_poll_job)
         self.window.destroy()
     
     def run(self):
         """Run window"""
+        self.window.protocol("WM_DELETE_WINDOW", self.close_window)
         self.window.mainloop()
 
 
@@ -1779,10 +2213,13 @@ if __name__ == "__main__":
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='Product Management System')
     parser.add_argument('--gs1-code', type=str, help='Pre-fill GS1 code for new product')
+    parser.add_argument('--symbology', type=str, help='Barcode symbology of the pre-filled code (e.g. EAN13, UPCE)')
+    parser.add_argument('--ocr-backend', choices=list(OCR_BACKENDS), help='OCR engine for product names (default: OCR_BACKEND or baidu)')
     args = parser.parse_args()
     
     # 创建应用实例，传递预填的GS1代码
-    app = ProductManager(prefill_gs1_code=args.gs1_code)
+    app = ProductManager(prefill_gs1_code=args.gs1_code, prefill_symbology=args.symbology,
+                         ocr_backend=args.ocr_backend)
     
     # 如果有预填的GS1代码，直接打开创建产品窗口
     if args.gs1_code:
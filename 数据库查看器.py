@@ -8,8 +8,53 @@
 import sqlite3
 import os
 import sys
+import time
 from typing import List, Dict, Any, Optional
 import json
+from product_database import (table_exists, read_statistics, read_scan_summary, product_search_queries,
+                              STATS_DIMENSIONS)
+
+# 性能分析时每隔多少条虚拟机指令回调一次计数
+PROFILE_STEP_INTERVAL = 10
+
+# 扫描程序和产品管理器的常用查询，用于索引检查报告
+# (说明, SQL, 参数, 用到的表, 建议索引 (索引名, 建索引语句) 或 None)
+HOT_QUERIES = [
+    ("扫描程序: 按条码读取产品及部件",
+     "SELECT p.id, p.product_name, pp.id, pp.part_name FROM products p "
+     "LEFT JOIN product_parts pp ON pp.product_id = p.id "
+     "WHERE p.gtin14 = ? OR p.gs1_code = ? ORDER BY p.gs1_code = ? DESC, pp.id",
+     ('06901234567892', '6901234567892', '6901234567892'), ('products', 'product_parts'),
+     ('idx_products_gtin14', "CREATE UNIQUE INDEX IF NOT EXISTS idx_products_gtin14 ON products(gtin14)")),
+    ("产品管理器: 产品列表按创建时间排序",
+     "SELECT gs1_code, product_name, packaging_waste_type, packaging_material, plastic_type, "
+     "product_waste_type, created_at FROM products ORDER BY created_at DESC",
+     (), ('products',),
+     ('idx_products_created_at', "CREATE INDEX IF NOT EXISTS idx_products_created_at ON products(created_at)")),
+    ("产品管理器: 按条码读取单个产品",
+     "SELECT * FROM products WHERE gs1_code = ?",
+     ('6901234567892',), ('products',),
+     None),
+    # 搜索直接使用 search_products 实际执行的语句
+    ("产品管理器: 条码前缀搜索",
+     *product_search_queries('690')[0], ('products',),
+     None),
+    ("产品管理器: 名称全文搜索 (每个词至少三个字)",
+     *product_search_queries('可口可乐')[-1], ('products_fts', 'products'),
+     None),
+    ("产品管理器: 名称模糊搜索 (一两个字的词或无全文索引时)",
+     *product_search_queries('可乐', use_fts=False)[-1], ('products', 'product_parts'),
+     None),
+    ("扫描程序/产品管理器: 变更轮询",
+     "SELECT id, product_id, gs1_code, operation FROM product_changes WHERE id > ? ORDER BY id",
+     (0,), ('product_changes',),
+     None),
+    ("产品管理器: 读取产品部件",
+     "SELECT * FROM product_parts WHERE product_id = ? ORDER BY id",
+     (1,), ('product_parts',),
+     ('idx_product_parts_product_id',
+      "CREATE INDEX IF NOT EXISTS idx_product_parts_product_id ON product_parts(product_id)")),
+]
 
 class DatabaseViewer:
     def __init__(self, db_path: str):
@@ -18,6 +63,8 @@ class DatabaseViewer:
         if not os.path.exists(db_path):
             print(f"❌ 数据库文件不存在: {db_path}")
             sys.exit(1)
+        # 整个会话共用一个连接，避免每次操作都重新打开数据库
+        self.conn = self.connect()
     
     def connect(self) -> sqlite3.Connection:
         """连接到数据库"""
@@ -29,19 +76,22 @@ class DatabaseViewer:
             print(f"❌ 连接数据库失败: {e}")
             sys.exit(1)
     
+    def close(self):
+        """关闭数据库连接"""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+    
     def get_tables(self) -> List[str]:
         """获取所有表名"""
-        conn = self.connect()
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
         tables = [row[0] for row in cursor.fetchall()]
-        conn.close()
         return tables
     
     def get_table_schema(self, table_name: str) -> List[Dict[str, Any]]:
         """获取表结构"""
-        conn = self.connect()
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         cursor.execute(f"PRAGMA table_info({table_name})")
         columns = []
         for row in cursor.fetchall():
@@ -53,24 +103,49 @@ class DatabaseViewer:
                 'default_value': row[4],
                 'pk': bool(row[5])
             })
-        conn.close()
         return columns
     
-    def get_table_data(self, table_name: str, limit: int = 100) -> List[Dict[str, Any]]:
-        """获取表数据"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT * FROM {table_name} LIMIT {limit}")
-        rows = []
-        for row in cursor.fetchall():
-            rows.append(dict(row))
-        conn.close()
-        return rows
+    def has_rowid(self, table_name: str) -> bool:
+        """判断表是否有rowid（WITHOUT ROWID表没有）"""
+        try:
+            self.conn.execute(f"SELECT rowid FROM {table_name} LIMIT 0")
+            return True
+        except sqlite3.OperationalError:
+            return False
+    
+    def open_table_page(self, table_name: str, start: Optional[int], page_size: int,
+                        keyset: bool = True) -> sqlite3.Cursor:
+        """打开一页表数据的游标
+        
+        keyset为True时按rowid键集分页，start是本页第一行的rowid（None表示第一页），
+        第一列是rowid；否则退回到OFFSET分页，start是行偏移量。
+        返回的游标逐行读取，不会把整页数据装进内存。
+        """
+        if keyset:
+            return self.conn.execute(
+                f"SELECT rowid, * FROM {table_name} WHERE rowid >= ? ORDER BY rowid LIMIT ?",
+                (start if start is not None else -(2 ** 63), page_size))
+        return self.conn.execute(f"SELECT * FROM {table_name} LIMIT ? OFFSET ?",
+                                 (page_size, start or 0))
+    
+    def get_next_page_start(self, table_name: str, last_key: int) -> Optional[int]:
+        """获取下一页第一行的rowid，没有下一页时返回None"""
+        row = self.conn.execute(
+            f"SELECT rowid FROM {table_name} WHERE rowid > ? ORDER BY rowid LIMIT 1",
+            (last_key,)).fetchone()
+        return row[0] if row else None
+    
+    def get_previous_page_start(self, table_name: str, first_key: int, page_size: int) -> Optional[int]:
+        """获取上一页第一行的rowid，已是第一页时返回None"""
+        row = self.conn.execute(
+            f"SELECT MIN(rowid) FROM (SELECT rowid FROM {table_name} WHERE rowid < ? "
+            f"ORDER BY rowid DESC LIMIT ?)",
+            (first_key, page_size)).fetchone()
+        return row[0] if row else None
     
     def execute_query(self, query: str) -> List[Dict[str, Any]]:
         """执行自定义查询"""
-        conn = self.connect()
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         try:
             cursor.execute(query)
             if query.strip().upper().startswith('SELECT'):
@@ -79,21 +154,73 @@ class DatabaseViewer:
                     rows.append(dict(row))
                 return rows
             else:
-                conn.commit()
+                self.conn.commit()
                 return [{"message": "查询执行成功", "affected_rows": cursor.rowcount}]
         except sqlite3.Error as e:
             return [{"error": str(e)}]
+    
+    def profile_query(self, query: str, params: tuple = ()) -> Dict[str, Any]:
+        """执行查询并收集性能信息
+        
+        返回查询计划、耗时、返回行数和执行的虚拟机指令数（近似反映扫描的行数）。
+        """
+        plan = []
+        depths = {0: 0}
+        for row in self.conn.execute(f"EXPLAIN QUERY PLAN {query}", params):
+            depth = depths.get(row[1], 0) + 1
+            depths[row[0]] = depth
+            plan.append((depth, row[3]))
+        
+        steps = [0]
+        
+        def count_steps():
+            steps[0] += 1
+            return 0
+        
+        self.conn.set_progress_handler(count_steps, PROFILE_STEP_INTERVAL)
+        try:
+            start_time = time.perf_counter()
+            cursor = self.conn.execute(query, params)
+            rows = [dict(row) for row in cursor.fetchall()] if cursor.description else []
+            elapsed = time.perf_counter() - start_time
+            if not cursor.description:
+                self.conn.commit()
         finally:
-            conn.close()
+            self.conn.set_progress_handler(None, 0)
+        
+        return {
+            'plan': plan,
+            'elapsed_ms': elapsed * 1000,
+            'vm_steps': steps[0] * PROFILE_STEP_INTERVAL,
+            'rows': rows,
+            'affected_rows': cursor.rowcount,
+            'full_scan': any(plan_has_full_scan(detail) for _, detail in plan),
+            'temp_sort': any('TEMP B-TREE' in detail for _, detail in plan)
+        }
+    
+    def index_exists(self, index_name: str) -> bool:
+        """判断索引是否存在"""
+        cursor = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,))
+        return cursor.fetchone() is not None
     
     def get_table_count(self, table_name: str) -> int:
         """获取表的记录数"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-        count = cursor.fetchone()[0]
-        conn.close()
+        cursor = self.conn.cursor()
+        if table_name == 'products' and table_exists(self.conn, 'product_stats'):
+            # 产品总数由触发器维护，直接读取，无需全表扫描
+            cursor.execute("SELECT product_count FROM product_stats WHERE dimension = 'total' AND value = ''")
+            row = cursor.fetchone()
+            count = row[0] if row else 0
+        else:
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            count = cursor.fetchone()[0]
         return count
+    
+    def get_classification_stats(self) -> Optional[Dict[str, Any]]:
+        """获取垃圾分类统计（读取product_stats表，不存在时返回None）"""
+        if not table_exists(self.conn, 'product_stats'):
+            return None
+        return read_statistics(self.conn)
 
 def print_separator(title: str = ""):
     """打印分隔线"""
@@ -140,6 +267,54 @@ def print_table_data(data: List[Dict[str, Any]], max_width: int = 20):
         row_str = " | ".join([str(row.get(col, "")).ljust(col_widths[col]) for col in columns])
         print(row_str)
 
+def plan_has_full_scan(detail: str) -> bool:
+    """判断查询计划的一步是否为全表扫描（按索引顺序扫描和虚拟表除外）"""
+    return detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE' not in detail
+
+def print_query_profile(profile: Dict[str, Any]):
+    """打印查询计划和性能信息"""
+    print("🧭 查询计划:")
+    for depth, detail in profile['plan']:
+        mark = "⚠️ " if plan_has_full_scan(detail) or 'TEMP B-TREE' in detail else ""
+        print(f"{'  ' * depth}{mark}{detail}")
+    print(f"⏱️  耗时: {profile['elapsed_ms']:.3f} ms")
+    print(f"🔁 虚拟机指令: 约 {profile['vm_steps']:,} 条")
+    print(f"📊 返回行数: {len(profile['rows'])}")
+
+def fit_cell(value: Any, width: int) -> str:
+    """把单元格内容截断/补齐到固定宽度"""
+    text = "" if value is None else str(value).replace("\n", " ")
+    if len(text) > width:
+        text = text[:width - 1] + "…"
+    return text.ljust(width)
+
+def stream_table_rows(cursor: sqlite3.Cursor, max_width: int = 20, key_column: bool = False):
+    """逐行打印游标结果（固定列宽，不缓存数据）
+    
+    key_column为True时第一列是分页用的rowid，不打印。
+    返回 (打印行数, 第一行的键, 最后一行的键)。
+    """
+    names = [description[0] for description in cursor.description]
+    skip = 1 if key_column else 0
+    widths = [max(len(name), max_width) for name in names]
+    
+    header = " | ".join(fit_cell(name, width) for name, width in zip(names[skip:], widths[skip:]))
+    print(header)
+    print("-" * len(header))
+    
+    count = 0
+    first_key = last_key = None
+    for row in cursor:
+        if count == 0:
+            first_key = row[0]
+        last_key = row[0]
+        count += 1
+        print(" | ".join(fit_cell(value, width) for value, width in zip(row[skip:], widths[skip:])))
+    
+    if count == 0:
+        print("📭 没有数据")
+    return count, first_key, last_key
+
 def main():
     """主程序"""
     print("🗄️  SQLite数据库查看器")
@@ -187,6 +362,9 @@ def main():
         print("4. 🔢 查看表记录数")
         print("5. 💻 执行自定义SQL查询")
         print("6. 📈 数据库统计信息")
+        print("7. ♻️  垃圾分类统计")
+        print("8. ⏱️  查询性能分析")
+        print("9. 🧾 扫描记录统计")
         print("0. 🚪 退出")
         
         choice = input("\n请选择操作 (输入数字): ").strip()
@@ -206,8 +384,16 @@ def main():
             execute_custom_query(viewer)
         elif choice == "6":
             show_database_stats(viewer)
+        elif choice == "7":
+            show_classification_stats(viewer)
+        elif choice == "8":
+            query_profiler(viewer)
+        elif choice == "9":
+            show_scan_summary(viewer)
         else:
             print("❌ 无效选择，请重新输入")
+    
+    viewer.close()
 
 def show_all_tables(viewer: DatabaseViewer):
     """显示所有表"""
@@ -259,17 +445,51 @@ def show_table_data(viewer: DatabaseViewer):
         choice = int(input("请选择表 (输入数字): ")) - 1
         if 0 <= choice < len(tables):
             table_name = tables[choice]
-            limit = input("显示记录数限制 (默认100，直接回车使用默认值): ").strip()
-            limit = int(limit) if limit.isdigit() else 100
-            
-            print_separator(f"表数据: {table_name} (显示前{limit}条)")
-            data = viewer.get_table_data(table_name, limit)
-            print_table_data(data)
+            limit = input("每页显示记录数 (默认100，直接回车使用默认值): ").strip()
+            limit = int(limit) if limit.isdigit() and int(limit) > 0 else 100
+            browse_table(viewer, table_name, limit)
         else:
             print("❌ 无效选择")
     except ValueError:
         print("❌ 请输入有效数字")
 
+def browse_table(viewer: DatabaseViewer, table_name: str, page_size: int):
+    """分页浏览表数据（有rowid的表按rowid键集翻页，否则按OFFSET翻页）"""
+    keyset = viewer.has_rowid(table_name)
+    start = None if keyset else 0
+    page = 1
+    
+    while True:
+        print_separator(f"表数据: {table_name} (第{page}页，每页{page_size}条)")
+        cursor = viewer.open_table_page(table_name, start, page_size, keyset)
+        count, first_key, last_key = stream_table_rows(cursor, key_column=keyset)
+        
+        if keyset:
+            next_start = viewer.get_next_page_start(table_name, last_key) if count else None
+            prev_start = viewer.get_previous_page_start(table_name, first_key, page_size) if count else None
+        else:
+            next_start = start + page_size if count == page_size else None
+            prev_start = max(start - page_size, 0) if start > 0 else None
+        
+        options = []
+        if next_start is not None:
+            options.append("n 下一页")
+        if prev_start is not None:
+            options.append("p 上一页")
+        options.append("q 返回")
+        action = input(f"\n{' / '.join(options)}: ").strip().lower()
+        
+        if action == "n" and next_start is not None:
+            start = next_start
+            page += 1
+        elif action == "p" and prev_start is not None:
+            start = prev_start
+            page -= 1
+        elif action in ("q", ""):
+            break
+        else:
+            print("❌ 无效选择")
+
 def show_table_count(viewer: DatabaseViewer):
     """显示表记录数"""
     print_separator("表记录数统计")
@@ -332,6 +552,144 @@ def show_database_stats(viewer: DatabaseViewer):
             print(f"  📋 {table}: {count} 条记录, {len(columns)} 个字段")
         
         print(f"\n📈 总记录数: {total_records}")
+    
+    # 分类统计（触发器维护，O(1)读取）
+    stats = viewer.get_classification_stats()
+    if stats:
+        print(f"\n♻️  产品总数: {stats['total']}")
+        for dimension in ('packaging_waste_type', 'product_waste_type'):
+            summary = ", ".join(f"{value or '未分类'} {count}" for value, count in stats[dimension])
+            print(f"  {dimension}: {summary}")
+
+STATS_TITLES = {
+    'packaging_waste_type': '包装垃圾分类',
+    'product_waste_type': '产品本身垃圾分类',
+    'packaging_material': '包装材质',
+    'plastic_type': '塑料种类'
+}
+
+def show_classification_stats(viewer: DatabaseViewer):
+    """显示垃圾分类统计"""
+    print_separator("垃圾分类统计")
+    stats = viewer.get_classification_stats()
+    if stats is None:
+        print("📭 没有统计表 product_stats（请先运行产品管理器或扫描程序升级数据库）")
+        return
+    
+    total = stats['total']
+    print(f"📦 产品总数: {total}")
+    for dimension in STATS_DIMENSIONS:
+        print(f"\n{STATS_TITLES.get(dimension, dimension)}:")
+        if not stats[dimension]:
+            print("  📭 没有数据")
+            continue
+        for value, count in stats[dimension]:
+            percent = count * 100 / total if total else 0
+            bar = "█" * int(percent / 5)
+            print(f"  {(value or '未设置'):<16} {count:>6} {percent:>6.1f}% {bar}")
+
+def show_scan_summary(viewer: DatabaseViewer):
+    """按班次和扫描通道显示扫描量、未找到率和查询耗时"""
+    print_separator("扫描记录统计 (最近7天)")
+    if not table_exists(viewer.conn, 'scan_events'):
+        print("📭 没有扫描记录表 scan_events（请先运行扫描程序）")
+        return
+    
+    rows = read_scan_summary(viewer.conn)
+    if not rows:
+        print("📭 最近7天没有扫描记录")
+        return
+    
+    print(f"{'日期':<12} {'班次':<6} {'通道':<16} {'扫描数':>8} {'每小时':>8} {'未找到率':>8} {'平均耗时':>10}")
+    print("-" * 78)
+    for shift_date, shift, lane, scans, misses, avg_latency, first_scan, last_scan in rows:
+        hours = max((last_scan - first_scan) / 3600, 1 / 60)
+        miss_rate = f"{misses * 100 / scans:.1f}%"
+        latency = f"{avg_latency:.2f} ms" if avg_latency is not None else "-"
+        print(f"{shift_date:<12} {shift:<6} {lane:<16} {scans:>8} {scans / hours:>8.0f} {miss_rate:>8} {latency:>10}")
+
+def query_profiler(viewer: DatabaseViewer):
+    """查询性能分析菜单"""
+    print_separator("查询性能分析")
+    print("1. 💻 分析自定义SQL查询")
+    print("2. 🩺 常用查询索引检查报告")
+    
+    choice = input("\n请选择操作 (输入数字): ").strip()
+    if choice == "1":
+        profile_custom_query(viewer)
+    elif choice == "2":
+        show_index_report(viewer)
+    else:
+        print("❌ 无效选择")
+
+def profile_custom_query(viewer: DatabaseViewer):
+    """分析自定义SQL查询"""
+    query = input("\n请输入SQL查询语句: ").strip()
+    if not query:
+        print("❌ 查询语句不能为空")
+        return
+    
+    print_separator("分析结果")
+    try:
+        profile = viewer.profile_query(query)
+    except sqlite3.Error as e:
+        print(f"❌ 查询错误: {e}")
+        return
+    
+    print_query_profile(profile)
+    if profile['full_scan']:
+        print("💡 查询包含全表扫描，可以考虑为WHERE/ORDER BY中的列建立索引")
+    if profile['rows']:
+        print_separator("查询结果 (前20条)")
+        print_table_data(profile['rows'][:20])
+    elif profile['affected_rows'] >= 0:
+        print(f"📊 影响行数: {profile['affected_rows']}")
+
+def show_index_report(viewer: DatabaseViewer):
+    """检查扫描程序和产品管理器常用查询的索引使用情况"""
+    print_separator("常用查询索引检查报告")
+    suggestions = []
+    
+    for title, query, params, tables, suggestion in HOT_QUERIES:
+        print(f"\n🔎 {title}")
+        missing = [table for table in tables if not table_exists(viewer.conn, table)]
+        if missing:
+            print(f"  ⏭️  跳过: 缺少表 {', '.join(missing)}")
+            continue
+        
+        try:
+            profile = viewer.profile_query(query, params)
+        except sqlite3.Error as e:
+            print(f"  ❌ 查询错误: {e}")
+            continue
+        
+        print_query_profile(profile)
+        if suggestion and not viewer.index_exists(suggestion[0]):
+            print(f"  💡 建议: {suggestion[1]}")
+            if suggestion[1] not in suggestions:
+                suggestions.append(suggestion[1])
+        elif not profile['full_scan'] and not profile['temp_sort']:
+            print("  ✅ 使用了索引")
+        else:
+            print("  ℹ️  没有可用的普通索引（少量结果的临时排序或 LIKE '%...%' 匹配属于正常情况）")
+    
+    if not suggestions:
+        print("\n✅ 常用查询都已经使用索引")
+        return
+    
+    print_separator("缺少的索引")
+    for suggestion in suggestions:
+        print(f"  {suggestion};")
+    confirm = input("\n是否立即创建这些索引? (y/N): ").strip().lower()
+    if confirm == 'y':
+        try:
+            for suggestion in suggestions:
+                viewer.conn.execute(suggestion)
+            viewer.conn.commit()
+            print("✅ 索引已创建")
+        except sqlite3.Error as e:
+            viewer.conn.rollback()
+            print(f"❌ 创建索引失败: {e}")
 
 if __name__ == "__main__":
     try: